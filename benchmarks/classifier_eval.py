@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Routing evaluation: accuracy vs latency of guardrail + classifier configurations
+
+Usage:
+    python benchmarks/classifier_eval.py [--dataset benchmarks/data/routing_eval.jsonl]
+        [--configs two_call,fused,cascade,large] [--output report.json]
+
+The dataset is JSONL with "query", "intent" (one of INTENT_LABELS, null for
+inputs that must be blocked), "is_safe" and "emergency" fields. Every
+configuration routes every query through workflow.route(). Queries routed to
+symptom_checker also run symptom extraction, so an emergency counts as
+recalled only when it reaches symptom_checker and is flagged as an emergency.
+
+Per configuration the report gives intent accuracy with a confusion matrix,
+guardrail accuracy, emergency recall, latency (mean, p50, p95) and tokens.
+The Pareto set holds the configurations no other one beats on accuracy,
+emergency recall, p95 latency and tokens at once.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["LANGCHAIN_TRACING_V2"] = "false"
+
+from langchain_community.callbacks import get_openai_callback
+
+from src import HealthcareConfig, HealthcareWorkflow
+from src.schemas import INTENT_LABELS
+
+
+DEFAULT_DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "routing_eval.jsonl")
+
+# HealthcareConfig settings per routing configuration
+CONFIGURATIONS = {
+    "two_call": {},
+    "fused": {"fused_routing": True},
+    "cascade": {"cascade": True},
+    "large": {"chain_tiers": {"guardrail": "large", "classifier": "large", "routing": "large", "symptom": "large"}},
+}
+
+BLOCKED = "blocked"
+
+
+def load_dataset(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def evaluate(name, settings, dataset):
+    workflow = HealthcareWorkflow(HealthcareConfig(**settings))
+    rows = []
+    for item in dataset:
+        with get_openai_callback() as cb:
+            start = time.perf_counter()
+            safety, classification = workflow.route(item["query"])
+            latency = time.perf_counter() - start
+            predicted = classification.get("classification") if safety.get("is_safe", True) else BLOCKED
+            emergency = False
+            if predicted == "symptom_checker" and item.get("emergency"):
+                emergency = bool(workflow.symptom_chain.run(item["query"]).is_emergency)
+        rows.append({
+            "query": item["query"],
+            "expected": item["intent"] if item.get("is_safe", True) else BLOCKED,
+            "predicted": predicted,
+            "emergency": bool(item.get("emergency")),
+            "emergency_detected": emergency,
+            "latency": latency,
+            "tokens": cb.total_tokens,
+        })
+        print(f"   [{name}] {rows[-1]['predicted']:<26} {latency:6.2f}s  {item['query'][:50]}")
+    return summarize(rows), rows
+
+
+def summarize(rows):
+    labels = list(INTENT_LABELS) + [BLOCKED]
+    confusion = {expected: {predicted: 0 for predicted in labels + ["other"]} for expected in labels}
+    for row in rows:
+        predicted = row["predicted"] if row["predicted"] in labels else "other"
+        confusion[row["expected"]][predicted] += 1
+
+    emergencies = [row for row in rows if row["emergency"]]
+    safety_correct = sum((row["expected"] == BLOCKED) == (row["predicted"] == BLOCKED) for row in rows)
+    latencies = [row["latency"] for row in rows]
+    return {
+        "queries": len(rows),
+        "accuracy": sum(row["expected"] == row["predicted"] for row in rows) / len(rows),
+        "safety_accuracy": safety_correct / len(rows),
+        "emergency_recall": (
+            sum(row["emergency_detected"] for row in emergencies) / len(emergencies) if emergencies else None
+        ),
+        "missed_emergencies": [row["query"] for row in emergencies if not row["emergency_detected"]],
+        "mean_latency": statistics.mean(latencies),
+        "p50_latency": percentile(latencies, 50),
+        "p95_latency": percentile(latencies, 95),
+        "mean_tokens": statistics.mean(row["tokens"] for row in rows),
+        "confusion": confusion,
+    }
+
+
+def dominates(a, b):
+    """a is at least as good as b on every objective and better on one"""
+    better_or_equal = (
+        a["accuracy"] >= b["accuracy"]
+        and (a["emergency_recall"] or 0) >= (b["emergency_recall"] or 0)
+        and a["p95_latency"] <= b["p95_latency"]
+        and a["mean_tokens"] <= b["mean_tokens"]
+    )
+    strictly = (
+        a["accuracy"] > b["accuracy"]
+        or (a["emergency_recall"] or 0) > (b["emergency_recall"] or 0)
+        or a["p95_latency"] < b["p95_latency"]
+        or a["mean_tokens"] < b["mean_tokens"]
+    )
+    return better_or_equal and strictly
+
+
+def pareto(summaries):
+    return [
+        name for name, summary in summaries.items()
+        if not any(dominates(other, summary) for other_name, other in summaries.items() if other_name != name)
+    ]
+
+
+def print_confusion(confusion):
+    labels = list(confusion)
+    short = {label: label.split("_")[0][:8] for label in labels + ["other"]}
+    header = "expected / predicted"
+    print(f"{header:22}" + "".join(f"{short[label]:>9}" for label in labels + ["other"]))
+    for expected in labels:
+        print(f"{expected[:22]:22}" + "".join(f"{confusion[expected][p]:>9}" for p in labels + ["other"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="Labelled JSONL dataset")
+    parser.add_argument("--configs", default=",".join(CONFIGURATIONS), help="Comma-separated configurations")
+    parser.add_argument("--output", help="Write the full report as JSON")
+    args = parser.parse_args()
+
+    dataset = load_dataset(args.dataset)
+    summaries, all_rows = {}, {}
+    for name in args.configs.split(","):
+        summaries[name], all_rows[name] = evaluate(name, CONFIGURATIONS[name], dataset)
+    front = pareto(summaries)
+
+    for name, summary in summaries.items():
+        print("\n" + f" {name.upper()} ".center(80, "="))
+        print_confusion(summary["confusion"])
+        for query in summary["missed_emergencies"]:
+            print(f"  ✗ missed emergency: {query}")
+
+    print("\n" + " PARETO REPORT ".center(80, "="))
+    print(f"{'config':12}{'accuracy':>10}{'safety':>9}{'emerg.':>9}{'p50 s':>8}{'p95 s':>8}{'tokens':>9}")
+    for name, s in summaries.items():
+        recall = f"{s['emergency_recall']:.0%}" if s["emergency_recall"] is not None else "n/a"
+        marker = " *" if name in front else ""
+        print(f"{name:12}{s['accuracy']:>10.1%}{s['safety_accuracy']:>9.1%}{recall:>9}"
+              f"{s['p50_latency']:>8.2f}{s['p95_latency']:>8.2f}{s['mean_tokens']:>9.0f}{marker}")
+    print("* Pareto-optimal (accuracy, emergency recall, p95 latency, tokens)")
+    print("=" * 80)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"summaries": summaries, "pareto": front, "rows": all_rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
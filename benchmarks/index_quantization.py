@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Knowledge-index quantization: memory, query latency and recall@k against the flat index
+
+Usage:
+    python benchmarks/index_quantization.py [--source DIR] [--documents 50000]
+        [--k 5] [--rerank 50] [--pq-subvectors 64] [--queries 200] [--output report.json]
+
+The corpus is one shard's worth of documents: the JSONL files in --source
+(the layout `cli.py index` builds from) or, without it, a synthetic corpus
+of --documents topical texts. Both are embedded with the local hashing
+embeddings (--embeddings to use another model). The same vectors are stored
+flat (float32), as int8 codes and as PQ codes. Each variant answers the same
+queries, both alone and with the top --rerank candidates rescored from the
+float vectors.
+
+Reported per variant: bytes scanned per query (the resident size of a fully
+used shard), p50/p95 search latency excluding the query embedding, and
+recall@k, the share of the flat index's top k that it also returns.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["LANGCHAIN_TRACING_V2"] = "false"
+
+import numpy as np
+
+from src.config import embeddings_by_name
+from src.knowledge_index import (
+    DOCUMENTS, OFFSETS, SHARDS, VECTORS, KnowledgeShard, build_shard, quantize_shard, read_documents
+)
+
+
+TOPICS = {
+    "digestion": "acidity digestion stomach ginger jeera triphala bloating constipation diet fennel buttermilk",
+    "sleep": "insomnia sleep night ashwagandha brahmi routine screen warm milk nutmeg relaxation",
+    "joints": "arthritis knee joint pain swelling turmeric guggulu massage oil mobility stiffness",
+    "respiration": "cough cold asthma breathing tulsi steam honey mulethi pranayama lungs congestion",
+    "stress": "stress anxiety meditation breath calm worry mind counselling mood tension",
+    "skin": "skin acne eczema neem aloe rash itching glow pigmentation sunburn",
+    "heart": "blood pressure heart cholesterol arjuna walking salt exercise circulation palpitations",
+    "schemes": "insurance scheme hospital cashless card eligibility family cover enrolment benefit claim",
+}
+FILLER = "the a of for with and daily practice advice simple effective common helps improve reduce".split()
+
+
+def synthetic_corpus(size, seed=0):
+    """Texts mixing one or two topics with filler words"""
+    rng = random.Random(seed)
+    vocab = {topic: words.split() for topic, words in TOPICS.items()}
+    names = list(vocab)
+    documents = []
+    for i in range(size):
+        topics = rng.sample(names, rng.choice([1, 1, 2]))
+        words = [rng.choice(vocab[rng.choice(topics)]) for _ in range(rng.randint(20, 60))]
+        words += rng.sample(FILLER, 5)
+        rng.shuffle(words)
+        documents.append({"id": i, "title": " / ".join(topics), "content": " ".join(words)})
+    return documents
+
+
+def load_corpus(source):
+    documents = []
+    for name in SHARDS:
+        path = os.path.join(source, f"{name}.jsonl")
+        if os.path.exists(path):
+            documents.extend(read_documents(path))
+    return documents
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def make_variant(flat_dir, root, name, quantization, pq_subvectors):
+    """A copy of the flat shard with quantized codes added"""
+    path = os.path.join(root, name)
+    os.makedirs(path)
+    for filename in (VECTORS, OFFSETS, DOCUMENTS):
+        shutil.copy(os.path.join(flat_dir, filename), path)
+    start = time.perf_counter()
+    quantize_shard(path, np.load(os.path.join(path, VECTORS)), quantization, pq_subvectors)
+    return KnowledgeShard(name, path, quantization), time.perf_counter() - start
+
+
+def measure(shard, query_vectors, k, rerank, truth):
+    latencies, recalls = [], []
+    for query_vector, expected in zip(query_vectors, truth):
+        start = time.perf_counter()
+        hits = shard.search(query_vector, k, rerank)
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len({i for i, _ in hits} & expected) / len(expected))
+    return {
+        "scanned_bytes": shard.nbytes,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        f"recall@{k}": statistics.mean(recalls),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", help="Directory of shard JSONL files (default: synthetic corpus)")
+    parser.add_argument("--documents", type=int, default=50000, help="Synthetic corpus size")
+    parser.add_argument("--embeddings", default="local", help='"local", "openai" or an OpenAI embedding model')
+    parser.add_argument("--k", type=int, default=5, help="Results per query")
+    parser.add_argument("--rerank", type=int, default=50, help="Candidates rescored from float vectors")
+    parser.add_argument("--pq-subvectors", type=int, default=0, help="PQ bytes per vector (default dimensions / 8)")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    documents = load_corpus(args.source) if args.source else synthetic_corpus(args.documents)
+    embeddings = embeddings_by_name(args.embeddings)
+    rng = random.Random(1)
+    # Queries are fragments of corpus documents
+    queries = [" ".join(doc["content"].split()[:8]) for doc in rng.sample(documents, min(args.queries, len(documents)))]
+    query_vectors = np.asarray(embeddings.embed_documents(queries), dtype=np.float32)
+    query_vectors /= np.maximum(np.linalg.norm(query_vectors, axis=1, keepdims=True), 1e-12)
+
+    root = tempfile.mkdtemp(prefix="index-quantization-")
+    try:
+        print(f"📚 Embedding {len(documents)} documents...")
+        start = time.perf_counter()
+        flat_dir = os.path.join(root, "flat")
+        entry = build_shard(flat_dir, documents, embeddings, batch_size=256)
+        print(f"   → {time.perf_counter() - start:.1f}s, {entry['dimensions']} dimensions")
+
+        flat = KnowledgeShard("flat", flat_dir)
+        truth = [{i for i, _ in flat.search(vector, args.k)} for vector in query_vectors]
+        variants = [("flat", flat, 0)]
+        for quantization in ("int8", "pq"):
+            shard, seconds = make_variant(flat_dir, root, quantization, quantization, args.pq_subvectors)
+            print(f"   → {quantization} codes in {seconds:.1f}s")
+            variants += [(quantization, shard, 0), (f"{quantization}+rerank{args.rerank}", shard, args.rerank)]
+
+        report = {"documents": len(documents), "dimensions": entry["dimensions"], "k": args.k, "variants": {}}
+        for name, shard, rerank in variants:
+            report["variants"][name] = measure(shard, query_vectors, args.k, rerank, truth)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    recall = f"recall@{args.k}"
+    print("\n" + " INDEX QUANTIZATION ".center(72, "="))
+    print(f"{report['documents']} documents, {report['dimensions']} dimensions, {len(queries)} queries\n")
+    print(f"{'variant':22}{'scanned MB':>12}{'vs flat':>9}{'p50 ms':>9}{'p95 ms':>9}{recall:>11}")
+    flat_bytes = report["variants"]["flat"]["scanned_bytes"]
+    for name, row in report["variants"].items():
+        print(f"{name:22}{row['scanned_bytes'] / 1e6:>12.2f}{flat_bytes / row['scanned_bytes']:>8.1f}x"
+              f"{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row[recall]:>11.1%}")
+    print("=" * 72)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Record a trace of LLM and search calls, or replay it as an offline benchmark
+
+Usage:
+    python benchmarks/replay.py --cassette trace.jsonl.gz --record [--queries queries.jsonl]
+    python benchmarks/replay.py --cassette trace.jsonl.gz [--latency] [--repeat 3] [--output report.json]
+
+Recording runs the queries against the live APIs and saves every provider
+call with its latency. A cassette recorded in production (cassette_path and
+cassette_mode="record" in HealthcareConfig) works the same way. Replaying
+needs no API keys. It serves the recorded answers, so every run takes the
+same path through the workflow. With --latency the recorded call durations
+are replayed too. Without it, the timings measure orchestration overhead
+alone. Reports end-to-end latency per query (mean, p50, p95).
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["LANGCHAIN_TRACING_V2"] = "false"
+
+from src import HealthcareConfig, HealthcareWorkflow
+from src.metrics import metrics
+
+
+DEFAULT_QUERIES = [
+    "What is PMJAY and am I eligible?",
+    "I've been feeling anxious and can't sleep for weeks",
+    "Ayurvedic remedies for acidity",
+    "I have had a headache and fever since yesterday",
+    "Severe chest pain spreading to my left arm",
+    "Find a government hospital near Jayanagar Bangalore",
+]
+
+
+def load_queries(path):
+    queries = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            queries.append(record.get("query") or record.get("body") or record.get("title"))
+    return [q for q in queries if q]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cassette", required=True, help="Cassette file (gzipped JSONL)")
+    parser.add_argument("--record", action="store_true", help="Call the live APIs and record them")
+    parser.add_argument("--latency", action="store_true", help="Replay the recorded call durations")
+    parser.add_argument("--queries", help="JSONL file with queries (default: built-in sample)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per query")
+    parser.add_argument("--output", help="Write the full report as JSON")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries) if args.queries else DEFAULT_QUERIES
+    config = HealthcareConfig(
+        cassette_path=args.cassette,
+        cassette_mode="record" if args.record else "replay",
+        replay_latency=args.latency
+    )
+    workflow = HealthcareWorkflow(config)
+
+    rows = []
+    for query in queries:
+        for _ in range(args.repeat if not args.record else 1):
+            start = time.perf_counter()
+            try:
+                result = workflow.run(query)
+                error = None
+            except Exception as e:
+                result, error = {}, f"{type(e).__name__}: {e}"
+            rows.append({
+                "query": query,
+                "seconds": time.perf_counter() - start,
+                "intent": result.get("intent"),
+                "degraded": sorted(result.get("degraded", {})),
+                "error": error,
+            })
+
+    latencies = [row["seconds"] for row in rows]
+    report = {
+        "mode": config.cassette_mode,
+        "replay_latency": args.latency,
+        "runs": len(rows),
+        "mean_latency": statistics.mean(latencies),
+        "p50_latency": percentile(latencies, 50),
+        "p95_latency": percentile(latencies, 95),
+        "errors": sum(row["error"] is not None for row in rows),
+        "cassette": {
+            name: value for name, value in metrics.snapshot()["counters"].items() if name.startswith("cassette.")
+        },
+    }
+
+    print("\n" + f" {report['mode'].upper()} ".center(60, "="))
+    print(f"{'query':40}{'seconds':>10}  intent")
+    for row in rows:
+        print(f"{row['query'][:38]:40}{row['seconds']:>10.3f}  {row['error'] or row['intent']}")
+    print(f"\nmean {report['mean_latency']:.3f}s  p50 {report['p50_latency']:.3f}s  "
+          f"p95 {report['p95_latency']:.3f}s  errors {report['errors']}")
+    print("=" * 60)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"report": report, "rows": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,20 @@
 Healthcare Assistant CLI with stateful chat history
 """
 
+import argparse
+import contextlib
+import io
+import json
 import os
 import sys
+import threading
+import time
 from dotenv import load_dotenv
+from rich.console import Console, Group
+from rich.live import Live
+from rich.panel import Panel
+from rich.spinner import Spinner
+from rich.text import Text
 
 # Load environment variables
 load_dotenv()
@@ -15,22 +26,145 @@ os.environ["LANGCHAIN_VERBOSE"] = "true"
 os.environ["LANGCHAIN_TRACING_V2"] = "false"
 
 from src import HealthcareConfig, HealthcareWorkflow
+from src.prewarm import read_queries, cluster_queries, prewarm
+from src.batch import run_batch
+from src.guardrail_model import LocalGuardrail, train_from_log, drift_report
+from src.knowledge_index import MANIFEST, SHARDS, ShardedKnowledgeIndex, build_index, read_documents
+from src.config import embeddings_by_name
+from src.rerank import EmbeddingCache
+
+
+class LiveView:
+    """
+    Live rendering of one request from workflow events: a panel per agent
+    with a spinner and elapsed timer while it runs, streamed tokens as they
+    arrive and the measured duration once it is done.
+    """
+    
+    TITLES = {
+        "routing": "🎯 Safety Check + Intent",
+        "symptom_assessment": "🩺 Symptom Assessment",
+        "output": "💬 Answer",
+        "hospital_locator": "🏥 Hospital Information",
+        "recommendations": "💊 Recommendations",
+        "ayurveda_recommendations": "🌿 Ayurvedic Recommendations",
+        "yoga_recommendations": "🧘 Yoga Recommendations",
+        "general_guidance": "💡 General Wellness Advice",
+    }
+    
+    def __init__(self):
+        self.panels = {}
+        self.start = time.perf_counter()
+        self.first_token = None
+        self.result = None
+        self._lock = threading.Lock()
+    
+    def _panel(self, section: str) -> dict:
+        if section not in self.panels:
+            self.panels[section] = {"status": "pending", "start": None, "seconds": None, "text": ""}
+        return self.panels[section]
+    
+    def on_event(self, event: str, value):
+        with self._lock:
+            if event == "step":
+                panel = self._panel(value["section"])
+                panel["status"] = value["status"]
+                if value["status"] == "started":
+                    panel["start"] = time.perf_counter()
+                else:
+                    panel["seconds"] = value["seconds"]
+            elif event == "token":
+                if self.first_token is None:
+                    self.first_token = time.perf_counter() - self.start
+                self._panel(value["section"] or "output")["text"] += value["text"]
+            elif event == "complete":
+                self.result = value
+            elif event in ("intent", "reasoning"):
+                self._panel("routing")["text"] += f"{event.title()}: {value}\n"
+            elif event == "emergency_number":
+                self._panel("output")["text"] += f"\n📞 Emergency Number: {value}"
+            elif event in self.TITLES:
+                panel = self._panel(event)
+                panel["text"] = self._format(value)
+                if panel["status"] == "pending":
+                    panel["status"] = "done"
+    
+    @staticmethod
+    def _format(value) -> str:
+        if isinstance(value, dict):
+            if "emergency" in value:
+                prefix = "🚨 EMERGENCY ALERT\n" if value.get("emergency") else ""
+                return prefix + str(value.get("message", ""))
+            return "\n".join(
+                f"{key.replace('_', ' ').title()}: {', '.join(map(str, item)) if isinstance(item, list) else item}"
+                for key, item in value.items() if item
+            )
+        return str(value or "")
+    
+    def render(self):
+        with self._lock:
+            renderables = []
+            for section, panel in self.panels.items():
+                title = self.TITLES.get(section, section.replace("_", " ").title())
+                if panel["status"] == "started":
+                    elapsed = time.perf_counter() - panel["start"]
+                    header = Spinner("dots", text=Text(f"{elapsed:.1f}s", style="dim"))
+                    body = Group(header, Text(panel["text"])) if panel["text"] else header
+                    border = "yellow"
+                elif panel["status"] == "failed":
+                    body = Text(panel["text"] or "Skipped (failed or timed out)", style="dim")
+                    title += f" ✗ {panel['seconds']:.1f}s"
+                    border = "red"
+                else:
+                    body = Text(panel["text"].strip())
+                    if panel["seconds"] is not None:
+                        title += f" ✓ {panel['seconds']:.1f}s"
+                    emergency = section == "output" and "EMERGENCY" in panel["text"]
+                    border = "red" if emergency else "green"
+                renderables.append(Panel(body, title=title, title_align="left", border_style=border))
+            return Group(*renderables)
+    
+    def timings(self) -> str:
+        """One-line summary of the measured step durations"""
+        parts = [
+            f"{section} {panel['seconds']:.1f}s"
+            for section, panel in self.panels.items() if panel["seconds"] is not None
+        ]
+        if self.first_token is not None:
+            parts.append(f"first token {self.first_token:.1f}s")
+        parts.append(f"total {time.perf_counter() - self.start:.1f}s")
+        return "⏱  " + " · ".join(parts)
 
 
 class HealthcareCLI:
     """Minimal stateful chat interface"""
     
-    def __init__(self):
-        self.history = []
+    def __init__(self, live: bool = False):
         self.workflow = None
+        self.session_id = os.getenv("HEALTHCARE_SESSION_ID", "cli")
+        self.live = live
+        # Bound to the real stdout before the workflow's step logs are silenced
+        self.console = Console(file=sys.stdout)
         
     def setup(self):
         """Initialize the workflow"""
         print("🏥 Healthcare Assistant - Initializing...")
         
         try:
-            config = HealthcareConfig()
+            # A shared cache file (e.g. filled by 'prewarm') turns on all caches
+            cache_db = os.getenv("HEALTHCARE_CACHE_DB")
+            config = HealthcareConfig(
+                session_db_path=os.getenv("HEALTHCARE_SESSION_DB", "healthcare_sessions.db"),
+                cache_db_path=cache_db,
+                cache_responses=bool(cache_db),
+                cache_routing=bool(cache_db),
+                cache_search=bool(cache_db),
+                canonicalize_queries=bool(cache_db)
+            )
             self.workflow = HealthcareWorkflow(config)
+            previous = self.workflow.sessions.recent_turns(self.session_id, limit=1)
+            if previous:
+                print("↩️  Resuming previous conversation ('clear' to start over)")
             print("✓ Ready!\n")
             return True
         except Exception as e:
@@ -40,18 +174,6 @@ class HealthcareCLI:
             print("  TAVILY_API_KEY=your-key")
             return False
     
-    def format_history(self):
-        """Format chat history for context"""
-        if not self.history:
-            return ""
-        
-        context = "\n\nPrevious conversation:\n"
-        for i, msg in enumerate(self.history[-5:], 1):
-            context += f"{i}. User: {msg['query']}\n"
-            if 'intent' in msg.get('result', {}):
-                context += f"   Intent: {msg['result']['intent']}\n"
-        return context
-    
     def display_result(self, result: dict):
         """Display formatted result"""
         print("\n" + "="*60)
@@ -143,8 +265,25 @@ class HealthcareCLI:
                     if line.strip():
                         print(f"  {line.strip()}")
         
+        if result.get('degraded'):
+            print(f"\n⚠️  Partial answer - skipped or degraded: {', '.join(result['degraded'])}")
+        
         print("="*60 + "\n")
     
+    def run_live(self, user_input: str) -> dict:
+        """Run a query with live per-agent panels instead of the step log"""
+        view = LiveView()
+        with contextlib.redirect_stdout(io.StringIO()), \
+                Live(get_renderable=view.render, console=self.console, refresh_per_second=12,
+                     redirect_stdout=False, redirect_stderr=False):
+            result = self.workflow.run(user_input, session_id=self.session_id, on_event=view.on_event)
+        self.console.print(view.timings(), style="dim")
+        if result.get("status") == "blocked":
+            self.console.print(f"⚠️  Blocked: {result.get('reason')}", style="bold red")
+        if result.get("degraded"):
+            self.console.print(f"⚠️  Partial answer - skipped or degraded: {', '.join(result['degraded'])}", style="yellow")
+        return result
+    
     def run(self):
         """Main chat loop"""
         if not self.setup():
@@ -164,42 +303,36 @@ class HealthcareCLI:
                     break
                 
                 if user_input.lower() == 'clear':
-                    self.history.clear()
+                    self.workflow.sessions.delete(self.session_id)
                     print("🗑️  History cleared\n")
                     continue
                 
                 if user_input.lower() == 'history':
                     print("\n📜 Chat History:")
-                    if self.history:
-                        for i, msg in enumerate(self.history, 1):
+                    turns = self.workflow.sessions.recent_turns(self.session_id, limit=20)
+                    if turns:
+                        for i, msg in enumerate(turns, 1):
                             print(f"{i}. {msg['query']}")
                     else:
                         print("  (empty)")
                     print()
                     continue
                 
-                # Add context from history
-                query_with_context = user_input
-                if self.history:
-                    query_with_context = user_input + self.format_history()
+                if self.live:
+                    self.run_live(user_input)
+                    continue
                 
                 # Process query
                 print("\n" + "🔍 PROCESSING QUERY ".center(60, "="))
                 print(f"Query: {user_input}")
-                if self.history:
-                    print(f"Context: Including last {min(5, len(self.history))} messages")
+                if self.workflow.sessions.get(self.session_id).context():
+                    print("Context: Including summarized conversation history")
                 print("="*60 + "\n")
                 
                 print("🤔 Starting workflow...\n")
-                result = self.workflow.run(query_with_context)
+                result = self.workflow.run(user_input, session_id=self.session_id)
                 print("\n✓ Workflow complete!")
                 
-                # Store in history
-                self.history.append({
-                    'query': user_input,
-                    'result': result
-                })
-                
                 # Display result
                 self.display_result(result)
                 
@@ -213,6 +346,190 @@ class HealthcareCLI:
                 print()
 
 
+def prewarm_command(args):
+    """Pre-compute the top query clusters from a log into a cache file"""
+    print(f"🔥 Pre-warming {args.cache_db} from {args.log}")
+    config = HealthcareConfig(
+        cache_db_path=args.cache_db,
+        cache_responses=True,
+        cache_routing=True,
+        cache_search=True,
+        canonicalize_queries=True
+    )
+    workflow = HealthcareWorkflow(config)
+    
+    clusters = cluster_queries(read_queries(args.log), threshold=args.threshold)
+    print(f"   → {len(clusters)} query clusters, warming the top {min(args.top, len(clusters))}\n")
+    report = prewarm(workflow, clusters, top_n=args.top, concurrency=args.concurrency)
+    
+    print("\n" + "="*60)
+    print(f"Covered {report['queries_covered']}/{report['queries_total']} logged queries "
+          f"in {report['seconds']:.1f}s")
+    for outcome, count in sorted(report['outcomes'].items()):
+        print(f"  {outcome}: {count}")
+    for failure in report['failures']:
+        print(f"  ✗ {failure['query']}: {failure['error']}")
+    print("="*60)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def batch_command(args):
+    """Run a JSONL file of queries through the workflow"""
+    print(f"📦 Batch: {args.input} → {args.output} "
+          f"({args.workers} workers x {args.concurrency} concurrent requests)")
+    config_kwargs = {}
+    if args.timeout:
+        config_kwargs["request_timeout"] = args.timeout
+    report = run_batch(
+        args.input,
+        args.output,
+        workers=args.workers,
+        concurrency=args.concurrency,
+        chunk_size=args.chunk_size,
+        resume=not args.restart,
+        config_kwargs=config_kwargs,
+        verbose=args.verbose
+    )
+    print(f"\n✓ {report['processed']} queries in {report['seconds']:.1f}s ({report['errors']} errors)")
+
+
+def guardrail_command(args):
+    """Retrain the local guardrail from the decision log, or report its drift"""
+    if args.action == "train":
+        print(f"🛡️  Training local guardrail from {args.log}")
+        report = train_from_log(args.log, args.model, threshold=args.threshold)
+        holdout = report["holdout"]
+        print(f"   → {report['examples']} examples {report['category_counts']}, temperature {report['temperature']}")
+        if holdout:
+            local_accuracy = holdout["local_accuracy"]
+            print(f"   → Holdout: accuracy {holdout['accuracy']:.1%}, ECE {holdout['ece']:.3f}, "
+                  f"decided locally {holdout['local_share']:.1%}"
+                  + (f" at {local_accuracy:.1%} accuracy" if local_accuracy is not None else ""))
+        print(f"✓ Saved {args.model}")
+    else:
+        report = drift_report(LocalGuardrail.load(args.model), args.log)
+        print(f"🛡️  Guardrail drift over {report['entries']} logged decisions since training")
+        if report["entries"]:
+            print(f"   Safety agreement:    {report['safety_agreement']:.1%}")
+            print(f"   Category agreement:  {report['category_agreement']:.1%}")
+            print(f"   Would defer:         {report['defer_rate']:.1%}")
+            print(f"   Unseen features:     {report['unseen_feature_share']:.1%}")
+            print(f"   Category PSI:        {report['category_psi']:.3f}")
+        print("   → Retrain recommended" if report["retrain"] else "   → No retrain needed")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+def index_command(args):
+    """Build the sharded knowledge index, or update a live one in place"""
+    if args.action == "build":
+        build_index_command(args)
+        return
+    if not os.path.exists(os.path.join(args.output, MANIFEST)):
+        print(f"❌ No knowledge index in {args.output}; build it first")
+        return
+    # Compaction is run explicitly below, after the writes
+    index = ShardedKnowledgeIndex(args.output, EmbeddingCache(embeddings_by_name(args.embeddings)), compact_after=None)
+    if args.action in ("upsert", "delete") and not (args.shard and args.path):
+        print(f"❌ {args.action} needs --shard and a JSONL file of documents")
+        return
+    if args.action == "upsert":
+        ids = index.upsert(args.shard, read_documents(args.path))
+        print(f"✓ Upserted {len(ids)} documents into {args.shard}")
+    elif args.action == "delete":
+        with open(args.path) as f:
+            ids = [json.loads(line)["id"] for line in f if line.strip()]
+        index.delete(args.shard, ids)
+        print(f"✓ Deleted {len(ids)} ids from {args.shard}")
+    if args.action == "compact" or args.compact:
+        for name in [args.shard] if args.shard else index.shards:
+            entry = index.compact(name).result()
+            print(f"✓ {name}: {entry['documents']} documents, generation {entry.get('generation', 1)}")
+    index.close()
+
+
+def build_index_command(args):
+    """Build the sharded knowledge index from one JSONL file per shard"""
+    if not args.path:
+        print("❌ build needs a directory with one JSONL file per shard")
+        return
+    shards = {}
+    for name in SHARDS:
+        path = os.path.join(args.path, f"{name}.jsonl")
+        if os.path.exists(path):
+            shards[name] = read_documents(path)
+    if not shards:
+        print(f"❌ No shard files ({', '.join(f'{name}.jsonl' for name in SHARDS)}) in {args.path}")
+        return
+    print(f"📚 Building knowledge index {args.output} ({args.embeddings} embeddings"
+          + (f", {args.quantization} codes)" if args.quantization else ")"))
+    embeddings = embeddings_by_name(args.embeddings)
+    manifest = build_index(
+        args.output, shards, embeddings, quantization=args.quantization, pq_subvectors=args.pq_subvectors
+    )
+    print(f"✓ {sum(entry['documents'] for entry in manifest['shards'].values())} documents "
+          f"in {len(manifest['shards'])} shards")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Healthcare Assistant")
+    subcommands = parser.add_subparsers(dest="command")
+    chat = subcommands.add_parser("chat", help="Interactive chat (default)")
+    chat.add_argument("--live", action="store_true", help="Live per-agent panels with streamed answers and timings")
+    
+    warm = subcommands.add_parser("prewarm", help="Fill the caches from a query log before a deployment")
+    warm.add_argument("log", help="JSONL query log ('query', 'body' or 'title' field per line)")
+    warm.add_argument("--cache-db", default="healthcare_cache.db", help="Cache file to fill")
+    warm.add_argument("--top", type=int, default=100, help="Number of query clusters to warm")
+    warm.add_argument("--concurrency", type=int, default=4, help="Queries processed in parallel")
+    warm.add_argument("--threshold", type=float, default=0.6, help="Similarity for clustering queries")
+    warm.add_argument("--report", help="Write the report as JSON")
+    
+    batch = subcommands.add_parser("batch", help="Run a JSONL file of queries through the workflow")
+    batch.add_argument("input", help="JSONL input ('query', 'body' or 'title' field per line; 'id' optional)")
+    batch.add_argument("output", help="JSONL output, appended as results complete")
+    batch.add_argument("--workers", type=int, default=4, help="Worker processes")
+    batch.add_argument("--concurrency", type=int, default=8, help="Concurrent requests per worker")
+    batch.add_argument("--chunk-size", type=int, default=16, help="Queries sent to a worker at a time")
+    batch.add_argument("--timeout", type=float, help="Per-query deadline in seconds")
+    batch.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over")
+    batch.add_argument("--verbose", action="store_true", help="Show workflow step logs from workers")
+    
+    guard = subcommands.add_parser("guardrail", help="Train the local guardrail or report its drift")
+    guard.add_argument("action", choices=["train", "drift"])
+    guard.add_argument("log", help="Guardrail decision log (HealthcareConfig guardrail_log_path)")
+    guard.add_argument("--model", default="guardrail_model.json.gz", help="Model file")
+    guard.add_argument("--threshold", type=float, default=0.95, help="Probability needed to decide locally")
+    guard.add_argument("--report", help="Write the report as JSON")
+    
+    index = subcommands.add_parser("index", help="Build the sharded knowledge index or update it in place")
+    index.add_argument("action", choices=["build", "upsert", "delete", "compact"])
+    index.add_argument("path", nargs="?", help=(
+        f"build: directory with one JSONL file per shard ({', '.join(SHARDS)}); "
+        "upsert: JSONL documents; delete: JSONL with an 'id' per line"
+    ))
+    index.add_argument("--output", "--index", dest="output", default="knowledge_index", help="Index directory")
+    index.add_argument("--shard", help="Shard to update or compact (compact: all shards when omitted)")
+    index.add_argument("--compact", action="store_true", help="Compact the shard after upsert/delete")
+    index.add_argument("--embeddings", default="local", help='"local", "openai" or an OpenAI embedding model')
+    index.add_argument("--quantization", choices=["int8", "pq"], help="Search quantized codes instead of float32")
+    index.add_argument("--pq-subvectors", type=int, default=0, help="Bytes per vector for pq (default dimensions / 8)")
+    
+    args = parser.parse_args()
+    if args.command == "prewarm":
+        prewarm_command(args)
+    elif args.command == "batch":
+        batch_command(args)
+    elif args.command == "guardrail":
+        guardrail_command(args)
+    elif args.command == "index":
+        index_command(args)
+    else:
+        HealthcareCLI(live=getattr(args, "live", False)).run()
+
+
 if __name__ == "__main__":
-    cli = HealthcareCLI()
-    cli.run()
+    main()
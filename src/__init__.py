@@ -4,14 +4,24 @@ Healthcare Multi-Agent Workflow
 
 from .config import HealthcareConfig
 from .workflow import HealthcareWorkflow
-from .schemas import ClassificationSchema, SymptomCheckerSchema, GovernmentSchemeSchema
+from .session import ConversationSession
+from .schemas import (
+    ClassificationSchema,
+    SafetyIntentSchema,
+    SymptomCheckerSchema,
+    SymptomRecommendationSchema,
+    GovernmentSchemeSchema
+)
 
 __version__ = "1.0.0"
 
 __all__ = [
     'HealthcareConfig',
     'HealthcareWorkflow',
+    'ConversationSession',
     'ClassificationSchema',
+    'SafetyIntentSchema',
     'SymptomCheckerSchema',
+    'SymptomRecommendationSchema',
     'GovernmentSchemeSchema',
 ]
@@ -0,0 +1,218 @@
+"""
+Multi-process batch runner with streaming JSONL output and resume
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+# Per-process workflow, created once by the pool initializer
+_worker_workflow = None
+
+
+def iter_records(path: str) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+    """Stream (line_number, record) pairs; record is None for blank or invalid lines"""
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            record = None
+            if line:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    record = None
+            if isinstance(record, str):
+                record = {"query": record}
+            yield line_number, record if isinstance(record, dict) else None
+
+
+def record_query(record: Dict[str, Any]) -> Optional[str]:
+    return record.get("query") or record.get("body") or record.get("title")
+
+
+class Checkpoint:
+    """
+    Resume state for one output file.
+
+    watermark is the last input line such that every line up to it has been
+    written; done_after holds finished lines beyond it (bounded by the number
+    of lines in flight). output_offset is the output size at the last save,
+    so a partially written tail is truncated on resume.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.watermark = 0
+        self.done_after = set()
+        self.output_offset = 0
+
+    @classmethod
+    def load(cls, path: str) -> "Checkpoint":
+        checkpoint = cls(path)
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            checkpoint.watermark = state["watermark"]
+            checkpoint.done_after = set(state["done_after"])
+            checkpoint.output_offset = state["output_offset"]
+        return checkpoint
+
+    def is_done(self, line_number: int) -> bool:
+        return line_number <= self.watermark or line_number in self.done_after
+
+    def mark_done(self, line_number: int):
+        self.done_after.add(line_number)
+        while self.watermark + 1 in self.done_after:
+            self.watermark += 1
+            self.done_after.discard(self.watermark)
+
+    def save(self, output_offset: int):
+        self.output_offset = output_offset
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "watermark": self.watermark,
+                "done_after": sorted(self.done_after),
+                "output_offset": output_offset
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def _init_worker(config_kwargs: Dict[str, Any], verbose: bool):
+    """Pool initializer: build one workflow per process"""
+    global _worker_workflow
+    if not verbose:
+        sys.stdout = open(os.devnull, "w")
+    from .config import HealthcareConfig
+    from .workflow import HealthcareWorkflow
+    _worker_workflow = HealthcareWorkflow(HealthcareConfig(**config_kwargs))
+
+
+async def _run_chunk_async(chunk: List[Tuple[int, Dict[str, Any]]], concurrency: int) -> List[Tuple[int, str, bool]]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(line_number: int, record: Dict[str, Any]) -> Tuple[int, str, bool]:
+        async with semaphore:
+            query = record_query(record)
+            output = {"id": record.get("id") or record.get("request_id") or f"line-{line_number}", "query": query}
+            start = time.perf_counter()
+            try:
+                # The workflow is synchronous; each call gets its own thread
+                output["result"] = await asyncio.to_thread(_worker_workflow.run, query)
+            except Exception as e:
+                output["error"] = f"{type(e).__name__}: {e}"
+            output["seconds"] = round(time.perf_counter() - start, 3)
+            return line_number, json.dumps(output, ensure_ascii=False, default=str), "error" not in output
+
+    return await asyncio.gather(*(run_one(n, r) for n, r in chunk))
+
+
+def _run_chunk(chunk: List[Tuple[int, Dict[str, Any]]], concurrency: int) -> List[Tuple[int, str, bool]]:
+    """Worker entry point: process one chunk with async concurrency; returns (line, JSON, ok)"""
+    return asyncio.run(_run_chunk_async(chunk, concurrency))
+
+
+def _chunks(records: Iterator[Tuple[int, Optional[Dict[str, Any]]]], checkpoint: Checkpoint, size: int):
+    """Group pending records into chunks, marking skipped lines as done right away"""
+    chunk = []
+    for line_number, record in records:
+        if checkpoint.is_done(line_number):
+            continue
+        if record is None or not record_query(record):
+            checkpoint.mark_done(line_number)
+            continue
+        chunk.append((line_number, record))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_batch(
+    input_path: str,
+    output_path: str,
+    workers: int = 4,
+    concurrency: int = 8,
+    chunk_size: int = 16,
+    resume: bool = True,
+    config_kwargs: Optional[Dict[str, Any]] = None,
+    verbose: bool = False
+) -> Dict[str, Any]:
+    """
+    Push a JSONL file of queries through the workflow.
+
+    Input is read as a stream and sent to a process pool in chunks; at most
+    2 * workers chunks are in flight, so memory stays bounded whatever the
+    input size. Each worker runs up to concurrency requests at once. Results
+    are appended to output_path as they complete (in completion order) and a
+    checkpoint next to it lets an interrupted run resume where it stopped.
+    """
+    checkpoint_path = output_path + ".checkpoint"
+    if resume and os.path.exists(output_path):
+        checkpoint = Checkpoint.load(checkpoint_path)
+    else:
+        checkpoint = Checkpoint(checkpoint_path)
+
+    if checkpoint.watermark or checkpoint.done_after:
+        print(f"↩️  Resuming after line {checkpoint.watermark} ({len(checkpoint.done_after)} more done)")
+
+    # Each process has its own rate limiters, so split the provider budget
+    config_kwargs = dict(config_kwargs or {})
+    config_kwargs.setdefault("openai_rpm", 500 / workers)
+    config_kwargs.setdefault("openai_tpm", 200000 / workers)
+    config_kwargs.setdefault("tavily_rpm", 100 / workers)
+
+    processed = errors = 0
+    start = time.perf_counter()
+    mode = "r+" if checkpoint.output_offset else "w"
+    with open(output_path, mode) as out:
+        # Drop anything written after the last checkpoint
+        out.seek(checkpoint.output_offset)
+        out.truncate()
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(config_kwargs, verbose)
+        ) as pool:
+            pending = set()
+            chunks = _chunks(iter_records(input_path), checkpoint, chunk_size)
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < 2 * workers:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                        break
+                    pending.add(pool.submit(_run_chunk, chunk, concurrency))
+                if not pending:
+                    break
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for line_number, line, ok in future.result():
+                        out.write(line + "\n")
+                        checkpoint.mark_done(line_number)
+                        processed += 1
+                        errors += not ok
+                    out.flush()
+                    checkpoint.save(out.tell())
+                    rate = processed / (time.perf_counter() - start)
+                    print(f"   ✓ {processed} done ({errors} errors, {rate:.1f}/s)", flush=True)
+
+        checkpoint.save(out.tell())
+
+    return {
+        "processed": processed,
+        "errors": errors,
+        "seconds": time.perf_counter() - start,
+        "watermark": checkpoint.watermark,
+    }
@@ -0,0 +1,287 @@
+"""
+Caching for routing decisions, search results and whole responses
+"""
+
+import copy
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .metrics import metrics
+
+
+# Seconds a cached response stays fresh, per intent. Intents not listed here
+# are never cached: symptom checks and mental wellness answers depend on the
+# person (mental wellness can be opted in through response_cache_ttls).
+DEFAULT_RESPONSE_TTLS = {
+    "government_scheme_support": 24 * 3600.0,
+    "ayush_support": 24 * 3600.0,
+    "facility_locator_support": 3600.0,
+}
+
+# Intents whose first-person or distress messages are never cached, even
+# when the intent itself is
+PERSONAL_INTENTS = {"mental_wellness_support"}
+PERSONAL = re.compile(
+    r"\b(?:i|i'm|im|i've|me|my|myself|mujhe|main|mera|meri)\b|suicid|self[- ]?harm|kill|die\b|"
+    r"hopeless|worthless|crisis|panic|can'?t (?:cope|go on|take)",
+    re.IGNORECASE
+)
+
+# After its TTL an entry may still be served for this fraction of the TTL
+# while a background refresh replaces it (stale-while-revalidate)
+STALE_FRACTION = 0.5
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+def canonicalize(text: str, group: str, canonicalizer=None) -> str:
+    """Cache key text: the canonicalizer's canonical form, or the normalized query"""
+    if canonicalizer is None:
+        return normalize_query(text)
+    return canonicalizer.canonical_key(text, group)
+
+
+def make_key(namespace: str, intent: str, text: str) -> str:
+    """Cache key: namespace, intent (for per-intent invalidation) and a digest of the text"""
+    digest = hashlib.sha1(text.encode("utf-8")).hexdigest()[:20]
+    return f"{namespace}:{intent}:{digest}"
+
+
+class CacheBackend(ABC):
+    """
+    Interface for cache storage.
+
+    Entries are dicts with at least "value" and "created_at". Keys have the
+    form namespace:intent:digest (see make_key).
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """The entry stored under key, or None"""
+
+    @abstractmethod
+    def set(self, key: str, entry: Dict[str, Any]):
+        """Store entry under key, replacing any previous one"""
+
+    @abstractmethod
+    def delete_prefix(self, prefix: str) -> int:
+        """Delete all keys starting with prefix; returns how many"""
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """Thread-safe LRU dict bounded by entry count"""
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_prefix(self, prefix: str) -> int:
+        with self._lock:
+            keys = [key for key in self._entries if key.startswith(prefix)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Cache entries in a SQLite file, shared between processes and deployments
+    (used to pre-warm a new deployment, see prewarm.py)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, entry TEXT NOT NULL)"
+            )
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT entry FROM cache WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, entry: Dict[str, Any]):
+        data = json.dumps(entry, separators=(",", ":"), ensure_ascii=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, entry) VALUES (?, ?)", (key, data)
+            )
+
+    def delete_prefix(self, prefix: str) -> int:
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM cache WHERE key LIKE ? ESCAPE '\\'", (escaped + "%",)
+            )
+        return cursor.rowcount
+
+
+class TTLCache:
+    """
+    Single-TTL cache for one kind of value (routing decisions, search results).
+
+    group is the middle part of the key, so all entries of a group (an intent
+    or a chain) can be invalidated together.
+    """
+
+    def __init__(self, backend: CacheBackend, namespace: str, ttl: float, canonicalizer=None):
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = ttl
+        self.canonicalizer = canonicalizer
+
+    def key(self, text: str, group: str = "all") -> str:
+        return make_key(self.namespace, group, canonicalize(text, group, self.canonicalizer))
+
+    def get(self, text: str, group: str = "all") -> Optional[Any]:
+        entry = self.backend.get(self.key(text, group))
+        if entry is None or time.time() - entry["created_at"] >= self.ttl:
+            metrics.increment(f"cache.{self.namespace}.miss")
+            return None
+        metrics.increment(f"cache.{self.namespace}.hit")
+        return copy.deepcopy(entry["value"])
+
+    def put(self, text: str, value: Any, group: str = "all"):
+        self.backend.set(self.key(text, group), {"value": copy.deepcopy(value), "created_at": time.time()})
+
+    def invalidate(self, group: Optional[str] = None) -> int:
+        prefix = f"{self.namespace}:{group}:" if group else f"{self.namespace}:"
+        return self.backend.delete_prefix(prefix)
+
+
+class ResponseCache:
+    """
+    Whole-response cache keyed by normalized query + intent.
+
+    Per-intent TTLs decide freshness. Stale entries are still served while a
+    background refresh recomputes them, and at most one refresh per key runs
+    at a time.
+    """
+
+    namespace = "response"
+
+    def __init__(
+        self,
+        backend: Optional[CacheBackend] = None,
+        ttls: Optional[Dict[str, float]] = None,
+        stale_fraction: float = STALE_FRACTION,
+        canonicalizer=None
+    ):
+        self.backend = backend or InMemoryCacheBackend()
+        self.canonicalizer = canonicalizer
+        self.ttls = dict(DEFAULT_RESPONSE_TTLS)
+        self.ttls.update(ttls or {})
+        self.stale_fraction = stale_fraction
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+
+    def is_cacheable(self, intent: Optional[str], query: Optional[str] = None) -> bool:
+        """Whether intent is cached at all and, given the query, whether this one is"""
+        if not intent or self.ttls.get(intent, 0) <= 0:
+            return False
+        return not (query is not None and intent in PERSONAL_INTENTS and PERSONAL.search(query))
+
+    def key(self, query: str, intent: str) -> str:
+        return make_key(self.namespace, intent, canonicalize(query, intent, self.canonicalizer))
+
+    def lookup(self, query: str, intent: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Returns (result, "fresh" | "stale") or (None, None) on a miss"""
+        if not self.is_cacheable(intent, query):
+            return None, None
+        entry = self.backend.get(self.key(query, intent))
+        if entry is None:
+            metrics.increment("cache.response.miss")
+            return None, None
+
+        ttl = self.ttls[intent]
+        age = time.time() - entry["created_at"]
+        if age < ttl:
+            metrics.increment("cache.response.hit")
+            return copy.deepcopy(entry["value"]), "fresh"
+        if age < ttl * (1 + self.stale_fraction):
+            metrics.increment("cache.response.stale")
+            return copy.deepcopy(entry["value"]), "stale"
+        metrics.increment("cache.response.miss")
+        return None, None
+
+    @staticmethod
+    def should_store(result: Dict[str, Any]) -> bool:
+        """Never cache blocked, degraded or emergency answers"""
+        output = result.get("output")
+        return (
+            result.get("status") != "blocked"
+            and not result.get("degraded")
+            and not (isinstance(output, dict) and output.get("emergency"))
+            and bool(output)
+        )
+
+    def store(self, query: str, intent: str, result: Dict[str, Any]) -> bool:
+        """Cache a result if its intent and content allow it; returns whether it was stored"""
+        if not self.is_cacheable(intent, query) or not self.should_store(result):
+            return False
+        self.backend.set(self.key(query, intent), {
+            "value": copy.deepcopy(result),
+            "intent": intent,
+            "created_at": time.time()
+        })
+        return True
+
+    def refresh_in_background(self, query: str, intent: str, compute: Callable[[], Dict[str, Any]]):
+        """Recompute an entry in a worker thread unless a refresh for it is already running"""
+        key = self.key(query, intent)
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self.store(query, intent, compute())
+                metrics.increment("cache.response.refreshed")
+            except Exception as e:
+                print(f"   ⚠️  Background cache refresh failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._executor.submit(refresh)
+
+    def invalidate(self, intent: Optional[str] = None) -> int:
+        """Drop cached responses for one intent (all intents when None)"""
+        prefix = f"{self.namespace}:{intent}:" if intent else f"{self.namespace}:"
+        return self.backend.delete_prefix(prefix)
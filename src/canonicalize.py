@@ -0,0 +1,346 @@
+"""
+Paraphrase-tolerant query canonicalization for cache keys
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from .metrics import metrics
+
+
+# Multi-word spellings folded into one token before tokenizing
+PHRASES = {
+    "pm jay": "pmjay",
+    "pm jaay": "pmjay",
+    "pradhan mantri jan arogya yojana": "pmjay",
+    "ayushman bharat": "ayushmanbharat",
+    "ab pmjay": "pmjay",
+    "ab ark": "abark",
+    "health card": "healthcard",
+    "primary health centre": "phc",
+    "primary health center": "phc",
+    "mental health": "mentalhealth",
+}
+
+# Romanized Hindi and spelling variants mapped to one form
+TOKEN_VARIANTS = {
+    "ayurved": "ayurveda", "ayurvedic": "ayurveda", "aayurved": "ayurveda", "aayurveda": "ayurveda",
+    "yog": "yoga", "yogasana": "yoga", "asana": "yoga", "asanas": "yoga",
+    "pranayam": "pranayama",
+    "homoeopathy": "homeopathy", "homeopathic": "homeopathy",
+    "dawai": "medicine", "davai": "medicine", "dawa": "medicine", "medicines": "medicine",
+    "aspatal": "hospital", "haspatal": "hospital", "hospitals": "hospital",
+    "bimari": "disease", "rog": "disease", "diseases": "disease",
+    "dard": "pain", "bukhar": "fever", "sardi": "cold", "khansi": "cough",
+    "tanav": "stress", "chinta": "anxiety",
+    "yojna": "yojana",
+    "schemes": "scheme", "benefits": "benefit", "remedies": "remedy",
+    "cannot": "not", "cant": "not", "dont": "not", "doesnt": "not", "didnt": "not",
+    "isnt": "not", "arent": "not", "shouldnt": "not", "wont": "not",
+    "nahin": "nahi", "nhi": "nahi",
+}
+
+# Contractions expanded before punctuation is stripped ("can't" -> "can not")
+CONTRACTIONS = [(re.compile(r"\bcan[’']t\b"), "can not"), (re.compile(r"\bwon[’']t\b"), "will not"),
+                (re.compile(r"n[’']t\b"), " not")]
+
+# English and romanized-Hindi function words plus question filler
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "be", "am", "i", "me", "my", "we", "you", "your",
+    "it", "its", "this", "that", "these", "those", "of", "for", "to", "in", "on", "at", "by",
+    "with", "about", "and", "or", "do", "does", "can", "could", "would", "should", "will",
+    "what", "which", "who", "how", "why", "when", "where", "there", "any", "some",
+    "tell", "explain", "know", "want", "need", "please", "pls", "plz", "give", "get",
+    "details", "detail", "information", "info", "regarding", "kindly", "hi", "hello",
+    "kya", "hai", "hain", "ka", "ki", "ke", "ko", "mein", "me", "se", "liye", "aur", "bhi",
+    "batao", "bataiye", "kaise", "kaun", "kab", "kahan", "mujhe", "hum", "main",
+}
+
+# Negation and polarity words: "safe" / "unsafe" and "available" /
+# "not available" read alike but answer opposite questions
+POLARITY = {"not", "no", "never", "without", "unsafe", "avoid", "nahi", "mat"}
+
+# Words that add nothing to a query's meaning for cache keys ("what is pmjay" /
+# "tell me about pmjay scheme"). Kept by canonical_tokens for scheme matching.
+KEY_FILLER = {"scheme", "yojana"}
+
+# Words followed by a letter naming a variant ("hepatitis a", "type i"), where
+# "a" and "i" are not the article and pronoun
+LETTER_QUALIFIED = {
+    "vitamin", "hepatitis", "hep", "type", "stage", "grade", "class", "group", "phase",
+    "influenza", "flu", "blood",
+}
+
+# Large Mersenne prime for the universal hash family
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 61) - 1
+
+
+def canonical_tokens(text: str) -> List[str]:
+    """Normalized, variant-folded, stopword-free tokens of a query"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    for pattern, replacement in CONTRACTIONS:
+        text = pattern.sub(replacement, text)
+    text = re.sub(r"[^\w\s]", " ", text)
+    text = " ".join(text.split())
+    for phrase, replacement in PHRASES.items():
+        if phrase in text:
+            text = re.sub(rf"\b{phrase}\b", replacement, text)
+
+    tokens = []
+    previous = None
+    for token in text.split():
+        token = TOKEN_VARIANTS.get(token, token)
+        if token in STOPWORDS and not (len(token) == 1 and previous in LETTER_QUALIFIED):
+            previous = None
+            continue
+        previous = token
+        # Romanization often doubles vowels ("aayurveda", "yoogaa")
+        token = re.sub(r"([aeiou])\1+", r"\1", token)
+        token = TOKEN_VARIANTS.get(token, token)
+        if token not in STOPWORDS or len(token) == 1:
+            tokens.append(token)
+    return tokens
+
+
+def anchor_tokens(tokens: List[str]) -> Tuple[str, ...]:
+    """
+    Single letters, tokens with digits and polarity words, which set apart
+    queries that are otherwise near-duplicates ("type 1" / "type 2",
+    "vitamin d" / "vitamin b12", "safe" / "unsafe")
+    """
+    return tuple(sorted({
+        token for token in tokens
+        if len(token) == 1 or token in POLARITY or any(ch.isdigit() for ch in token)
+    }))
+
+
+def canonical_text(text: str) -> str:
+    """Deterministic canonical form: sorted unique canonical tokens, less key filler"""
+    tokens = set(canonical_tokens(text))
+    tokens = sorted(tokens - KEY_FILLER or tokens)
+    # Queries made only of filler words keep their normalized form
+    return " ".join(tokens) if tokens else " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def shingles(tokens: List[str]) -> Set[str]:
+    """Tokens plus boundary-marked character trigrams (tolerates spelling variants)"""
+    features = set(tokens)
+    for token in tokens:
+        padded = f"#{token}#"
+        features.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return features
+
+
+def _choose_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """Pick (bands, rows) whose LSH S-curve midpoint (1/b)^(1/r) is closest to threshold"""
+    best = (num_perm, 1)
+    best_error = float("inf")
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        error = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class _Entry:
+    __slots__ = ("canonical", "group", "signature", "band_keys")
+
+    def __init__(self, canonical, group, signature, band_keys):
+        self.canonical = canonical
+        self.group = group
+        self.signature = signature
+        self.band_keys = band_keys
+
+
+class QueryCanonicalizer:
+    """
+    Maps near-duplicate queries to one canonical key.
+
+    Queries are first reduced deterministically (canonical_text). Paraphrases
+    that still differ are matched with MinHash signatures in an LSH index with
+    banding. Candidates are looked up per band in O(1) expected time and
+    accepted when their estimated Jaccard similarity is at least threshold.
+    Entries are scoped by group (e.g. intent) and by their anchor tokens
+    (see anchor_tokens), which must match exactly, and bounded by max_entries.
+    An optional path persists the canonical forms so that a restarted
+    process, or one reading a pre-warmed cache, maps paraphrases the same way.
+    New forms are appended to it; once it holds more than twice max_entries
+    lines it is rewritten with the forms still in memory.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.75,
+        num_perm: int = 64,
+        max_entries: int = 100000,
+        path: Optional[str] = None,
+        seed: int = 7
+    ):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands, self.rows = _choose_bands(num_perm, threshold)
+        self.max_entries = max_entries
+        self.path = path
+        # Fixed-seed permutations so signatures are stable across processes
+        digest = hashlib.sha256(str(seed).encode()).digest()
+        rng_state = int.from_bytes(digest, "big")
+        self._perms = []
+        for _ in range(num_perm):
+            rng_state = (rng_state * 6364136223846793005 + 1442695040888963407) % (1 << 128)
+            a = (rng_state >> 64) % _PRIME or 1
+            rng_state = (rng_state * 6364136223846793005 + 1442695040888963407) % (1 << 128)
+            b = (rng_state >> 64) % _PRIME
+            self._perms.append((a, b))
+
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._buckets: Dict[tuple, List[Tuple[str, str]]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.exact_hits = 0
+        self.near_hits = 0
+        self._persisted = 0
+
+        if path and os.path.exists(path):
+            self._load(path)
+
+    def signature(self, features: Set[str]) -> Tuple[int, ...]:
+        if not features:
+            return tuple([_MAX_HASH] * self.num_perm)
+        base = [
+            int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "big")
+            for f in features
+        ]
+        return tuple(min((a * x + b) % _PRIME for x in base) for a, b in self._perms)
+
+    def _band_keys(self, group: str, canonical: str, signature: Tuple[int, ...]) -> List[tuple]:
+        anchors = anchor_tokens(canonical.split())
+        return [
+            (group, anchors, band, hash(signature[band * self.rows:(band + 1) * self.rows]))
+            for band in range(self.bands)
+        ]
+
+    @staticmethod
+    def similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+        """Estimated Jaccard similarity of two signatures"""
+        return sum(x == y for x, y in zip(sig_a, sig_b)) / len(sig_a)
+
+    def canonical_key(self, query: str, group: str = "all") -> str:
+        """Canonical text for a query, registering it as a new canonical if unseen"""
+        canonical = canonical_text(query)
+        with self._lock:
+            self.lookups += 1
+            entry = self._entries.get((group, canonical))
+            if entry is not None:
+                self._entries.move_to_end((group, canonical))
+                self.exact_hits += 1
+                metrics.increment("canonicalize.exact")
+                return entry.canonical
+
+        signature = self.signature(shingles(canonical.split()))
+        band_keys = self._band_keys(group, canonical, signature)
+
+        with self._lock:
+            best, best_score = None, self.threshold
+            seen = set()
+            for band_key in band_keys:
+                for entry_key in self._buckets.get(band_key, ()):
+                    if entry_key in seen:
+                        continue
+                    seen.add(entry_key)
+                    score = self.similarity(signature, self._entries[entry_key].signature)
+                    if score >= best_score:
+                        best, best_score = entry_key, score
+            if best is not None:
+                self.near_hits += 1
+                metrics.increment("canonicalize.near_duplicate")
+                # Remember this wording as an alias for direct lookups next time
+                target = self._entries[best]
+                self._add(group, canonical, _Entry(target.canonical, group, signature, []))
+                return target.canonical
+
+            metrics.increment("canonicalize.new")
+            self._add(group, canonical, _Entry(canonical, group, signature, band_keys))
+        self._persist(group, canonical)
+        return canonical
+
+    def _add(self, group: str, text: str, entry: _Entry):
+        key = (group, text)
+        if key in self._entries:
+            return
+        self._entries[key] = entry
+        for band_key in entry.band_keys:
+            self._buckets[band_key].append(key)
+        while len(self._entries) > self.max_entries:
+            old_key, old = self._entries.popitem(last=False)
+            for band_key in old.band_keys:
+                bucket = self._buckets.get(band_key)
+                if bucket and old_key in bucket:
+                    bucket.remove(old_key)
+                    if not bucket:
+                        del self._buckets[band_key]
+
+    def _persist(self, group: str, canonical: str):
+        if not self.path:
+            return
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"group": group, "canonical": canonical}) + "\n")
+            self._persisted += 1
+            if self._persisted > 2 * self.max_entries:
+                self._rewrite()
+
+    def _rewrite(self):
+        """Replace the file with the canonical forms in memory, least recently used first"""
+        records = [
+            json.dumps({"group": group, "canonical": text}) + "\n"
+            for (group, text), entry in self._entries.items() if entry.band_keys
+        ]
+        try:
+            with open(self.path + ".tmp", "w") as f:
+                f.writelines(records)
+            os.replace(self.path + ".tmp", self.path)
+        except OSError as e:
+            print(f"   ⚠️  Could not rewrite canonical index {self.path}: {e}")
+            return
+        self._persisted = len(records)
+
+    def _load(self, path: str):
+        with open(path) as f:
+            for line in f:
+                self._persisted += 1
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                group, canonical = record["group"], record["canonical"]
+                signature = self.signature(shingles(canonical.split()))
+                self._add(group, canonical, _Entry(
+                    canonical, group, signature, self._band_keys(group, canonical, signature)
+                ))
+
+    def stats(self) -> Dict[str, float]:
+        """Lookup counts and hit rates (exact canonical-text hits and LSH near-duplicate hits)"""
+        with self._lock:
+            hits = self.exact_hits + self.near_hits
+            return {
+                "lookups": self.lookups,
+                "exact_hits": self.exact_hits,
+                "near_duplicate_hits": self.near_hits,
+                "hit_rate": hits / self.lookups if self.lookups else 0.0,
+                "near_duplicate_rate": self.near_hits / self.lookups if self.lookups else 0.0,
+                "entries": len(self._entries),
+                "threshold": self.threshold,
+                "bands": self.bands,
+                "rows": self.rows,
+            }
@@ -0,0 +1,149 @@
+"""
+Record/replay of LLM and search calls for deterministic benchmarks
+"""
+
+import asyncio
+import gzip
+import hashlib
+import importlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List
+
+from .metrics import metrics
+
+
+class CassetteMiss(LookupError):
+    """A replayed request was not recorded in the cassette"""
+
+
+def request_key(kind: str, chain: str, request: Any) -> str:
+    """Digest identifying a call: kind ("llm" or "search"), chain class and input"""
+    data = json.dumps([kind, chain, request], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def dump_response(response: Any) -> Dict[str, Any]:
+    """JSON form of a response; Pydantic models keep their class to be rebuilt on replay"""
+    if hasattr(response, "model_dump"):
+        cls = type(response)
+        return {"model": f"{cls.__module__}:{cls.__qualname__}", "data": response.model_dump()}
+    return {"data": response}
+
+
+def load_response(stored: Dict[str, Any]) -> Any:
+    if "model" in stored:
+        module, name = stored["model"].split(":")
+        return getattr(importlib.import_module(module), name).model_validate(stored["data"])
+    return stored["data"]
+
+
+class Cassette:
+    """
+    Gzipped JSONL recording of LLM and search calls with their latency.
+
+    In "record" mode every call is made and appended to the file with its
+    input, output and duration. In "replay" mode calls are answered from the
+    file without touching the network. Repeated identical requests (e.g. a
+    cascade retrying on a larger model) are replayed in recorded order.
+    With replay_latency each replayed call sleeps for its recorded duration
+    (divided by speed), so a recorded production trace becomes a repeatable
+    benchmark of the orchestration around the calls.
+    """
+
+    MODES = ("record", "replay")
+
+    def __init__(self, path: str, mode: str = "replay", replay_latency: bool = False, speed: float = 1.0):
+        if mode not in self.MODES:
+            raise ValueError(f"Cassette mode must be one of {self.MODES}, got {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self.speed = speed
+        self._entries: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._cursors: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        if mode == "replay":
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Cassette not found: {path}")
+            self._load()
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+    def _load(self):
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Tail of a recording that was interrupted mid-write
+                    continue
+                self._entries[entry["key"]].append(entry)
+
+    def _record(self, kind: str, chain: str, request: Any, response: Any, seconds: float):
+        entry = {
+            "key": request_key(kind, chain, request),
+            "kind": kind,
+            "chain": chain,
+            "seconds": round(seconds, 4),
+            "request": request,
+            "response": dump_response(response),
+        }
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=str)
+        with self._lock, gzip.open(self.path, "at", encoding="utf-8") as f:
+            f.write(line + "\n")
+        metrics.increment(f"cassette.{kind}.recorded")
+
+    def _next(self, kind: str, chain: str, request: Any) -> Dict[str, Any]:
+        key = request_key(kind, chain, request)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                metrics.increment(f"cassette.{kind}.miss")
+                raise CassetteMiss(f"No recorded {kind} call for {chain} with this input")
+            # Past the last recording of a request, keep serving the last one
+            index = min(self._cursors[key], len(entries) - 1)
+            self._cursors[key] += 1
+        metrics.increment(f"cassette.{kind}.replayed")
+        return entries[index]
+
+    def _delay(self, entry: Dict[str, Any]) -> float:
+        return entry["seconds"] / self.speed if self.replay_latency and self.speed > 0 else 0.0
+
+    def wrap(self, kind: str, chain: str, fn: Callable[[Any], Any]) -> Callable[[Any], Any]:
+        """Record or replay fn(request) according to the mode"""
+        def call(request: Any) -> Any:
+            if self.replaying:
+                entry = self._next(kind, chain, request)
+                delay = self._delay(entry)
+                if delay:
+                    time.sleep(delay)
+                return load_response(entry["response"])
+            start = time.perf_counter()
+            response = fn(request)
+            self._record(kind, chain, request, response, time.perf_counter() - start)
+            return response
+        return call
+
+    def wrap_async(self, kind: str, chain: str, fn: Callable[[Any], Any]) -> Callable[[Any], Any]:
+        """wrap() for coroutine functions"""
+        async def call(request: Any) -> Any:
+            if self.replaying:
+                entry = self._next(kind, chain, request)
+                delay = self._delay(entry)
+                if delay:
+                    await asyncio.sleep(delay)
+                return load_response(entry["response"])
+            start = time.perf_counter()
+            response = await fn(request)
+            self._record(kind, chain, request, response, time.perf_counter() - start)
+            return response
+        return call
@@ -2,22 +2,32 @@
 Chain package initialization
 """
 
-from .base_chains import GuardrailChain, IntentClassifierChain, SymptomCheckerChain
+from .base_chains import (
+    GuardrailChain,
+    IntentClassifierChain,
+    SafetyIntentChain,
+    SymptomCheckerChain,
+    ConversationSummaryChain
+)
 from .specialized_chains import (
     GovernmentSchemeChain,
     MentalWellnessChain,
     YogaChain,
     AyushChain,
-    HospitalLocatorChain
+    HospitalLocatorChain,
+    SymptomRecommendationChain
 )
 
 __all__ = [
     'GuardrailChain',
     'IntentClassifierChain',
+    'SafetyIntentChain',
     'SymptomCheckerChain',
+    'ConversationSummaryChain',
     'GovernmentSchemeChain',
     'MentalWellnessChain',
     'YogaChain',
     'AyushChain',
     'HospitalLocatorChain',
+    'SymptomRecommendationChain',
 ]
@@ -2,13 +2,25 @@
 Specialized chain implementations
 """
 
-from .base_chains import SearchBasedChain
+import hashlib
+import json
+from typing import Any, Dict, List
+
+from .base_chains import SearchBasedChain, format_history
+from ..schemas import SymptomRecommendationSchema
 
 
 class GovernmentSchemeChain(SearchBasedChain):
     """Handles government scheme queries"""
     
-    def __init__(self, llm, search_tool):
+    expansion_templates = ("Ayushman Bharat PMJAY eligibility {query}", "state government health insurance scheme {query}")
+    knowledge_shards = ("schemes",)
+    
+    # Optional SchemeCatalogue answering known schemes and eligibility
+    # questions without a web search, set by the workflow
+    catalogue = None
+    
+    def __init__(self, llm, search_tool, rate_limits=None):
         system_prompt = """You are a government healthcare scheme advisor for India.
 
 Based on the user query and search results:
@@ -18,17 +30,26 @@ Based on the user query and search results:
 
 Search results available:
 {search_results}"""
-        super().__init__(llm, search_tool, system_prompt)
+        super().__init__(llm, search_tool, system_prompt, rate_limits)
     
-    def run(self, user_input: str) -> str:
+    def run(self, user_input: str, history: str = "") -> str:
+        if self.catalogue is not None:
+            match = self.catalogue.lookup(user_input)
+            if match is not None:
+                print(f"      → {len(match['schemes'])} schemes from the local catalogue")
+                return self.generate(user_input, self.catalogue.as_results(match), history)
+            print(f"      → Not in the scheme catalogue, searching the web")
         search_query = f"India government health schemes {user_input}"
-        return self.search_and_generate(user_input, search_query)
+        return self.search_and_generate(user_input, search_query, history)
 
 
 class MentalWellnessChain(SearchBasedChain):
     """Handles mental wellness support"""
     
-    def __init__(self, llm, search_tool):
+    expansion_templates = ("coping strategies {query}", "counselling helpline India {query}")
+    knowledge_shards = ("mental_health",)
+    
+    def __init__(self, llm, search_tool, rate_limits=None):
         system_prompt = """You are a compassionate mental wellness counselor.
 
 Provide:
@@ -39,17 +60,20 @@ Provide:
 
 Use search results for current resources:
 {search_results}"""
-        super().__init__(llm, search_tool, system_prompt)
+        super().__init__(llm, search_tool, system_prompt, rate_limits)
     
-    def run(self, user_input: str) -> str:
+    def run(self, user_input: str, history: str = "") -> str:
         search_query = f"mental health support resources India {user_input}"
-        return self.search_and_generate(user_input, search_query)
+        return self.search_and_generate(user_input, search_query, history)
 
 
 class YogaChain(SearchBasedChain):
     """Provides yoga recommendations"""
     
-    def __init__(self, llm, search_tool):
+    expansion_templates = ("yoga asanas for {query}", "pranayama breathing exercises for {query}")
+    knowledge_shards = ("yoga",)
+    
+    def __init__(self, llm, search_tool, rate_limits=None):
         system_prompt = """You are a certified yoga instructor.
 
 Provide:
@@ -60,17 +84,20 @@ Provide:
 
 Search results:
 {search_results}"""
-        super().__init__(llm, search_tool, system_prompt)
+        super().__init__(llm, search_tool, system_prompt, rate_limits)
     
-    def run(self, user_input: str) -> str:
+    def run(self, user_input: str, history: str = "") -> str:
         search_query = f"yoga therapy recommendations {user_input}"
-        return self.search_and_generate(user_input, search_query)
+        return self.search_and_generate(user_input, search_query, history)
 
 
 class AyushChain(SearchBasedChain):
     """Handles AYUSH-related queries"""
     
-    def __init__(self, llm, search_tool):
+    expansion_templates = ("ayurvedic remedies for {query}", "Ministry of AYUSH guidelines {query}")
+    knowledge_shards = ("ayurveda",)
+    
+    def __init__(self, llm, search_tool, rate_limits=None):
         system_prompt = """You are an AYUSH (Ayurveda, Yoga, Unani, Siddha, Homeopathy) advisor.
 
 Provide:
@@ -81,17 +108,19 @@ Provide:
 
 Search results:
 {search_results}"""
-        super().__init__(llm, search_tool, system_prompt)
+        super().__init__(llm, search_tool, system_prompt, rate_limits)
     
-    def run(self, user_input: str) -> str:
+    def run(self, user_input: str, history: str = "") -> str:
         search_query = f"AYUSH ministry India schemes {user_input}"
-        return self.search_and_generate(user_input, search_query)
+        return self.search_and_generate(user_input, search_query, history)
 
 
 class HospitalLocatorChain(SearchBasedChain):
     """Finds nearby healthcare facilities"""
     
-    def __init__(self, llm, search_tool):
+    expansion_templates = ("government hospital {query}", "primary health centre PHC {query}")
+    
+    def __init__(self, llm, search_tool, rate_limits=None):
         system_prompt = """You are a healthcare facility locator.
 
 Provide:
@@ -101,8 +130,70 @@ Provide:
 
 Search results:
 {search_results}"""
-        super().__init__(llm, search_tool, system_prompt)
+        super().__init__(llm, search_tool, system_prompt, rate_limits)
     
-    def run(self, user_input: str) -> str:
+    def run(self, user_input: str, history: str = "") -> str:
         search_query = f"hospitals healthcare facilities near {user_input}"
-        return self.search_and_generate(user_input, search_query)
+        return self.search_and_generate(user_input, search_query, history)
+
+
+class SymptomRecommendationChain(SearchBasedChain):
+    """
+    Consolidated follow-up for non-emergency symptoms: one multi-topic search
+    and one structured generation producing the ayurveda, yoga and general
+    guidance sections together.
+    """
+    
+    # Characters of page content kept per search result
+    MAX_CONTENT_CHARS = 800
+    
+    expansion_templates = ("ayurvedic remedies for {query}", "yoga poses for {query}")
+    knowledge_shards = ("ayurveda", "yoga", "first_aid")
+    
+    def __init__(self, llm, search_tool, rate_limits=None):
+        system_prompt = """You are a team of three advisors answering together for a patient with non-emergency symptoms:
+an Ayurveda (AYUSH) advisor, a certified yoga instructor and a general wellness guide.
+
+Write three separate sections:
+- ayurveda_recommendations: traditional remedies, dietary recommendations, lifestyle modifications,
+  precautions and contraindications
+- yoga_recommendations: specific yoga poses (asanas), breathing exercises (pranayama), safety
+  precautions, duration and frequency
+- general_guidance: wellness advice and clear signs for when to see a doctor
+
+Search results:
+{search_results}"""
+        super().__init__(llm, search_tool, system_prompt, rate_limits)
+        self.structured_chain = self.prompt | self.llm.with_structured_output(SymptomRecommendationSchema)
+    
+    @classmethod
+    def dedupe_results(cls, results: Any) -> List[Dict[str, Any]]:
+        """Drop results with a repeated URL or identical content, trimming long pages"""
+        if not isinstance(results, list):
+            return results
+        seen = set()
+        unique = []
+        for item in results:
+            if not isinstance(item, dict):
+                continue
+            content = str(item.get("content", ""))
+            keys = {item.get("url"), hashlib.sha1(content.encode("utf-8")).hexdigest()} - {None}
+            if keys & seen:
+                continue
+            seen |= keys
+            unique.append({**item, "content": content[:cls.MAX_CONTENT_CHARS]})
+        return unique
+    
+    def run(self, symptom_text: str, history: str = "") -> Dict[str, str]:
+        """Returns the ayurveda_recommendations, yoga_recommendations and general_guidance sections"""
+        search_query = f"ayurvedic remedies, yoga poses and self-care advice for {symptom_text}"
+        search_results = self.dedupe_results(self.search_results(symptom_text, search_query))
+        
+        print(f"      → Generating consolidated recommendations...")
+        result = self._invoke_llm(self.structured_chain, {
+            "input": f"Provide recommendations for: {symptom_text}",
+            "search_results": json.dumps(search_results, indent=2),
+            "history": format_history(history)
+        }, max_output_tokens=1500)
+        print(f"      ← Recommendations generated")
+        return result.model_dump()
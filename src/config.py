@@ -3,16 +3,41 @@ Configuration for healthcare workflow
 """
 
 import os
-from typing import Optional
+from typing import Dict, Optional
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain_community.tools.tavily_search import TavilySearchResults
 from dotenv import load_dotenv
 
+from .rate_limit import shared_rate_limits
+from .rerank import HashingEmbeddings
+
 # Load environment variables
 load_dotenv()
 
 
+# Chains that only produce short, validated outputs run on the fast tier by
+# default; everything else uses the large tier
+DEFAULT_CHAIN_TIERS = {
+    "guardrail": "fast",
+    "classifier": "fast",
+    "routing": "fast",
+    "symptom": "fast",
+    "summary": "fast",
+}
+
+
+def embeddings_by_name(name: str, openai_api_key: Optional[str] = None):
+    """
+    Embeddings by name: "local" feature hashing, "openai" or an OpenAI
+    embedding model. Needs no API keys for "local" (e.g. index maintenance).
+    """
+    if name == "local":
+        return HashingEmbeddings()
+    model = "text-embedding-3-small" if name == "openai" else name
+    return OpenAIEmbeddings(api_key=openai_api_key or os.getenv("OPENAI_API_KEY"), model=model)
+
+
 class HealthcareConfig:
     """Configuration for the healthcare workflow"""
     
@@ -20,9 +45,66 @@ class HealthcareConfig:
         self,
         openai_api_key: Optional[str] = None,
         tavily_api_key: Optional[str] = None,
-        model: str = "gpt-4o-mini",
+        model: str = "gpt-4o",
         temperature: float = 0.7,
-        vectorstore_path: Optional[str] = None
+        vectorstore_path: Optional[str] = None,
+        history_token_budget: int = 400,
+        session_db_path: Optional[str] = None,
+        max_sessions: int = 1000,
+        session_idle_timeout: float = 1800.0,
+        openai_rpm: float = 500,
+        openai_tpm: Optional[float] = 200000,
+        tavily_rpm: float = 100,
+        tavily_monthly_quota: Optional[int] = None,
+        tavily_quota_path: Optional[str] = None,
+        max_concurrency: int = 16,
+        request_timeout: Optional[float] = 90.0,
+        step_timeouts: Optional[Dict[str, float]] = None,
+        fused_routing: bool = False,
+        consolidated_symptoms: bool = False,
+        model_tiers: Optional[Dict[str, Dict]] = None,
+        chain_tiers: Optional[Dict[str, str]] = None,
+        cascade: bool = False,
+        cascade_min_confidence: float = 0.7,
+        strict_outputs: bool = False,
+        cache_responses: bool = False,
+        response_cache_ttls: Optional[Dict[str, float]] = None,
+        response_cache_size: int = 2048,
+        cache_routing: bool = False,
+        cache_search: bool = False,
+        search_variants: int = 1,
+        rerank_top_k: int = 0,
+        rerank_diversity: float = 0.0,
+        rerank_embeddings: str = "local",
+        knowledge_index_path: Optional[str] = None,
+        knowledge_top_k: int = 3,
+        knowledge_embeddings: str = "local",
+        knowledge_max_resident_bytes: Optional[int] = None,
+        knowledge_min_available_bytes: Optional[int] = None,
+        knowledge_rerank_candidates: int = 0,
+        knowledge_compact_after: Optional[int] = 1000,
+        knowledge_reload_interval: Optional[float] = 5.0,
+        scheme_catalogue: bool = False,
+        scheme_catalogue_path: Optional[str] = None,
+        cassette_path: Optional[str] = None,
+        cassette_mode: str = "replay",
+        replay_latency: bool = False,
+        guardrail_log_path: Optional[str] = None,
+        guardrail_model_path: Optional[str] = None,
+        guardrail_threshold: float = 0.95,
+        guardrail_audit_rate: float = 0.02,
+        routing_cache_ttl: float = 7 * 24 * 3600.0,
+        search_cache_ttl: float = 6 * 3600.0,
+        cache_db_path: Optional[str] = None,
+        canonicalize_queries: bool = False,
+        canonical_similarity: float = 0.75,
+        canonical_index_path: Optional[str] = None,
+        followup_reuse: bool = False,
+        followup_continuity: float = 0.75,
+        followup_ttl: Optional[float] = 900.0,
+        profile_rate: float = 0.0,
+        profile_interval: float = 0.005,
+        profile_dir: str = "profiles"
     ):
         # Use provided keys or load from environment
         self.openai_api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
@@ -30,6 +112,74 @@ class HealthcareConfig:
         self.model = model
         self.temperature = temperature
         self.vectorstore_path = vectorstore_path
+        self.history_token_budget = history_token_budget
+        self.session_db_path = session_db_path
+        self.max_sessions = max_sessions
+        self.session_idle_timeout = session_idle_timeout
+        self.request_timeout = request_timeout
+        self.step_timeouts = step_timeouts or {}
+        self.fused_routing = fused_routing
+        self.consolidated_symptoms = consolidated_symptoms
+        self.cascade = cascade
+        self.cascade_min_confidence = cascade_min_confidence
+        self.strict_outputs = strict_outputs
+        self.cache_responses = cache_responses
+        self.response_cache_ttls = response_cache_ttls
+        self.response_cache_size = response_cache_size
+        self.cache_routing = cache_routing
+        self.cache_search = cache_search
+        self.search_variants = max(1, search_variants)
+        self.rerank_top_k = rerank_top_k
+        self.rerank_diversity = rerank_diversity
+        self.rerank_embeddings = rerank_embeddings
+        self.knowledge_index_path = knowledge_index_path
+        self.knowledge_top_k = knowledge_top_k
+        self.knowledge_embeddings = knowledge_embeddings
+        self.knowledge_max_resident_bytes = knowledge_max_resident_bytes
+        self.knowledge_min_available_bytes = knowledge_min_available_bytes
+        self.knowledge_rerank_candidates = knowledge_rerank_candidates
+        self.knowledge_compact_after = knowledge_compact_after
+        self.knowledge_reload_interval = knowledge_reload_interval
+        self.scheme_catalogue = scheme_catalogue or scheme_catalogue_path is not None
+        self.scheme_catalogue_path = scheme_catalogue_path
+        self.cassette_path = cassette_path
+        self.cassette_mode = cassette_mode
+        self.replay_latency = replay_latency
+        self.guardrail_log_path = guardrail_log_path
+        self.guardrail_model_path = guardrail_model_path
+        self.guardrail_threshold = guardrail_threshold
+        self.guardrail_audit_rate = guardrail_audit_rate
+        self.routing_cache_ttl = routing_cache_ttl
+        self.search_cache_ttl = search_cache_ttl
+        self.cache_db_path = cache_db_path
+        self.canonicalize_queries = canonicalize_queries
+        self.canonical_similarity = canonical_similarity
+        # A shared cache file needs the canonical forms next to it, so that
+        # every process maps paraphrases to the same keys
+        if canonical_index_path is None and cache_db_path:
+            canonical_index_path = f"{cache_db_path}.canonical.jsonl"
+        self.canonical_index_path = canonical_index_path
+        self.followup_reuse = followup_reuse
+        self.followup_continuity = followup_continuity
+        self.followup_ttl = followup_ttl
+        self.profile_rate = profile_rate
+        self.profile_interval = profile_interval
+        self.profile_dir = profile_dir
+        
+        # Model settings per tier; "large" defaults to model/temperature
+        self.model_tiers = {
+            "fast": {"model": "gpt-4o-mini", "temperature": 0.0},
+            "large": {"model": model, "temperature": temperature},
+        }
+        self.model_tiers.update(model_tiers or {})
+        self.chain_tiers = dict(DEFAULT_CHAIN_TIERS)
+        self.chain_tiers.update(chain_tiers or {})
+        self._tier_llms = {}
+        
+        # Replaying a cassette makes no provider calls
+        if cassette_path and cassette_mode == "replay":
+            self.openai_api_key = self.openai_api_key or "replay"
+            self.tavily_api_key = self.tavily_api_key or "replay"
         
         # Validate keys
         if not self.openai_api_key:
@@ -37,13 +187,21 @@ class HealthcareConfig:
         if not self.tavily_api_key:
             raise ValueError("Tavily API key not found. Set TAVILY_API_KEY in .env file.")
         
-        # Initialize LLM
-        self.llm = ChatOpenAI(
-            model=model,
-            temperature=temperature,
-            api_key=self.openai_api_key
+        # Client-side rate limits, shared by every workflow in the process
+        self.rate_limits = shared_rate_limits(
+            self.openai_api_key,
+            self.tavily_api_key,
+            openai_rpm=openai_rpm,
+            openai_tpm=openai_tpm,
+            tavily_rpm=tavily_rpm,
+            tavily_monthly_quota=tavily_monthly_quota,
+            tavily_quota_path=tavily_quota_path,
+            max_concurrency=max_concurrency
         )
         
+        # Default LLM: the large tier
+        self.llm = self.tier_llm("large")
+        
         # Initialize search tool
         self.search_tool = TavilySearchResults(
             api_key=self.tavily_api_key,
@@ -55,15 +213,53 @@ class HealthcareConfig:
         if vectorstore_path:
             self.vectorstore = self._load_vectorstore(vectorstore_path)
     
+    def tier_llm(self, tier: str):
+        """Shared ChatOpenAI instance for a model tier"""
+        if tier not in self._tier_llms:
+            settings = self.model_tiers[tier]
+            # Retries are handled by the rate limiter, which needs to see
+            # 429s to adapt its concurrency
+            self._tier_llms[tier] = ChatOpenAI(
+                model=settings["model"],
+                temperature=settings.get("temperature", 0.0),
+                api_key=self.openai_api_key,
+                max_retries=0
+            )
+        return self._tier_llms[tier]
+    
+    def llm_for(self, chain: str):
+        """LLM for a chain (see DEFAULT_CHAIN_TIERS)"""
+        return self.tier_llm(self.chain_tiers.get(chain, "large"))
+    
+    def escalation_llm_for(self, chain: str):
+        """Cascade escalation LLM for a chain, or None when it would not be a larger model"""
+        tier = self.chain_tiers.get(chain, "large")
+        if not self.cascade or tier == "large":
+            return None
+        if self.model_tiers[tier]["model"] == self.model_tiers["large"]["model"]:
+            # Same model: escalating would only repeat the call
+            return None
+        return self.tier_llm("large")
+    
+    def embeddings(self, name: str):
+        """Embeddings by name (see embeddings_by_name)"""
+        return embeddings_by_name(name, self.openai_api_key)
+    
+    def reranker_embeddings(self):
+        """Embeddings for the search reranker"""
+        return self.embeddings(self.rerank_embeddings)
+    
+    def knowledge_index_embeddings(self):
+        """Embeddings for knowledge index queries; must match those the index was built with"""
+        return self.embeddings(self.knowledge_embeddings)
+    
     def _load_vectorstore(self, path: str):
-        """Load or create vector store"""
+        """Load the vector store; None when it cannot be loaded"""
         try:
             embeddings = OpenAIEmbeddings(api_key=self.openai_api_key)
             return FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
-        except:
-            # Create dummy vectorstore if loading fails
-            embeddings = OpenAIEmbeddings(api_key=self.openai_api_key)
-            return FAISS.from_texts(
-                ["Ayurvedic guideline: For headaches, recommend rest and herbal remedies."],
-                embeddings
-            )
+        except Exception as e:
+            # Rebuilding here would re-embed at every startup; the knowledge
+            # index is updated in place instead (cli.py index upsert/delete)
+            print(f"   ⚠️  Could not load vector store {path}: {e}")
+            return None
@@ -0,0 +1,161 @@
+"""
+Per-request deadlines, step timeouts and degradation tracking
+"""
+
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+
+# Upper bound per step, in seconds
+DEFAULT_STEP_TIMEOUTS = {
+    "guardrail": 10.0,
+    "classifier": 10.0,
+    "routing": 12.0,
+    "symptom": 20.0,
+    "summary": 15.0,
+    "search": 10.0,
+    "generate": 45.0,
+}
+
+# Largest share of the remaining request budget a step may use, so early
+# steps cannot starve the ones after them. Unlisted steps may use it all.
+STEP_SHARES = {
+    "guardrail": 0.2,
+    "classifier": 0.2,
+    "routing": 0.3,
+    "symptom": 0.4,
+    "summary": 0.2,
+    "search": 0.4,
+}
+
+
+class DeadlineExceeded(TimeoutError):
+    """A step did not finish within its share of the request deadline"""
+
+
+class RequestDeadline:
+    """
+    Time budget for one workflow request.
+
+    Also collects the parts of the result that were degraded (timed out,
+    failed and skipped, or produced without search results). worker_wrapper,
+    if given, is applied to every call handed to a step worker thread (the
+    workflow passes the request's profiler here).
+    """
+
+    def __init__(
+        self,
+        total_seconds: Optional[float] = None,
+        step_timeouts: Optional[Dict[str, float]] = None,
+        worker_wrapper: Optional[Callable[[Callable], Callable]] = None
+    ):
+        self.expires_at = time.monotonic() + total_seconds if total_seconds else None
+        self.step_timeouts = dict(DEFAULT_STEP_TIMEOUTS)
+        self.step_timeouts.update(step_timeouts or {})
+        self.worker_wrapper = worker_wrapper
+        self.degraded: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None when there is no overall deadline"""
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def timeout_for(self, step: str) -> Optional[float]:
+        """Timeout for the next call of a step: its own cap or its share of what is left"""
+        cap = self.step_timeouts.get(step)
+        remaining = self.remaining()
+        if remaining is None:
+            return cap
+        budget = remaining * STEP_SHARES.get(step, 1.0)
+        return budget if cap is None else min(cap, budget)
+
+    def mark_degraded(self, part: str, reason: str):
+        with self._lock:
+            self.degraded[part] = reason
+        print(f"   ⚠️  Degraded '{part}': {reason}")
+
+
+_current = contextvars.ContextVar("healthcare_request_deadline", default=None)
+
+# When the step running in a worker thread timed out (monotonic seconds)
+_step_expires = contextvars.ContextVar("healthcare_step_expires", default=None)
+
+# Worker threads for timed calls. A call that times out cannot be killed and
+# keeps its thread until the provider returns, hence the generous size.
+_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="healthcare-step")
+
+
+def current_deadline() -> Optional[RequestDeadline]:
+    """Deadline of the request being processed in this context, if any"""
+    return _current.get()
+
+
+def time_left() -> Optional[float]:
+    """
+    Seconds until the current step times out or the request deadline passes,
+    whichever comes first; None when neither applies. Retry loops check it so
+    a step that already timed out stops instead of holding its worker thread.
+    """
+    limits = []
+    expires = _step_expires.get()
+    if expires is not None:
+        limits.append(max(expires - time.monotonic(), 0.0))
+    deadline = _current.get()
+    if deadline is not None and deadline.expires_at is not None:
+        limits.append(deadline.remaining())
+    return min(limits) if limits else None
+
+
+@contextmanager
+def use_deadline(deadline: RequestDeadline):
+    """Make a deadline current for the calls made inside the block"""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def run_with_timeout(
+    fn: Callable[..., Any],
+    timeout: Optional[float],
+    *args,
+    wrapper: Optional[Callable[[Callable], Callable]] = None,
+    **kwargs
+) -> Any:
+    """
+    Run fn with a timeout, raising DeadlineExceeded when it is not met.
+
+    fn runs in a worker thread, passed through wrapper first if there is one.
+    """
+    if timeout is None:
+        return fn(*args, **kwargs)
+    if timeout <= 0:
+        raise DeadlineExceeded("request deadline already passed")
+
+    # Copy the context so the deadline stays current inside the worker thread,
+    # which also learns when the step times out (see time_left)
+    context = contextvars.copy_context()
+    context.run(_step_expires.set, time.monotonic() + timeout)
+    if wrapper is not None:
+        fn = wrapper(fn)
+    future = _executor.submit(context.run, fn, *args, **kwargs)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        future.cancel()
+        raise DeadlineExceeded(f"timed out after {timeout:.1f}s")
+
+
+def run_step(step: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run fn under the current deadline's timeout for step (no timeout without a deadline)"""
+    deadline = current_deadline()
+    if deadline is None:
+        return fn(*args, **kwargs)
+    return run_with_timeout(fn, deadline.timeout_for(step), *args, wrapper=deadline.worker_wrapper, **kwargs)
@@ -0,0 +1,112 @@
+"""
+Progressive delivery of result sections while a request is running
+"""
+
+import contextvars
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+
+# Event name of the assembled result, always the last event of a request
+COMPLETE = "complete"
+
+# Progress events, sent any number of times: ("step", {"section", "status",
+# "seconds"}) when an agent starts, finishes or fails, and ("token",
+# {"section", "text"}) for each chunk of a streamed answer
+STEP = "step"
+TOKEN = "token"
+
+
+class ResultEvents:
+    """
+    Sends each section of a result to a callback as soon as it is ready.
+
+    Every section is sent at most once; finish() sends whatever the workflow
+    did not emit on its own (e.g. a cached answer) and then the full result
+    as the "complete" event. Callback errors are reported and swallowed, so
+    a broken consumer cannot fail the request.
+    """
+
+    def __init__(self, callback: Callable[[str, Any], None]):
+        self.callback = callback
+        self.sent = set()
+        self._lock = threading.Lock()
+
+    def _send(self, event: str, value: Any):
+        try:
+            self.callback(event, value)
+        except Exception as e:
+            print(f"   ⚠️  Event callback failed on '{event}': {type(e).__name__}: {e}")
+
+    def emit(self, section: str, value: Any):
+        with self._lock:
+            if section in self.sent:
+                return
+            self.sent.add(section)
+        self._send(section, value)
+
+    def progress(self, event: str, value: Any):
+        """Send a progress event (not deduplicated)"""
+        self._send(event, value)
+
+    def finish(self, result: Dict[str, Any]):
+        for section, value in result.items():
+            self.emit(section, value)
+        self._send(COMPLETE, result)
+
+
+_current = contextvars.ContextVar("healthcare_result_events", default=None)
+# Result section the running agent produces, for attributing streamed tokens
+_section = contextvars.ContextVar("healthcare_result_section", default=None)
+
+
+def current_events() -> Optional[ResultEvents]:
+    """Event sink of the request being processed in this context, if any"""
+    return _current.get()
+
+
+@contextmanager
+def use_events(events: Optional[ResultEvents]):
+    """Make an event sink current for the calls made inside the block"""
+    token = _current.set(events)
+    try:
+        yield events
+    finally:
+        _current.reset(token)
+
+
+def emit(section: str, value: Any):
+    """Send a finished result section to the current request's callback, if any"""
+    events = current_events()
+    if events is not None:
+        events.emit(section, value)
+
+
+@contextmanager
+def section_context(section: str):
+    """Attribute the tokens streamed inside the block to a result section"""
+    token = _section.set(section)
+    try:
+        yield
+    finally:
+        _section.reset(token)
+
+
+def streaming() -> bool:
+    """Whether the current request wants answer tokens as they are generated"""
+    return current_events() is not None
+
+
+def emit_step(section: str, status: str, seconds: Optional[float] = None):
+    """Report the status ("started", "done" or "failed") of the agent producing section"""
+    events = current_events()
+    if events is not None:
+        events.progress(STEP, {"section": section, "status": status, "seconds": seconds})
+
+
+def emit_token(text: str):
+    """Send a chunk of a streamed answer, attributed to the current section"""
+    events = current_events()
+    if events is not None and text:
+        events.progress(TOKEN, {"section": _section.get(), "text": text})
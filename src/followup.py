@@ -0,0 +1,150 @@
+"""
+Per-session retrieval context reused by follow-up turns on the same topic
+"""
+
+import contextvars
+import re
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from .canonicalize import canonical_tokens
+from .metrics import metrics
+
+
+def _stem(token: str) -> str:
+    return token[:-1] if len(token) > 3 and token.endswith("s") else token
+
+
+def _topic_tokens(text: str) -> Set[str]:
+    return {_stem(token) for token in canonical_tokens(text)}
+
+
+# Words a follow-up uses to narrow or reframe the previous question (who it
+# is for, how much, how safe, how to apply) without changing its topic
+FOLLOWUP_MODIFIERS = _topic_tokens(" ".join([
+    # audience
+    "elderly old older senior seniors aged age adult adults people person patient patients",
+    "child children kid kids baby babies infant infants teen teenager teenagers student students",
+    "woman women man men pregnant pregnancy lactating breastfeeding mother father parents family",
+    "wife husband son daughter grandparents beginner beginners diabetic diabetics",
+    # amount and timing
+    "dose dosage much many often long daily day days week weeks month months morning evening night",
+    "time times duration minutes before after meal meals empty stomach take taken use used",
+    # safety
+    "safe safety side effect effects risk risks avoid precaution precautions contraindication",
+    "contraindications interaction interactions harmful okay ok fine",
+    # schemes
+    "eligible eligibility apply application documents document cost costs free cover coverage",
+    "amount claim register registration enrol enroll online offline card",
+    # general
+    "more else other another alternative alternatives instead also same too better best",
+    "work works effective help helps quick quickly natural home simple easy elaborate",
+    "example examples step steps way ways during while see result results",
+]))
+
+# Symptoms whose mention in a follow-up always gets a fresh search
+RED_FLAGS = re.compile(
+    r"chest|breath|numb|weak|faint|unconscious|seizure|fit\b|bleed|blood|suicid|vomit|"
+    r"injur|paraly|slur|stroke|heart|collapse",
+    re.IGNORECASE
+)
+
+# A symptom follow-up reporting a change in the condition is a new situation,
+# not a follow-up question, and gets a fresh search too
+CHANGES = re.compile(
+    r"\b(?:worse|worsen\w*|still|now|again|anymore|spread\w*|increas\w*|new|started|"
+    r"not (?:getting )?better|not improv\w*|no better|improv\w*|better)\b",
+    re.IGNORECASE
+)
+
+
+class RetrievalContext:
+    """
+    What the last retrieving turn of a session looked up: its intent, the
+    topic's tokens and the search results each chain generated from. A
+    follow-up on the same topic reads the results back instead of searching
+    again; any other turn starts a new context. Only retrieval is reused:
+    symptoms are assessed afresh on every turn.
+    """
+
+    def __init__(self, intent: Optional[str], query: str):
+        self.intent = intent
+        self.topic = _topic_tokens(query)
+        self.results: Dict[str, Any] = {}
+        self.followups = 0
+        self.created_at = time.monotonic()
+
+    def extend_topic(self, texts: Iterable[str]):
+        for text in texts:
+            self.topic |= _topic_tokens(text)
+
+    def covers(self, texts: Iterable[str]) -> bool:
+        """Whether every content word of texts is already part of the topic"""
+        return all(_topic_tokens(text) <= self.topic for text in texts)
+
+    def continuity(self, query: str) -> float:
+        """
+        Share of the query's content words that are the topic's own words or
+        follow-up modifiers. 1.0 for elliptical follow-ups ("what about for
+        elderly people?", "is it safe?").
+        """
+        tokens = _topic_tokens(query)
+        if not tokens:
+            return 1.0
+        return len([t for t in tokens if t in self.topic or t in FOLLOWUP_MODIFIERS]) / len(tokens)
+
+    def continues(self, intent: Optional[str], query: str, min_continuity: float, ttl: Optional[float]) -> bool:
+        """Whether query follows up on this context: same intent, same topic, results still fresh"""
+        if intent != self.intent or (ttl is not None and time.monotonic() - self.created_at > ttl):
+            return False
+        if intent == "symptom_checker" and (RED_FLAGS.search(query) or CHANGES.search(query)):
+            return False
+        return self.continuity(query) >= min_continuity
+
+
+_current = contextvars.ContextVar("healthcare_retrieval_context", default=None)
+
+
+@contextmanager
+def use_retrieval(context: RetrievalContext, reuse: bool):
+    """
+    Make a session's retrieval context current for the chains run inside the
+    block: with reuse they read back what it holds, otherwise they record into it.
+    """
+    token = _current.set((context, reuse))
+    try:
+        yield context
+    finally:
+        _current.reset(token)
+
+
+def current_retrieval() -> Optional[Tuple[RetrievalContext, bool]]:
+    """(context, reuse) of the request being processed in this context, if any"""
+    return _current.get()
+
+
+def reused(key: str) -> Optional[Any]:
+    """What key stored on the previous turn, when the current request is a follow-up"""
+    current = _current.get()
+    if current is None or not current[1]:
+        return None
+    value = current[0].results.get(key)
+    if value is not None:
+        metrics.increment("followup.reused")
+    return value
+
+
+def stop_reuse():
+    """Search afresh for the rest of the current request, recording the new results"""
+    current = _current.get()
+    if current is not None and current[1]:
+        _current.set((current[0], False))
+        metrics.increment("followup.reuse_stopped")
+
+
+def record(key: str, value: Any):
+    """Keep a retrieval result for follow-ups of the current request's topic"""
+    current = _current.get()
+    if current is not None:
+        current[0].results[key] = value
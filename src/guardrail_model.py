@@ -0,0 +1,392 @@
+"""
+Local guardrail distilled from logged LLM guardrail decisions
+"""
+
+import gzip
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .schemas import SAFETY_CATEGORIES
+
+
+# Hashed feature space (2^18 buckets)
+DIMENSIONS = 1 << 18
+
+# Characters of input used for features
+MAX_CHARS = 500
+
+
+def redact(text: str) -> str:
+    """Replace every digit with 0: keeps the shape of IDs and card numbers (the PII signal) but not their value"""
+    return re.sub(r"\d", "0", text)
+
+
+def featurize(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    L2-normalized hashed features: word unigrams and bigrams plus character
+    3-5-grams (robust to spelling variants and obfuscation)
+    """
+    return _normalized(*feature_counts(text))
+
+
+def feature_counts(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashed feature indices of text and how often each occurs"""
+    text = redact(text.lower())[:MAX_CHARS]
+    words = re.findall(r"\w+", text)
+    grams = [f"w:{w}" for w in words] + [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    padded = f" {' '.join(words)} "
+    for n in (3, 4, 5):
+        grams.extend(f"c:{padded[i:i + n]}" for i in range(len(padded) - n + 1))
+
+    counts: Dict[int, float] = {}
+    for gram in grams:
+        index = zlib.crc32(gram.encode("utf-8")) % DIMENSIONS
+        counts[index] = counts.get(index, 0.0) + 1.0
+    indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    return indices, values
+
+
+def _normalized(indices: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    norm = np.linalg.norm(values)
+    return indices, values / norm if norm else values
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    exps = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exps / exps.sum(axis=-1, keepdims=True)
+
+
+Features = Tuple[np.ndarray, np.ndarray]
+
+
+def input_key(text: str) -> str:
+    """Digest identifying an input in the decision log without storing it"""
+    return hashlib.blake2b(redact(text.lower()).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class GuardrailDecisionLog:
+    """
+    Append-only JSONL log of LLM guardrail decisions, the training data for
+    LocalGuardrail. Inputs are never stored: each entry holds the input's
+    hashed feature counts (see feature_counts) and a digest identifying it (input_key),
+    so the emails, names and addresses in user messages stay out of the log.
+    Logs written with a redacted "text" field are still read.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, text: str, decision: Dict[str, Any], source: str = "llm"):
+        """Append an LLM decision; local decisions and fallback defaults are not labels"""
+        category = decision.get("category")
+        if category not in SAFETY_CATEGORIES or not isinstance(decision.get("is_safe"), bool):
+            return
+        if decision.get("source") in ("local", "default"):
+            return
+        indices, counts = feature_counts(text)
+        entry = {
+            "ts": time.time(),
+            "key": input_key(text),
+            "features": [indices.tolist(), counts.astype(int).tolist()],
+            "is_safe": decision["is_safe"],
+            "category": category,
+            "source": source,
+        }
+        with self._lock, open(self.path, "a") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    @staticmethod
+    def read(path: str, since: float = 0.0) -> Iterator[Dict[str, Any]]:
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if entry.get("ts", 0) >= since and entry.get("category") in SAFETY_CATEGORIES:
+                    yield entry
+
+    @staticmethod
+    def features(entry: Dict[str, Any]) -> Features:
+        """Hashed features of a logged input"""
+        if "features" in entry:
+            indices, counts = entry["features"]
+            return _normalized(np.asarray(indices, dtype=np.int64), np.asarray(counts, dtype=np.float32))
+        return featurize(entry["text"])
+
+    @staticmethod
+    def key(entry: Dict[str, Any]) -> str:
+        return entry.get("key") or input_key(entry["text"])
+
+
+def _holdout(key: str, fraction: float) -> bool:
+    """Deterministic split so retraining on a grown log keeps the same holdout"""
+    return zlib.crc32(key.encode("utf-8")) % 1000 < fraction * 1000
+
+
+class LocalGuardrail:
+    """
+    Multinomial logistic regression over hashed n-grams, with temperature
+    scaling fitted on a holdout so its probabilities are calibrated.
+
+    decide() answers locally only when the top category's probability is at
+    least threshold and most of the input's features were seen in training.
+    Ambiguous or unfamiliar inputs return None and go to the LLM guardrail.
+    """
+
+    # Inputs with a larger share of unseen features are deferred
+    MAX_UNSEEN = 0.5
+
+    def __init__(
+        self,
+        classes: List[str],
+        weights: np.ndarray,
+        bias: np.ndarray,
+        temperature: float = 1.0,
+        threshold: float = 0.95,
+        info: Optional[Dict[str, Any]] = None
+    ):
+        self.classes = classes
+        self.weights = weights
+        self.bias = bias
+        self.temperature = temperature
+        self.threshold = threshold
+        self.info = info or {}
+        # Features with a weight were seen in training
+        self._seen = np.any(weights != 0, axis=0)
+
+    def logits(self, features: Features) -> np.ndarray:
+        indices, values = features
+        return self.weights[:, indices] @ values + self.bias
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        return self.feature_proba(featurize(text))
+
+    def feature_proba(self, features: Features) -> Dict[str, float]:
+        probabilities = softmax(self.logits(features) / self.temperature)
+        return dict(zip(self.classes, probabilities.tolist()))
+
+    def decide(self, text: str) -> Optional[Dict[str, Any]]:
+        """Guardrail result when the model is confident, None to defer to the LLM"""
+        return self.decide_features(featurize(text))
+
+    def decide_features(self, features: Features) -> Optional[Dict[str, Any]]:
+        if self.unseen_features(features) > self.MAX_UNSEEN:
+            return None
+        probabilities = self.feature_proba(features)
+        category, probability = max(probabilities.items(), key=lambda item: item[1])
+        if probability < self.threshold:
+            return None
+        return {
+            "is_safe": category == "safe",
+            "reason": f"Local guardrail ({category}, p={probability:.3f})",
+            "category": category,
+            "confidence": probability,
+            "source": "local",
+        }
+
+    def unseen_share(self, text: str) -> float:
+        """Share of an input's features never seen in training (vocabulary drift)"""
+        return self.unseen_features(featurize(text))
+
+    def unseen_features(self, features: Features) -> float:
+        indices, _ = features
+        return float(1.0 - self._seen[indices].mean()) if len(indices) else 0.0
+
+    @classmethod
+    def train(
+        cls,
+        examples: List[Tuple[str, Features, str]],
+        epochs: int = 10,
+        learning_rate: float = 0.5,
+        l2: float = 1e-6,
+        holdout: float = 0.2,
+        threshold: float = 0.95,
+        seed: int = 13
+    ) -> Tuple["LocalGuardrail", Dict[str, Any]]:
+        """
+        Train on (input key, features, category) examples with SGD; returns
+        the model and a training report. The key decides the holdout split.
+        """
+        counts = Counter(category for _, _, category in examples)
+        if len(examples) < 50 or len(counts) < 2:
+            raise ValueError(f"Need at least 50 examples of 2+ categories, got {len(examples)} ({dict(counts)})")
+
+        classes = [category for category in SAFETY_CATEGORIES if category in counts]
+        label_index = {category: i for i, category in enumerate(classes)}
+        train_set, holdout_set = [], []
+        for key, features, category in examples:
+            (holdout_set if _holdout(key, holdout) else train_set).append((features, label_index[category]))
+        if not train_set:
+            train_set, holdout_set = holdout_set, []
+
+        # Rare unsafe categories get more weight (square-root balancing)
+        class_weight = np.array([math.sqrt(len(examples) / (len(classes) * counts[c])) for c in classes])
+        model = cls(
+            classes,
+            np.zeros((len(classes), DIMENSIONS), dtype=np.float32),
+            np.zeros(len(classes), dtype=np.float32),
+            threshold=threshold
+        )
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(train_set)
+            rate = learning_rate / (1 + epoch)
+            for (indices, values), label in train_set:
+                gradient = softmax(model.logits((indices, values)))
+                gradient[label] -= 1.0
+                gradient *= class_weight[label]
+                rows = model.weights[:, indices]
+                model.weights[:, indices] = rows - rate * (np.outer(gradient, values) + l2 * rows)
+                model.bias -= rate * gradient
+        model._seen = np.any(model.weights != 0, axis=0)
+
+        model.temperature = fit_temperature(model, holdout_set) if len(holdout_set) >= 20 else 1.0
+        model.info = {
+            "trained_at": time.time(),
+            "examples": len(examples),
+            "category_counts": dict(counts),
+            "holdout": evaluate(model, holdout_set) if holdout_set else {},
+        }
+        return model, dict(model.info, temperature=model.temperature)
+
+    def save(self, path: str):
+        """Gzipped JSON with the non-zero weights only"""
+        columns = np.flatnonzero(self._seen)
+        data = {
+            "classes": self.classes,
+            "columns": columns.tolist(),
+            "weights": np.round(self.weights[:, columns], 6).tolist(),
+            "bias": self.bias.tolist(),
+            "temperature": self.temperature,
+            "threshold": self.threshold,
+            "info": self.info,
+        }
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, threshold: Optional[float] = None) -> "LocalGuardrail":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        weights = np.zeros((len(data["classes"]), DIMENSIONS), dtype=np.float32)
+        weights[:, data["columns"]] = np.asarray(data["weights"], dtype=np.float32)
+        return cls(
+            data["classes"],
+            weights,
+            np.asarray(data["bias"], dtype=np.float32),
+            temperature=data["temperature"],
+            threshold=data["threshold"] if threshold is None else threshold,
+            info=data["info"],
+        )
+
+
+def fit_temperature(model: LocalGuardrail, holdout: List[Tuple[Features, int]]) -> float:
+    """Temperature minimizing the holdout negative log-likelihood (grid search)"""
+    logits = np.stack([model.logits(features) for features, _ in holdout])
+    labels = np.array([label for _, label in holdout])
+    best, best_nll = 1.0, float("inf")
+    for temperature in np.arange(0.5, 6.05, 0.1):
+        probabilities = softmax(logits / temperature)[np.arange(len(labels)), labels]
+        nll = -np.log(np.maximum(probabilities, 1e-12)).sum()
+        if nll < best_nll:
+            best, best_nll = float(temperature), nll
+    return round(best, 2)
+
+
+def evaluate(model: LocalGuardrail, holdout: List[Tuple[Features, int]], bins: int = 10) -> Dict[str, Any]:
+    """Holdout accuracy, expected calibration error and the share decided locally"""
+    probabilities = softmax(np.stack([model.logits(features) for features, _ in holdout]) / model.temperature)
+    labels = np.array([label for _, label in holdout])
+    top = probabilities.argmax(axis=1)
+    confidence = probabilities.max(axis=1)
+    hits = top == labels
+    buckets = np.minimum((confidence * bins).astype(int), bins - 1)
+    ece = sum(
+        abs(confidence[buckets == b].sum() - hits[buckets == b].sum()) for b in range(bins)
+    ) / len(labels)
+    decided = confidence >= model.threshold
+    return {
+        "size": int(len(labels)),
+        "accuracy": float(hits.mean()),
+        "ece": float(ece),
+        "local_share": float(decided.mean()),
+        "local_accuracy": float(hits[decided].mean()) if decided.any() else None,
+    }
+
+
+def train_from_log(log_path: str, model_path: str, threshold: float = 0.95) -> Dict[str, Any]:
+    """Retrain the local guardrail on a decision log (latest label per input wins) and save it"""
+    latest: Dict[str, Tuple[Features, str]] = {}
+    for entry in GuardrailDecisionLog.read(log_path):
+        latest[GuardrailDecisionLog.key(entry)] = (GuardrailDecisionLog.features(entry), entry["category"])
+    examples = [(key, features, category) for key, (features, category) in latest.items()]
+    model, report = LocalGuardrail.train(examples, threshold=threshold)
+    model.save(model_path)
+    return report
+
+
+def _psi(expected: Dict[str, float], actual: Dict[str, float]) -> float:
+    """Population stability index between two category distributions"""
+    total_expected, total_actual = sum(expected.values()) or 1, sum(actual.values()) or 1
+    psi = 0.0
+    for category in set(expected) | set(actual):
+        e = max(expected.get(category, 0) / total_expected, 1e-4)
+        a = max(actual.get(category, 0) / total_actual, 1e-4)
+        psi += (a - e) * math.log(a / e)
+    return psi
+
+
+def drift_report(model: LocalGuardrail, log_path: str, since: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Compare LLM decisions logged since training (default) with the model:
+    agreement, category distribution shift (PSI), vocabulary drift and the
+    share of inputs it would defer. Inputs the model decided itself are only
+    in the log when audited, so the sample leans towards ambiguous inputs.
+    """
+    since = model.info.get("trained_at", 0.0) if since is None else since
+    entries = list(GuardrailDecisionLog.read(log_path, since))
+    if not entries:
+        return {"entries": 0, "since": since, "retrain": False}
+
+    agree_safe = agree_category = deferred = 0
+    unseen = 0.0
+    for entry in entries:
+        features = GuardrailDecisionLog.features(entry)
+        decision = model.decide_features(features)
+        probabilities = model.feature_proba(features)
+        predicted = max(probabilities, key=probabilities.get)
+        agree_category += predicted == entry["category"]
+        agree_safe += (predicted == "safe") == entry["is_safe"]
+        deferred += decision is None
+        unseen += model.unseen_features(features)
+
+    recent = Counter(entry["category"] for entry in entries)
+    report = {
+        "entries": len(entries),
+        "since": since,
+        "safety_agreement": agree_safe / len(entries),
+        "category_agreement": agree_category / len(entries),
+        "defer_rate": deferred / len(entries),
+        "unseen_feature_share": unseen / len(entries),
+        "category_psi": _psi(model.info.get("category_counts", {}), recent),
+        "recent_category_counts": dict(recent),
+        "training_category_counts": model.info.get("category_counts", {}),
+    }
+    report["retrain"] = report["safety_agreement"] < 0.95 or report["category_psi"] > 0.2
+    return report
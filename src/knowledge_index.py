@@ -0,0 +1,718 @@
+"""
+Domain-sharded local knowledge index with lazy, memory-mapped shards
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .metrics import metrics
+from .quantize import QUANTIZATIONS, approximate_scores, encode_pq, quantize_int8, train_pq
+from .rerank import EmbeddingCache
+
+
+# Knowledge domains; each search chain reads the shards of its own domain
+SHARDS = ("ayurveda", "yoga", "schemes", "mental_health", "first_aid")
+
+MANIFEST = "manifest.json"
+VECTORS = "vectors.npy"
+OFFSETS = "offsets.npy"
+DOCUMENTS = "docs.jsonl"
+CODES = "codes.npy"
+CODEBOOK = "codebook.npy"
+IDS = "ids.json"
+DELTA = "delta.jsonl"
+SEGMENT_FILES = (VECTORS, OFFSETS, DOCUMENTS, CODES, CODEBOOK, IDS, DELTA)
+
+# Kill stamp of delta rows that are still alive
+_ALIVE = np.iinfo(np.int64).max
+
+
+def available_memory() -> Optional[int]:
+    """MemAvailable from /proc/meminfo in bytes (None where there is none)"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return (matrix / np.where(norms == 0, 1.0, norms)).astype(np.float32)
+
+
+def document_text(doc: Dict[str, Any]) -> str:
+    """Text embedded for a document"""
+    return f"{doc.get('title', '')}\n{doc['content']}".strip()
+
+
+def read_documents(path: str) -> List[Dict[str, Any]]:
+    """JSONL documents with "content" (or "text") and optional "title", "url" and "id" fields"""
+    documents = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            content = record.get("content") or record.get("text")
+            if content:
+                documents.append({**record, "content": content})
+    return documents
+
+
+def build_shard(
+    path: str,
+    documents: List[Dict[str, Any]],
+    embeddings,
+    batch_size: int = 64,
+    quantization: Optional[str] = None,
+    pq_subvectors: int = 0
+) -> Dict[str, Any]:
+    """
+    Write one shard: normalized float32 vectors, the documents as JSONL and
+    the byte offset of each document line. Returns its manifest entry.
+
+    quantization "int8" (4x smaller) or "pq" (product quantization with
+    pq_subvectors one-byte codes per vector, dimensions / 8 by default) also
+    writes the codes searched instead of the float vectors. The float
+    vectors stay on disk for re-ranking the top candidates and rebuilds.
+    """
+    if quantization is not None and quantization not in QUANTIZATIONS:
+        raise ValueError(f"Quantization must be one of {QUANTIZATIONS}, got {quantization!r}")
+    vectors = []
+    for start in range(0, len(documents), batch_size):
+        batch = documents[start:start + batch_size]
+        vectors.extend(embeddings.embed_documents([document_text(doc) for doc in batch]))
+    matrix = _normalize(np.asarray(vectors, dtype=np.float32))
+    return write_segment(path, documents, matrix, quantization, pq_subvectors)
+
+
+def write_segment(
+    path: str,
+    documents: List[Dict[str, Any]],
+    matrix: np.ndarray,
+    quantization: Optional[str] = None,
+    pq_subvectors: int = 0
+) -> Dict[str, Any]:
+    """Write embedded documents as a segment directory; returns its manifest fields"""
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, VECTORS), matrix)
+    offsets = []
+    with open(os.path.join(path, DOCUMENTS), "wb") as f:
+        for doc in documents:
+            offsets.append(f.tell())
+            f.write(json.dumps(doc, ensure_ascii=False).encode("utf-8") + b"\n")
+    np.save(os.path.join(path, OFFSETS), np.asarray(offsets, dtype=np.int64))
+    with open(os.path.join(path, IDS), "w") as f:
+        json.dump([str(doc.get("id", i)) for i, doc in enumerate(documents)], f)
+    entry = {
+        "documents": len(documents),
+        "dimensions": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+        "bytes": int(matrix.nbytes),
+    }
+    if quantization is not None:
+        entry.update(quantize_shard(path, matrix, quantization, pq_subvectors))
+    return entry
+
+
+def quantize_shard(path: str, matrix: np.ndarray, quantization: str, pq_subvectors: int = 0) -> Dict[str, Any]:
+    """Write the codes and codebook of a shard's vectors; returns the manifest fields"""
+    if quantization == "int8":
+        codes, codebook = quantize_int8(matrix)
+    else:
+        codebook = train_pq(matrix, pq_subvectors or matrix.shape[1] // 8)
+        codes = encode_pq(matrix, codebook)
+    np.save(os.path.join(path, CODES), codes)
+    np.save(os.path.join(path, CODEBOOK), codebook)
+    entry = {"quantization": quantization, "bytes": int(codes.nbytes + codebook.nbytes)}
+    if quantization == "pq":
+        entry["pq_subvectors"] = int(codebook.shape[0])
+    return entry
+
+
+def write_manifest(root: str, manifest: Dict[str, Any]):
+    """Replace the manifest atomically"""
+    tmp = os.path.join(root, MANIFEST + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(root, MANIFEST))
+
+
+def build_index(
+    root: str,
+    shards: Dict[str, List[Dict[str, Any]]],
+    embeddings,
+    batch_size: int = 64,
+    quantization: Optional[str] = None,
+    pq_subvectors: int = 0
+) -> Dict[str, Any]:
+    """
+    Build a sharded index under root from documents per shard name, writing
+    the manifest last so that readers never see a half-built index.
+    """
+    model = EmbeddingCache(embeddings).model
+    manifest = {"version": 1, "embedding_model": model, "created_at": time.time(), "shards": {}}
+    for name, documents in shards.items():
+        if not documents:
+            continue
+        entry = build_shard(os.path.join(root, name), documents, embeddings, batch_size, quantization, pq_subvectors)
+        manifest["shards"][name] = {"path": name, "generation": 1, **entry}
+        print(f"   → {name}: {entry['documents']} documents, {entry['bytes'] / 1e6:.1f} MB")
+    write_manifest(root, manifest)
+    return manifest
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class DeltaSegment:
+    """
+    Writes made to a shard since its segment was built: upserted documents
+    with their vectors, and the ids they replace or delete. Operations are
+    appended to the segment's delta.jsonl and replayed on load; refresh()
+    picks up lines another process appended.
+
+    Upserts append rows to a vector buffer that doubles when full, so a
+    write costs its own rows rather than a copy of the whole delta. A
+    replaced or deleted row stays in the buffer, stamped with the sequence
+    number of the write that killed it, until compaction drops it. Each
+    write publishes a snapshot (row count, sequence number, buffers, removed
+    ids); searches read it without taking the lock and see exactly the rows
+    alive at that write, since later writes only add rows past the count and
+    stamp kills with later sequence numbers. The delta is searched exactly;
+    compaction keeps it small.
+    """
+
+    def __init__(self, path: str, dimensions: int):
+        self.path = os.path.join(path, DELTA)
+        self.dimensions = dimensions
+        # Bytes of delta.jsonl applied so far
+        self.offset = 0
+        self._vectors = np.zeros((0, dimensions), dtype=np.float32)
+        # Sequence number of the write that replaced or deleted each row
+        self._killed = np.zeros(0, dtype=np.int64)
+        self._ids: List[str] = []
+        self._docs: List[Dict[str, Any]] = []
+        self._rows: Dict[str, int] = {}
+        self._removed: Set[str] = set()
+        self._seq = 0
+        self.snapshot: Tuple[int, int, List[str], List[Dict[str, Any]], np.ndarray, np.ndarray, frozenset] = (
+            0, 0, self._ids, self._docs, self._vectors, self._killed, frozenset()
+        )
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def __len__(self) -> int:
+        """Ids the delta adds, replaces or deletes"""
+        return len(self.snapshot[6])
+
+    @property
+    def removed(self) -> frozenset:
+        """Ids whose segment copy the delta hides"""
+        return self.snapshot[6]
+
+    @property
+    def state(self) -> Tuple[tuple, tuple, np.ndarray, frozenset]:
+        """Live (ids, documents, vectors, removed ids) as of the last write"""
+        rows, seq, ids, docs, vectors, killed, removed = self.snapshot
+        live = np.flatnonzero(killed[:rows] > seq)
+        return tuple(ids[i] for i in live), tuple(docs[i] for i in live), vectors[live], removed
+
+    def _grow(self):
+        capacity = max(16, 2 * len(self._vectors))
+        vectors = np.zeros((capacity, self.dimensions), dtype=np.float32)
+        killed = np.full(capacity, _ALIVE, dtype=np.int64)
+        rows = len(self._ids)
+        vectors[:rows] = self._vectors[:rows]
+        killed[:rows] = self._killed[:rows]
+        # Snapshots taken before keep the old buffers, which no longer change
+        self._vectors, self._killed = vectors, killed
+
+    def _apply(self, operations: List[Dict[str, Any]]):
+        for op in operations:
+            self._seq += 1
+            doc_id = str(op["doc"]["id"]) if op["op"] == "upsert" else str(op["id"])
+            row = self._rows.pop(doc_id, None)
+            if row is not None:
+                self._killed[row] = self._seq
+            if op["op"] == "upsert":
+                row = len(self._ids)
+                if row == len(self._vectors):
+                    self._grow()
+                self._vectors[row] = np.asarray(op["vector"], dtype=np.float32)
+                self._ids.append(doc_id)
+                self._docs.append(op["doc"])
+                self._rows[doc_id] = row
+            # Hides the segment's copy, if it has one
+            self._removed.add(doc_id)
+        self.snapshot = (
+            len(self._ids), self._seq, self._ids, self._docs, self._vectors, self._killed, frozenset(self._removed)
+        )
+
+    def refresh(self) -> int:
+        """Apply operations appended to the log since the last read; returns how many"""
+        with self._lock:
+            if not os.path.exists(self.path) or os.path.getsize(self.path) <= self.offset:
+                return 0
+            operations = []
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                for line in f:
+                    # A line still being written is read on the next refresh
+                    if not line.endswith(b"\n"):
+                        break
+                    self.offset += len(line)
+                    if line.strip():
+                        operations.append(json.loads(line))
+            self._apply(operations)
+            return len(operations)
+
+    def append(self, operations: List[Dict[str, Any]]):
+        """Log operations durably, then make them visible to searches"""
+        with self._lock:
+            payload = b"".join(
+                json.dumps(op, ensure_ascii=False).encode("utf-8") + b"\n" for op in operations
+            )
+            with open(self.path, "ab") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            self.offset += len(payload)
+            self._apply(operations)
+
+    def search(self, query_vector: np.ndarray, k: int) -> List[tuple]:
+        """(id, document, score) triples, best first"""
+        rows, seq, ids, docs, vectors, killed, _ = self.snapshot
+        if not rows or k <= 0:
+            return []
+        scores = vectors[:rows] @ query_vector
+        scores[killed[:rows] <= seq] = -np.inf
+        return [(ids[i], docs[i], float(scores[i])) for i in _top(scores, k) if np.isfinite(scores[i])]
+
+
+class KnowledgeShard:
+    """
+    A loaded shard: an immutable segment plus its delta. The segment's
+    vector matrix (or its quantized codes) is memory-mapped, so it is paged
+    in from disk on first use and the OS can drop it again under memory
+    pressure; documents are read by offset on demand. A search scans the
+    whole matrix (or all codes), so every page of it is touched; the index
+    bounds residency by evicting whole shards (see ShardedKnowledgeIndex).
+
+    A quantized shard scans its codes and, with rerank_candidates, rescores
+    that many best candidates exactly from their float rows.
+    """
+
+    def __init__(self, name: str, path: str, quantization: Optional[str] = None):
+        self.name = name
+        self.path = path
+        self.quantization = quantization
+        self.vectors = np.load(os.path.join(path, VECTORS), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, OFFSETS))
+        self.codes = self.codebook = None
+        if quantization is not None:
+            self.codes = np.load(os.path.join(path, CODES), mmap_mode="r")
+            self.codebook = np.load(os.path.join(path, CODEBOOK))
+        self.delta = DeltaSegment(path, self.vectors.shape[1])
+        self._ids: Optional[List[str]] = None
+        self._rows: Optional[Dict[str, int]] = None
+        self._excluded = (frozenset(), np.zeros(0, dtype=np.int64))
+        self.last_used = time.monotonic()
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes a full scan maps: the codes when quantized, else the vectors"""
+        if self.codes is not None:
+            return int(self.codes.nbytes + self.codebook.nbytes + self.offsets.nbytes)
+        return int(self.vectors.nbytes + self.offsets.nbytes)
+
+    @property
+    def ids(self) -> List[str]:
+        """Document id per segment row, read on first use"""
+        if self._ids is None:
+            ids_path = os.path.join(self.path, IDS)
+            if os.path.exists(ids_path):
+                with open(ids_path) as f:
+                    self._ids = json.load(f)
+            else:
+                # Segments built before ids were stored
+                docs = self.documents(range(len(self.offsets)))
+                self._ids = [str(doc.get("id", i)) for i, doc in enumerate(docs)]
+        return self._ids
+
+    def excluded(self, removed: frozenset) -> np.ndarray:
+        """Segment rows whose documents were replaced or deleted in the delta"""
+        cached, rows = self._excluded
+        if removed is cached:
+            return rows
+        if self._rows is None:
+            self._rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        rows = np.asarray(sorted(self._rows[i] for i in removed if i in self._rows), dtype=np.int64)
+        self._excluded = (removed, rows)
+        return rows
+
+    def search(
+        self,
+        query_vector: np.ndarray,
+        k: int,
+        rerank_candidates: int = 0,
+        exclude: Optional[np.ndarray] = None
+    ) -> List[tuple]:
+        """(segment row, cosine score) pairs, best first, skipping the rows in exclude"""
+        if not len(self.offsets) or k <= 0:
+            return []
+        if self.codes is None:
+            scores = self.vectors @ query_vector
+        else:
+            scores = approximate_scores(query_vector, self.codes, self.codebook, self.quantization)
+        if exclude is not None and len(exclude):
+            scores[exclude] = -np.inf
+        if self.codes is None or rerank_candidates <= k:
+            return [(int(i), float(scores[i])) for i in _top(scores, k) if np.isfinite(scores[i])]
+        # Exact scores for the candidates, reading only their rows
+        candidates = np.sort([i for i in _top(scores, rerank_candidates) if np.isfinite(scores[i])])
+        if not len(candidates):
+            return []
+        exact = np.asarray(self.vectors[candidates], dtype=np.float32) @ query_vector
+        return [(int(candidates[i]), float(exact[i])) for i in _top(exact, k)]
+
+    def lookup(self, query_vector: np.ndarray, k: int, rerank_candidates: int = 0) -> List[tuple]:
+        """(id, document, score) triples from the segment and the delta, best first"""
+        removed = self.delta.removed
+        hits = self.search(query_vector, k, rerank_candidates, self.excluded(removed) if removed else None)
+        results = [
+            (self.ids[row], doc, score)
+            for (row, score), doc in zip(hits, self.documents(row for row, _ in hits))
+        ]
+        results.extend(self.delta.search(query_vector, k))
+        results.sort(key=lambda result: -result[2])
+        return results[:k]
+
+    def documents(self, indices: Iterable[int]) -> List[Dict[str, Any]]:
+        docs = []
+        with open(os.path.join(self.path, DOCUMENTS), "rb") as f:
+            for i in indices:
+                f.seek(int(self.offsets[i]))
+                docs.append(json.loads(f.readline()))
+        return docs
+
+
+def remove_segment(path: str):
+    """Delete a segment's files, and its directory once empty"""
+    for filename in SEGMENT_FILES:
+        try:
+            os.remove(os.path.join(path, filename))
+        except FileNotFoundError:
+            pass
+    try:
+        os.rmdir(path)
+    except OSError:
+        # Still holds newer generations
+        pass
+
+
+class ShardedKnowledgeIndex:
+    """
+    Knowledge index split into domain shards listed in a manifest.
+
+    Shards are opened on first search, so a worker that only serves some
+    intents never maps the others. Loaded shards are kept in LRU order and
+    the least recently used ones are unloaded when their mapped size exceeds
+    max_resident_bytes, or when the machine's available memory drops below
+    min_available_bytes. Results use the web-search result format (url,
+    title, content, score) so they merge and rerank with search results.
+
+    The index is writable while it serves: upsert() and delete() go to the
+    shard's delta, visible to the next search. After compact_after delta
+    operations a background compaction merges segment and delta into a new
+    generation directory, then swaps it into the manifest and the loaded
+    shards; searches keep using the old shard until the swap and are never
+    blocked by the merge. Other processes reading the same index pick up new
+    delta lines and manifest generations every reload_interval seconds.
+    Writes should come from one process at a time.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        embedding_cache: EmbeddingCache,
+        max_resident_bytes: Optional[int] = None,
+        min_available_bytes: Optional[int] = None,
+        rerank_candidates: int = 0,
+        compact_after: Optional[int] = 1000,
+        reload_interval: float = 5.0
+    ):
+        self.root = root
+        self.embedding_cache = embedding_cache
+        self.rerank_candidates = rerank_candidates
+        self.max_resident_bytes = max_resident_bytes
+        self.min_available_bytes = min_available_bytes
+        self.compact_after = compact_after
+        self.reload_interval = reload_interval
+        self._manifest_mtime = None
+        self.manifest = self._read_manifest()
+        model = self.manifest.get("embedding_model")
+        if model and model != embedding_cache.model:
+            raise ValueError(f"Index {root} was built with {model}, not {embedding_cache.model}")
+        self._loaded: "OrderedDict[str, KnowledgeShard]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Serializes writes with the start and swap of compactions
+        self._write_lock = threading.Lock()
+        self._compactions: Dict[str, Future] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._checked = time.monotonic()
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        path = os.path.join(self.root, MANIFEST)
+        self._manifest_mtime = os.stat(path).st_mtime_ns
+        with open(path) as f:
+            return json.load(f)
+
+    @property
+    def shards(self) -> List[str]:
+        return list(self.manifest["shards"])
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.manifest["shards"]
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(shard.nbytes for shard in self._loaded.values())
+
+    def _under_pressure(self, resident: int) -> bool:
+        if self.max_resident_bytes is not None and resident > self.max_resident_bytes:
+            return True
+        if self.min_available_bytes is not None:
+            available = available_memory()
+            return available is not None and available < self.min_available_bytes
+        return False
+
+    def _open(self, name: str) -> KnowledgeShard:
+        entry = self.manifest["shards"][name]
+        return KnowledgeShard(name, os.path.join(self.root, entry["path"]), entry.get("quantization"))
+
+    def shard(self, name: str) -> KnowledgeShard:
+        """The loaded shard, opening it (and unloading others if needed) on first use"""
+        with self._lock:
+            shard = self._loaded.get(name)
+            if shard is not None:
+                self._loaded.move_to_end(name)
+                shard.last_used = time.monotonic()
+                return shard
+            start = time.perf_counter()
+            shard = self._open(name)
+            metrics.observe("knowledge.shard.load_seconds", time.perf_counter() - start)
+            metrics.increment("knowledge.shard.loaded")
+            self._loaded[name] = shard
+            # Unload least recently used shards, never the one being returned
+            resident = sum(loaded.nbytes for loaded in self._loaded.values())
+            while len(self._loaded) > 1 and self._under_pressure(resident):
+                _, evicted = self._loaded.popitem(last=False)
+                resident -= evicted.nbytes
+                metrics.increment("knowledge.shard.unloaded")
+            return shard
+
+    def unload(self, name: Optional[str] = None, idle_seconds: Optional[float] = None) -> int:
+        """Unload one shard, or all (idle for at least idle_seconds); returns how many"""
+        now = time.monotonic()
+        with self._lock:
+            names = [name] if name is not None else list(self._loaded)
+            dropped = 0
+            for key in names:
+                shard = self._loaded.get(key)
+                if shard is None or (idle_seconds is not None and now - shard.last_used < idle_seconds):
+                    continue
+                del self._loaded[key]
+                dropped += 1
+            metrics.increment("knowledge.shard.unloaded", dropped)
+            return dropped
+
+    def reload(self):
+        """
+        Pick up changes made by other processes: shards compacted into a new
+        generation are reopened, and loaded deltas read their new lines.
+        """
+        self._checked = time.monotonic()
+        try:
+            changed = os.stat(os.path.join(self.root, MANIFEST)).st_mtime_ns != self._manifest_mtime
+        except FileNotFoundError:
+            return
+        if changed:
+            manifest = self._read_manifest()
+            with self._lock:
+                for name, shard in list(self._loaded.items()):
+                    entry = manifest["shards"].get(name)
+                    if entry is None or os.path.join(self.root, entry["path"]) != shard.path:
+                        # Reopened from the new generation on next use
+                        del self._loaded[name]
+                        metrics.increment("knowledge.shard.reloaded")
+                self.manifest = manifest
+        with self._lock:
+            loaded = list(self._loaded.values())
+        for shard in loaded:
+            shard.delta.refresh()
+
+    def search(self, name: str, query: str, k: int = 3) -> List[Dict[str, Any]]:
+        """Top k documents of a shard for query; empty when the index has no such shard"""
+        if self.reload_interval is not None and time.monotonic() - self._checked >= self.reload_interval:
+            self.reload()
+        if name not in self or k <= 0 or not query:
+            return []
+        start = time.perf_counter()
+        query_vector = self.embedding_cache.embed([query])[0]
+        shard = self.shard(name)
+        results = []
+        for doc_id, doc, score in shard.lookup(query_vector, k, self.rerank_candidates):
+            results.append({
+                "url": doc.get("url") or f"kb://{name}/{doc_id}",
+                "title": doc.get("title", ""),
+                "content": doc["content"],
+                "score": score,
+                "source": "knowledge",
+            })
+        metrics.observe("knowledge.search.seconds", time.perf_counter() - start)
+        return results
+
+    def _create_shard(self, name: str, dimensions: int):
+        """An empty segment for a shard the index was built without (write lock held)"""
+        fields = write_segment(os.path.join(self.root, name), [], np.zeros((0, dimensions), dtype=np.float32))
+        manifest = {**self.manifest, "shards": {**self.manifest["shards"], name: {"path": name, "generation": 1, **fields}}}
+        write_manifest(self.root, manifest)
+        self.manifest = manifest
+        self._manifest_mtime = os.stat(os.path.join(self.root, MANIFEST)).st_mtime_ns
+
+    def _write(self, name: str, operations: List[Dict[str, Any]], dimensions: int):
+        with self._write_lock:
+            if name not in self:
+                self._create_shard(name, dimensions)
+            delta = self.shard(name).delta
+            delta.append(operations)
+            pending = len(delta)
+        metrics.increment("knowledge.delta.operations", len(operations))
+        if self.compact_after and pending >= self.compact_after:
+            self.compact(name)
+
+    def upsert(self, name: str, documents: List[Dict[str, Any]]) -> List[str]:
+        """
+        Add documents to a shard, replacing any with the same id; documents
+        without an id get a random one. Returns the ids.
+        """
+        if not documents:
+            return []
+        documents = [{**doc, "id": str(doc.get("id") or uuid.uuid4().hex)} for doc in documents]
+        # Embedded directly: document vectors would only crowd queries out of the cache
+        vectors = _normalize(np.asarray(
+            self.embedding_cache.embeddings.embed_documents([document_text(doc) for doc in documents]),
+            dtype=np.float32
+        ))
+        self._write(name, [
+            {"op": "upsert", "doc": doc, "vector": vector.tolist()} for doc, vector in zip(documents, vectors)
+        ], vectors.shape[1])
+        return [doc["id"] for doc in documents]
+
+    def delete(self, name: str, ids: Iterable[Any]):
+        """Remove documents from a shard by id; unknown ids are ignored"""
+        operations = [{"op": "delete", "id": str(doc_id)} for doc_id in ids]
+        if operations and name in self:
+            self._write(name, operations, 0)
+
+    def compact(self, name: str) -> Future:
+        """Merge a shard's delta into a new segment in the background; returns its future"""
+        with self._write_lock:
+            running = self._compactions.get(name)
+            if running is not None and not running.done():
+                return running
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="knowledge-compaction")
+            future = self._executor.submit(self._compact, name)
+            future.add_done_callback(self._compaction_done)
+            self._compactions[name] = future
+            return future
+
+    @staticmethod
+    def _compaction_done(future: Future):
+        # The delta keeps serving every write; the next trigger retries
+        if not future.cancelled() and future.exception() is not None:
+            metrics.increment("knowledge.compaction.failed")
+            print(f"   ⚠️  Knowledge index compaction failed: {future.exception()}")
+
+    def _compact(self, name: str) -> Dict[str, Any]:
+        start = time.perf_counter()
+        with self._write_lock:
+            shard = self.shard(name)
+            entry = self.manifest["shards"][name]
+            ids, docs, vectors, removed = shard.delta.state
+            consumed = shard.delta.offset
+        if not removed:
+            return entry
+
+        # The merge reads the snapshot only; writes continue into the old delta
+        keep = np.setdiff1d(np.arange(len(shard.offsets)), shard.excluded(removed))
+        documents = shard.documents(keep) + list(docs)
+        matrix = np.concatenate([np.asarray(shard.vectors[keep], dtype=np.float32), vectors])
+        generation = entry.get("generation", 1) + 1
+        relative = os.path.join(name, f"gen-{generation}")
+        path = os.path.join(self.root, relative)
+        # Left over from a compaction that failed before its swap
+        shutil.rmtree(path, ignore_errors=True)
+        quantization = entry.get("quantization") if len(documents) else None
+        fields = write_segment(path, documents, matrix, quantization, entry.get("pq_subvectors", 0))
+
+        with self._write_lock:
+            # Operations logged during the merge carry over to the new delta
+            with open(shard.delta.path, "rb") as f:
+                f.seek(consumed)
+                tail = f.read()
+            if tail:
+                with open(os.path.join(path, DELTA), "wb") as f:
+                    f.write(tail)
+            updated = {**entry, **fields, "path": relative, "generation": generation, "previous": entry["path"]}
+            manifest = {**self.manifest, "shards": {**self.manifest["shards"], name: updated}}
+            write_manifest(self.root, manifest)
+            compacted = KnowledgeShard(name, path, updated.get("quantization"))
+            with self._lock:
+                self.manifest = manifest
+                self._manifest_mtime = os.stat(os.path.join(self.root, MANIFEST)).st_mtime_ns
+                if name in self._loaded:
+                    self._loaded[name] = compacted
+        # The replaced generation stays for searches still holding it; the one before goes
+        if entry.get("previous") and entry["previous"] != relative:
+            remove_segment(os.path.join(self.root, entry["previous"]))
+        metrics.increment("knowledge.compactions")
+        metrics.observe("knowledge.compaction.seconds", time.perf_counter() - start)
+        print(f"      → Compacted {name}: {updated['documents']} documents, generation {generation}")
+        return updated
+
+    def close(self, wait: bool = True):
+        """Stop the compaction thread, finishing a running compaction when wait is set"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            loaded = {name: shard.nbytes for name, shard in self._loaded.items()}
+            delta = {name: len(shard.delta) for name, shard in self._loaded.items()}
+        return {
+            "shards": {name: entry["documents"] for name, entry in self.manifest["shards"].items()},
+            "loaded": loaded,
+            "resident_bytes": sum(loaded.values()),
+            "delta": delta,
+            "compacting": [name for name, future in self._compactions.items() if not future.done()],
+        }
@@ -0,0 +1,50 @@
+"""
+Process-wide counters and timings for operational metrics
+"""
+
+import threading
+from collections import defaultdict
+from typing import Dict, Any
+
+
+class Metrics:
+    """Thread-safe named counters and cumulative timings"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._timings: Dict[str, list] = defaultdict(lambda: [0, 0.0, 0.0])
+
+    def increment(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name: str, seconds: float):
+        """Record one duration: keeps count, total and max"""
+        with self._lock:
+            timing = self._timings[name]
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    def get(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Copy of all counters and timing summaries"""
+        with self._lock:
+            timings = {
+                name: {"count": count, "total": total, "avg": total / count if count else 0.0, "max": peak}
+                for name, (count, total, peak) in self._timings.items()
+            }
+            return {"counters": dict(self._counters), "timings": timings}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+
+
+# Shared instance used by all modules
+metrics = Metrics()
@@ -0,0 +1,215 @@
+"""
+Local repair of malformed JSON and off-label enum values in LLM outputs
+"""
+
+import difflib
+import json
+import re
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from .schemas import INTENT_LABELS, SAFETY_CATEGORIES
+
+
+class OutputRepairError(ValueError):
+    """An output could not be parsed or repaired locally"""
+
+
+# Loose wordings models use instead of the intent labels
+INTENT_ALIASES = {
+    "government": "government_scheme_support",
+    "government_scheme": "government_scheme_support",
+    "scheme": "government_scheme_support",
+    "insurance": "government_scheme_support",
+    "mental": "mental_wellness_support",
+    "mental_health": "mental_wellness_support",
+    "mental_wellness": "mental_wellness_support",
+    "wellness": "mental_wellness_support",
+    "ayush": "ayush_support",
+    "ayurveda": "ayush_support",
+    "yoga": "ayush_support",
+    "homeopathy": "ayush_support",
+    "traditional_medicine": "ayush_support",
+    "symptom": "symptom_checker",
+    "symptoms": "symptom_checker",
+    "symptom_check": "symptom_checker",
+    "emergency": "symptom_checker",
+    "medical_emergency": "symptom_checker",
+    "facility": "facility_locator_support",
+    "facility_locator": "facility_locator_support",
+    "hospital": "facility_locator_support",
+    "hospital_locator": "facility_locator_support",
+}
+
+SAFETY_ALIASES = {
+    "none": "safe",
+    "ok": "safe",
+    "benign": "safe",
+    "medical": "safe",
+    "prompt_injection": "jailbreak",
+    "injection": "jailbreak",
+    "personal_information": "pii",
+    "personal_data": "pii",
+    "sensitive_data": "pii",
+    "violence": "harmful",
+    "hate_speech": "harmful",
+    "hate": "harmful",
+    "unsafe": "harmful",
+}
+
+_TRUE = {"true", "yes", "1", "safe"}
+_FALSE = {"false", "no", "0", "unsafe"}
+
+
+def _label_key(value: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", value.strip().lower()).strip("_")
+
+
+def match_label(value: Any, labels: Iterable[str], aliases: Optional[Dict[str, str]] = None, cutoff: float = 0.8) -> Optional[str]:
+    """
+    Map a free-form label onto one of labels: exact, alias, then closest
+    spelling (difflib ratio >= cutoff). None when nothing is close enough.
+    """
+    if not isinstance(value, str) or not value.strip():
+        return None
+    labels = list(labels)
+    key = _label_key(value)
+    if key in labels:
+        return key
+    aliases = aliases or {}
+    if key in aliases:
+        return aliases[key]
+    close = difflib.get_close_matches(key, labels + list(aliases), n=1, cutoff=cutoff)
+    if close:
+        return close[0] if close[0] in labels else aliases[close[0]]
+    return None
+
+
+def coerce_bool(value: Any) -> Optional[bool]:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return bool(value)
+    if isinstance(value, str):
+        key = value.strip().lower()
+        if key in _TRUE:
+            return True
+        if key in _FALSE:
+            return False
+    return None
+
+
+def _close_truncated(text: str) -> str:
+    """Close the strings, arrays and objects left open by a cut-off output"""
+    closers, in_string, escaped = [], False, False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+        elif char in "}]" and closers:
+            closers.pop()
+    if in_string:
+        text += '"'
+    # A key cut off before its value is dropped
+    text = re.sub(r'(,?\s*"[^"]*"\s*:)?\s*,?\s*$', "", text)
+    return text + "".join(reversed(closers))
+
+
+def extract_json(text: str) -> Tuple[Dict[str, Any], bool]:
+    """
+    Parse the JSON object in a model output, fixing common defects: code
+    fences, text around the object, single quotes, Python literals, trailing
+    commas and unquoted keys. Returns (object, whether it needed fixing).
+    """
+    if not isinstance(text, str):
+        raise OutputRepairError(f"Expected text, got {type(text).__name__}")
+    try:
+        value = json.loads(text)
+        if isinstance(value, dict):
+            return value, False
+    except json.JSONDecodeError:
+        pass
+
+    candidate = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip(), flags=re.IGNORECASE)
+    start, end = candidate.find("{"), candidate.rfind("}")
+    if start == -1:
+        raise OutputRepairError("No JSON object in output")
+
+    attempts = [candidate[start:end + 1]] if end > start else []
+    # A truncated object is closed rather than dropped
+    attempts.append(_close_truncated(candidate[start:]))
+    candidate = attempts[0]
+    fixed = re.sub(r",\s*([}\]])", r"\1", candidate)
+    fixed = re.sub(r"\bTrue\b", "true", fixed)
+    fixed = re.sub(r"\bFalse\b", "false", fixed)
+    fixed = re.sub(r"\bNone\b", "null", fixed)
+    attempts.append(fixed)
+    if '"' not in fixed:
+        fixed = fixed.replace("'", '"')
+        attempts.append(fixed)
+    attempts.append(re.sub(r"([{,]\s*)([A-Za-z_][\w]*)\s*:", r'\1"\2":', fixed))
+
+    for attempt in attempts:
+        try:
+            value = json.loads(attempt)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(value, dict):
+            return value, True
+    raise OutputRepairError("Output is not repairable JSON")
+
+
+def coerce_confidence(value: Any) -> Optional[float]:
+    """Confidence as a float in [0, 1]; percentages are scaled down"""
+    if isinstance(value, str):
+        value = value.strip().rstrip("%")
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    if value > 1:
+        value /= 100
+    return min(max(value, 0.0), 1.0)
+
+
+def repair_safety(value: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+    """
+    Guardrail output with is_safe as a bool and category one of
+    SAFETY_CATEGORIES. A missing field is inferred from the other one.
+    """
+    is_safe = coerce_bool(value.get("is_safe"))
+    category = match_label(value.get("category"), SAFETY_CATEGORIES, SAFETY_ALIASES)
+    if is_safe is None and category is None:
+        raise OutputRepairError(f"Unrecognised safety decision: {value!r}")
+    if is_safe is None:
+        is_safe = category == "safe"
+    if category is None:
+        category = "safe" if is_safe else "harmful"
+    reason = value.get("reason")
+    repaired = {**value, "is_safe": is_safe, "category": category, "reason": reason if isinstance(reason, str) else ""}
+    return repaired, repaired != value
+
+
+def repair_intent(value: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+    """Classifier output with classification one of INTENT_LABELS and a numeric confidence"""
+    classification = match_label(
+        value.get("classification") or value.get("intent"), INTENT_LABELS, INTENT_ALIASES
+    )
+    if classification is None:
+        raise OutputRepairError(f"Unrecognised intent: {value.get('classification')!r}")
+    repaired = {**value, "classification": classification}
+    repaired.pop("intent", None)
+    reasoning = value.get("reasoning")
+    repaired["reasoning"] = reasoning if isinstance(reasoning, str) else ""
+    if "confidence" in value:
+        confidence = coerce_confidence(value["confidence"])
+        # An unreadable confidence fails the cascade's threshold rather than passing it
+        repaired["confidence"] = 0.0 if confidence is None else confidence
+    return repaired, repaired != value
@@ -0,0 +1,131 @@
+"""
+Cache pre-warming from query logs
+"""
+
+import json
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, Iterator, List
+
+from .canonicalize import anchor_tokens, canonical_text
+
+
+class QueryCluster:
+    """Group of logged queries considered the same question"""
+
+    def __init__(self, normalized: str):
+        self.tokens = set(normalized.split())
+        self.anchors = anchor_tokens(normalized.split())
+        self.variants: Counter = Counter()
+        self.count = 0
+
+    @property
+    def canonical(self) -> str:
+        """The most frequently asked wording"""
+        return self.variants.most_common(1)[0][0]
+
+    def add(self, query: str, count: int = 1):
+        self.variants[query] += count
+        self.count += count
+
+
+def read_queries(path: str) -> Iterator[str]:
+    """Stream queries from a JSONL log ("query", "body" or "title" field per line)"""
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(record, str):
+                yield record
+            elif isinstance(record, dict):
+                query = record.get("query") or record.get("body") or record.get("title")
+                if query:
+                    yield query
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def cluster_queries(queries: Iterable[str], threshold: float = 0.6) -> List[QueryCluster]:
+    """
+    Greedy clustering of queries by token-set Jaccard similarity.
+
+    Queries with the same canonical form (see canonicalize.py) are counted
+    together first. Then the most frequent forms seed clusters and each
+    remaining form joins the most similar cluster above threshold that has
+    the same anchor tokens (so "type 1" and "type 2" questions stay apart).
+    An inverted token index keeps candidate comparisons to clusters sharing
+    at least one token.
+    """
+    by_normalized: Dict[str, Counter] = defaultdict(Counter)
+    for query in queries:
+        normalized = canonical_text(query)
+        if normalized:
+            by_normalized[normalized][query.strip()] += 1
+
+    clusters: List[QueryCluster] = []
+    token_index: Dict[str, List[int]] = defaultdict(list)
+    ordered = sorted(by_normalized.items(), key=lambda item: -sum(item[1].values()))
+    for normalized, variants in ordered:
+        tokens = set(normalized.split())
+        anchors = anchor_tokens(normalized.split())
+        candidates = {i for token in tokens for i in token_index[token]}
+        best, best_score = None, threshold
+        for i in candidates:
+            if clusters[i].anchors != anchors:
+                continue
+            score = jaccard(tokens, clusters[i].tokens)
+            if score >= best_score:
+                best, best_score = i, score
+        if best is None:
+            best = len(clusters)
+            clusters.append(QueryCluster(normalized))
+            for token in tokens:
+                token_index[token].append(best)
+        for query, count in variants.items():
+            clusters[best].add(query, count)
+
+    return sorted(clusters, key=lambda cluster: -cluster.count)
+
+
+def prewarm(workflow, clusters: List[QueryCluster], top_n: int = 100, concurrency: int = 4) -> Dict[str, Any]:
+    """
+    Run the canonical question of the top_n clusters through workflow.warm()
+    with at most concurrency requests in flight. The provider rate limiters
+    still apply on top of this.
+    """
+    selected = clusters[:top_n]
+    outcomes: Counter = Counter()
+    failures = []
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="prewarm") as executor:
+        futures = {executor.submit(workflow.warm, cluster.canonical): cluster for cluster in selected}
+        for done, future in enumerate(as_completed(futures), 1):
+            cluster = futures[future]
+            try:
+                outcome = future.result()
+            except Exception as e:
+                outcome = "failed"
+                failures.append({"query": cluster.canonical, "error": f"{type(e).__name__}: {e}"})
+            outcomes[outcome] += 1
+            print(f"   [{done}/{len(selected)}] {outcome:<14} ({cluster.count}x) {cluster.canonical}")
+
+    return {
+        "clusters": len(clusters),
+        "warmed_clusters": len(selected),
+        "queries_covered": sum(cluster.count for cluster in selected),
+        "queries_total": sum(cluster.count for cluster in clusters),
+        "outcomes": dict(outcomes),
+        "failures": failures,
+        "seconds": time.perf_counter() - start,
+    }
@@ -0,0 +1,280 @@
+"""
+Sampling profiler for individual workflow requests, aggregated by intent and chain
+"""
+
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .metrics import metrics
+
+
+# Innermost Python functions of a thread blocked in C, for platforms
+# without per-thread CPU clocks
+WAIT_FUNCTIONS = {
+    "select", "poll", "epoll", "wait", "acquire", "sleep", "recv", "recv_into",
+    "read", "readinto", "readline", "accept", "connect", "result", "_wait_for_tstate_lock",
+}
+
+# Label of samples taken outside any chain
+WORKFLOW = "workflow"
+
+
+def _thread_clock(ident: int) -> Optional[int]:
+    """CPU-time clock of a thread, where the platform has one"""
+    try:
+        return time.pthread_getcpuclockid(ident)
+    except (AttributeError, OSError):
+        return None
+
+
+class _ThreadState:
+    """A thread working for a profiled request, and where its stack starts"""
+
+    __slots__ = ("profile", "root", "prefix", "chain", "clock", "last_wall", "last_cpu")
+
+    def __init__(self, profile: "RequestProfile", root, prefix: Tuple[str, ...], chain: Optional[str]):
+        self.profile = profile
+        # Frames from root outwards are left out of the stacks
+        self.root = root
+        self.prefix = prefix
+        self.chain = chain
+        self.clock = _thread_clock(threading.get_ident())
+        self.last_wall = time.perf_counter()
+        self.last_cpu = time.clock_gettime(self.clock) if self.clock is not None else None
+
+
+class RequestProfile:
+    """Samples of one request: seconds on CPU and waiting per (chain, stack)"""
+
+    def __init__(self):
+        self.samples: Dict[Tuple[str, Tuple[str, ...]], List[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, chain: str, stack: Tuple[str, ...], cpu: float, wait: float):
+        with self._lock:
+            entry = self.samples[(chain, stack)]
+            entry[0] += 1
+            entry[1] += cpu
+            entry[2] += wait
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for sampled workflow requests.
+
+    While a profiled request runs, a background thread wakes every interval
+    seconds and records the Python stack of each thread working for it: the
+    request thread and the step workers started from it (the request's
+    deadline passes them through worker_wrapper()), whose stacks are attached below the frame
+    that started them. The time since a thread's previous sample is split
+    into on-CPU time, read from the thread's CPU clock, and waiting time
+    (network, rate limits, locks).
+
+    Samples are labelled with the chain they ran in and, when the request
+    finishes, its intent. output_dir receives collapsed-stack files
+    (cpu.folded, wait.folded, wall.folded; "intent;chain;frames... µs" per
+    line, for flamegraph.pl or speedscope) and summary.json with the totals
+    per intent and chain. They are rewritten after every profiled request.
+    """
+
+    def __init__(self, output_dir: str, interval: float = 0.005):
+        self.output_dir = output_dir
+        self.interval = interval
+        self._threads: Dict[int, _ThreadState] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        # (intent, chain, stack) -> [samples, cpu seconds, wait seconds]
+        self._stacks: Dict[Tuple[str, str, Tuple[str, ...]], List[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+        # intent -> [requests, wall seconds]
+        self._requests: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])
+        self._labels: Dict[Any, str] = {}
+        self._chain_codes: Optional[Dict[Any, str]] = None
+
+    def _chain_of(self, code) -> Optional[str]:
+        """Chain class whose own method code is, if any"""
+        if self._chain_codes is None:
+            from .chains.base_chains import BaseChain
+            codes, pending = {}, [BaseChain]
+            while pending:
+                cls = pending.pop()
+                pending.extend(cls.__subclasses__())
+                for value in vars(cls).values():
+                    function = getattr(value, "__func__", value)
+                    if hasattr(function, "__code__"):
+                        codes[function.__code__] = cls.__name__
+            self._chain_codes = codes
+        return self._chain_codes.get(code)
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            name = getattr(code, "co_qualname", code.co_name)
+            label = f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def _walk(self, frame, root) -> Tuple[Tuple[str, ...], Optional[str]]:
+        """Stack labels outermost first, stopping at root, and the outermost chain on it"""
+        labels, chain = [], None
+        while frame is not None and frame is not root:
+            code = frame.f_code
+            labels.append(self._label(code))
+            chain = self._chain_of(code) or chain
+            frame = frame.f_back
+        labels.reverse()
+        return tuple(labels), chain
+
+    def _register(self, state: _ThreadState):
+        with self._lock:
+            self._threads[threading.get_ident()] = state
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+                self._sampler.start()
+        self._wake.set()
+
+    def _unregister(self):
+        with self._lock:
+            self._threads.pop(threading.get_ident(), None)
+
+    def start(self) -> RequestProfile:
+        """Profile the calling request from the caller's frame down; pass the result to finish()"""
+        profile = RequestProfile()
+        self._register(_ThreadState(profile, sys._getframe(1).f_back, (), None))
+        metrics.increment("profiling.requests")
+        return profile
+
+    def worker_wrapper(self, profile: RequestProfile) -> Callable[[Callable], Callable]:
+        """wrap() bound to profile, for RequestDeadline's worker_wrapper"""
+        return functools.partial(self.wrap, profile=profile)
+
+    def wrap(self, fn: Callable, profile: RequestProfile) -> Callable:
+        """fn, sampled as part of profile when it runs in another thread"""
+        with self._lock:
+            parent = self._threads.get(threading.get_ident())
+        # The worker's stacks continue from the frame submitting it
+        submitter = sys._getframe(1)
+        if parent is not None:
+            stack, chain = self._walk(submitter, parent.root)
+            prefix, chain = parent.prefix + stack, parent.chain or chain
+        else:
+            prefix, chain = self._walk(submitter, None)
+
+        @functools.wraps(fn)
+        def profiled(*args, **kwargs):
+            self._register(_ThreadState(profile, sys._getframe(), prefix, chain))
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._unregister()
+
+        return profiled
+
+    def finish(self, profile: RequestProfile, intent: Optional[str]):
+        """Stop sampling the calling thread and add the request's samples under intent"""
+        self._unregister()
+        intent = intent or "unknown"
+        with profile._lock:
+            samples = list(profile.samples.items())
+        with self._lock:
+            request = self._requests[intent]
+            request[0] += 1
+            request[1] += time.perf_counter() - profile.started
+            for (chain, stack), (count, cpu, wait) in samples:
+                entry = self._stacks[(intent, chain, stack)]
+                entry[0] += count
+                entry[1] += cpu
+                entry[2] += wait
+        try:
+            self.write()
+        except OSError as e:
+            print(f"   ⚠️  Could not write profiles to {self.output_dir}: {e}")
+
+    def _sample_loop(self):
+        while True:
+            with self._lock:
+                threads = list(self._threads.items())
+            if not threads:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            frames = sys._current_frames()
+            now = time.perf_counter()
+            for ident, state in threads:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                wall = now - state.last_wall
+                state.last_wall = now
+                stack, chain = self._walk(frame, state.root)
+                if state.clock is not None:
+                    try:
+                        cpu_time = time.clock_gettime(state.clock)
+                    except OSError:
+                        # The thread exited since the snapshot
+                        continue
+                    cpu = min(max(cpu_time - state.last_cpu, 0.0), wall)
+                    state.last_cpu = cpu_time
+                else:
+                    cpu = 0.0 if frame.f_code.co_name in WAIT_FUNCTIONS else wall
+                state.profile.add(state.chain or chain or WORKFLOW, state.prefix + stack, cpu, wall - cpu)
+            del frames
+            time.sleep(self.interval)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Per intent: profiled requests, their wall time, and the sampled CPU
+        and waiting seconds of all their threads, in total and per chain.
+        """
+        with self._lock:
+            requests = {intent: list(values) for intent, values in self._requests.items()}
+            stacks = list(self._stacks.items())
+        intents: Dict[str, Any] = {}
+        for intent, (count, wall) in requests.items():
+            intents[intent] = {"requests": int(count), "wall_seconds": wall, "cpu_seconds": 0.0,
+                               "wait_seconds": 0.0, "chains": {}}
+        for (intent, chain, _), (count, cpu, wait) in stacks:
+            totals = intents[intent]["chains"].setdefault(
+                chain, {"samples": 0, "cpu_seconds": 0.0, "wait_seconds": 0.0}
+            )
+            for entry in (totals, intents[intent]):
+                entry["cpu_seconds"] += cpu
+                entry["wait_seconds"] += wait
+            totals["samples"] += int(count)
+        for values in intents.values():
+            for entry in [values] + list(values["chains"].values()):
+                for key in ("wall_seconds", "cpu_seconds", "wait_seconds"):
+                    if key in entry:
+                        entry[key] = round(entry[key], 4)
+        return {"interval": self.interval, "intents": intents}
+
+    def write(self):
+        """Rewrite the collapsed-stack files and summary.json in output_dir"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        with self._lock:
+            stacks = list(self._stacks.items())
+        lines = {"cpu": [], "wait": [], "wall": []}
+        for (intent, chain, stack), (_, cpu, wait) in sorted(stacks):
+            # Frames are separated by ";"; the count follows the last space
+            path = ";".join(part.replace(";", ":") for part in (intent, chain) + stack)
+            for kind, seconds in (("cpu", cpu), ("wait", wait), ("wall", cpu + wait)):
+                micros = int(round(seconds * 1e6))
+                if micros:
+                    lines[kind].append(f"{path} {micros}\n")
+        for kind, kind_lines in lines.items():
+            self._replace(f"{kind}.folded", "".join(kind_lines))
+        self._replace("summary.json", json.dumps(self.summary(), indent=2))
+
+    def _replace(self, filename: str, content: str):
+        path = os.path.join(self.output_dir, filename)
+        with open(path + ".tmp", "w") as f:
+            f.write(content)
+        os.replace(path + ".tmp", path)
+
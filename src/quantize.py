@@ -0,0 +1,102 @@
+"""
+Scalar (int8) and product quantization of embedding matrices for inner-product search
+"""
+
+from typing import Optional
+
+import numpy as np
+
+
+QUANTIZATIONS = ("int8", "pq")
+
+# Rows converted to float per block of an int8 scan; small enough to stay in cache
+SCAN_BLOCK_ROWS = 2048
+
+# Rows encoded per block when building PQ codes
+ENCODE_BLOCK_ROWS = 65536
+
+# Rows sampled to train the product quantizer codebooks
+PQ_TRAINING_ROWS = 20000
+
+PQ_CENTROIDS = 256
+
+
+def quantize_int8(matrix: np.ndarray):
+    """
+    Symmetric per-dimension int8 codes: row ≈ codes * scale. Returns
+    (codes, scale); 4x smaller than float32.
+    """
+    scale = np.abs(matrix).max(axis=0) / 127.0 if len(matrix) else np.ones(matrix.shape[1])
+    scale = np.where(scale == 0, 1.0, scale).astype(np.float32)
+    codes = np.clip(np.rint(matrix / scale), -127, 127).astype(np.int8)
+    return codes, scale
+
+
+def _kmeans(x: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    centroids = x[rng.choice(len(x), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        # argmin ||x - c||^2 = argmax (x.c - ||c||^2 / 2)
+        assignment = np.argmax(x @ centroids.T - 0.5 * (centroids ** 2).sum(axis=1), axis=1)
+        counts = np.bincount(assignment, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, x)
+        filled = counts > 0
+        # Empty clusters keep their previous centroid
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+def train_pq(matrix: np.ndarray, subvectors: int, iterations: int = 12, seed: int = 0) -> np.ndarray:
+    """
+    Codebooks of shape (subvectors, centroids, dimensions / subvectors),
+    trained by k-means on each slice of a sample of the rows.
+    """
+    dimensions = matrix.shape[1]
+    if subvectors <= 0 or dimensions % subvectors:
+        raise ValueError(f"{dimensions} dimensions do not split into {subvectors} subvectors")
+    rng = np.random.default_rng(seed)
+    sample = matrix if len(matrix) <= PQ_TRAINING_ROWS else matrix[rng.choice(len(matrix), PQ_TRAINING_ROWS, replace=False)]
+    sample = np.asarray(sample, dtype=np.float32)
+    k = min(PQ_CENTROIDS, len(sample))
+    width = dimensions // subvectors
+    return np.stack([
+        _kmeans(sample[:, m * width:(m + 1) * width], k, iterations, rng) for m in range(subvectors)
+    ]).astype(np.float32)
+
+
+def encode_pq(matrix: np.ndarray, codebook: np.ndarray) -> np.ndarray:
+    """
+    uint8 centroid index per subvector and row, shape (subvectors, rows):
+    subvector-major, so a scan reads each subvector's codes contiguously.
+    """
+    subvectors, _, width = codebook.shape
+    codes = np.empty((subvectors, len(matrix)), dtype=np.uint8)
+    norms = 0.5 * (codebook ** 2).sum(axis=2)
+    for start in range(0, len(matrix), ENCODE_BLOCK_ROWS):
+        block = np.asarray(matrix[start:start + ENCODE_BLOCK_ROWS], dtype=np.float32)
+        for m in range(subvectors):
+            sub = block[:, m * width:(m + 1) * width]
+            codes[m, start:start + len(block)] = np.argmax(sub @ codebook[m].T - norms[m], axis=1)
+    return codes
+
+
+def approximate_scores(query: np.ndarray, codes: np.ndarray, codebook: Optional[np.ndarray], kind: str) -> np.ndarray:
+    """
+    Approximate inner products of query with every encoded row. codebook is
+    the per-dimension scale for int8 (folded into the query) and the
+    codebooks for PQ (scores are sums over a per-subvector lookup table).
+    """
+    if kind == "int8":
+        scaled = (query * codebook).astype(np.float32)
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCAN_BLOCK_ROWS):
+            scores[start:start + SCAN_BLOCK_ROWS] = codes[start:start + SCAN_BLOCK_ROWS].astype(np.float32) @ scaled
+        return scores
+    if kind == "pq":
+        subvectors, _, width = codebook.shape
+        table = np.einsum("mkd,md->mk", codebook, query.reshape(subvectors, width)).astype(np.float32)
+        scores = np.zeros(codes.shape[1], dtype=np.float32)
+        for m in range(subvectors):
+            scores += np.take(table[m], codes[m])
+        return scores
+    raise ValueError(f"Unknown quantization {kind!r}")
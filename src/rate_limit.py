@@ -0,0 +1,411 @@
+"""
+Client-side rate limiting and retry scheduling for provider calls
+"""
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .deadline import DeadlineExceeded, time_left
+from .metrics import metrics
+
+
+class QuotaExceededError(RuntimeError):
+    """Raised when a hard provider quota (e.g. Tavily's monthly searches) is used up"""
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """True for provider rate-limit exceptions and HTTP 429 responses"""
+    if any("RateLimit" in cls.__name__ for cls in type(error).__mro__):
+        return True
+    return _status_code(error) == 429
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """True for errors worth retrying: rate limits, timeouts, connection and 5xx errors"""
+    if is_rate_limit_error(error):
+        return True
+    name = type(error).__name__
+    if any(marker in name for marker in ("Timeout", "Connection", "InternalServer", "ServiceUnavailable")):
+        return True
+    status = _status_code(error)
+    return status is not None and status >= 500
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    """HTTP status of an error, from the exception or its response"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Read Retry-After (or OpenAI's retry-after-ms) from an error's HTTP response"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at rate_per_minute.
+
+    reserve() never blocks: it takes the tokens (possibly going into debt) and
+    returns how long the caller must wait, so sync and async callers can share
+    one bucket.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """Take amount tokens and return the seconds to wait before using them"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Requests larger than the bucket are allowed once it is full
+            self._tokens -= min(amount, self.capacity)
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit.
+
+    The limit grows by one slot per window of successful calls below the
+    latency target and is cut multiplicatively on 429s (halved) or on slow
+    responses (by 10%).
+
+    The target of a call is latency_target plus latency_per_token for each
+    output token it may generate, so long generations are not judged by the
+    latency of short ones. A burst of slow calls cuts the limit once: calls
+    that started before the last cut don't cut it again.
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 32,
+        latency_target: float = 10.0,
+        latency_per_token: float = 0.0
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.latency_per_token = latency_per_token
+        self.limit = float(initial)
+        self.in_flight = 0
+        self._last_cut = float("-inf")
+        self._cond = threading.Condition()
+
+    def target_for(self, output_tokens: float = 0) -> float:
+        """Latency target of a call generating up to output_tokens"""
+        return self.latency_target + self.latency_per_token * output_tokens
+
+    def try_acquire(self) -> bool:
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait(timeout=1.0)
+            self.in_flight += 1
+
+    async def acquire_async(self):
+        delay = 0.005
+        while not self.try_acquire():
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.25)
+
+    def release(self, latency: Optional[float] = None, throttled: bool = False, output_tokens: float = 0):
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                self.limit = max(self.minimum, self.limit * 0.5)
+                self._last_cut = now
+            elif latency is not None and latency > self.target_for(output_tokens):
+                if now - latency > self._last_cut:
+                    self.limit = max(self.minimum, self.limit * 0.9)
+                    self._last_cut = now
+            elif latency is not None:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+
+class MonthlyQuota:
+    """
+    Counts calls per calendar month against a hard limit.
+
+    Without a path the count lives in this process only and starts from zero
+    on every restart. With a path it is saved to that JSON file after each
+    call and read back on start. The file is not locked, so processes running
+    at the same time need a path (and a share of the quota) each.
+    """
+
+    def __init__(self, limit: int, path: Optional[str] = None):
+        self.limit = limit
+        self.path = path
+        self._month = None
+        self._used = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    state = json.load(f)
+                self._month, self._used = state["month"], int(state["used"])
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"   ⚠️  Could not read quota state from {path}: {e}")
+
+    def _save(self):
+        try:
+            with open(self.path + ".tmp", "w") as f:
+                json.dump({"month": self._month, "used": self._used}, f)
+            os.replace(self.path + ".tmp", self.path)
+        except OSError as e:
+            print(f"   ⚠️  Could not save quota state to {self.path}: {e}")
+
+    def _current_month(self):
+        month = datetime.utcnow().strftime("%Y-%m")
+        if month != self._month:
+            self._month, self._used = month, 0
+        if self._used >= self.limit:
+            raise QuotaExceededError(f"Monthly quota of {self.limit} calls exhausted")
+
+    def check(self):
+        """Raise QuotaExceededError when the quota is used up, without using any"""
+        with self._lock:
+            self._current_month()
+
+    def take(self):
+        with self._lock:
+            self._current_month()
+            self._used += 1
+            if self.path:
+                self._save()
+
+    @property
+    def remaining(self) -> int:
+        with self._lock:
+            return max(self.limit - self._used, 0)
+
+
+class RateLimiter:
+    """
+    Limiter for one provider: requests/minute and tokens/minute buckets, an
+    adaptive concurrency limit, an optional monthly quota, and jittered
+    exponential-backoff retries that honour Retry-After.
+
+    One instance is shared by every chain (see shared_rate_limits), so limits
+    hold across all threads and asyncio tasks in the process. Waits and
+    retries stop at the current step's timeout or request deadline (see
+    deadline.time_left), so a step that was given up on frees its thread.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: float = 500,
+        tokens_per_minute: Optional[float] = None,
+        max_concurrency: int = 16,
+        latency_target: float = 10.0,
+        latency_per_token: float = 0.0,
+        max_retries: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        monthly_quota: Optional[int] = None,
+        quota_path: Optional[str] = None
+    ):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrencyLimiter(
+            initial=max(1, max_concurrency // 2),
+            maximum=max_concurrency,
+            latency_target=latency_target,
+            latency_per_token=latency_per_token
+        )
+        self.quota = MonthlyQuota(monthly_quota, quota_path) if monthly_quota else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def _admission_delay(self, tokens: float, attempt: int) -> float:
+        """
+        Reserve an attempt's share of the rate limits and return how long to
+        wait before making it. The monthly quota is charged once per logical
+        call, on its first attempt and only once the wait fits in the time
+        left, so retries and calls given up on don't use it.
+        """
+        if self.quota is not None and attempt == 0:
+            self.quota.check()
+        delay = self.requests.reserve(1)
+        if self.tokens is not None and tokens:
+            delay = max(delay, self.tokens.reserve(tokens))
+        if delay:
+            metrics.increment(f"rate_limit.{self.name}.throttled")
+        left = time_left()
+        if left is not None and left <= 0:
+            raise DeadlineExceeded(f"deadline passed before the {self.name} call")
+        if left is not None and delay >= left:
+            raise DeadlineExceeded(f"{self.name} rate limit wait of {delay:.1f}s exceeds the time left")
+        if self.quota is not None and attempt == 0:
+            self.quota.take()
+        return delay
+
+    def _retry_delay(self, error: BaseException, attempt: int) -> float:
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            # Small jitter so that callers told the same Retry-After don't stampede
+            return min(retry_after, self.max_delay) + random.uniform(0, self.base_delay)
+        # Full jitter exponential backoff
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _on_error(self, error: BaseException, attempt: int) -> float:
+        """Account for a failed attempt; returns the retry delay or re-raises"""
+        throttled = is_rate_limit_error(error)
+        self.concurrency.release(throttled=throttled)
+        if throttled:
+            metrics.increment(f"rate_limit.{self.name}.429")
+        if attempt >= self.max_retries or not is_transient_error(error):
+            raise error
+        delay = self._retry_delay(error, attempt)
+        left = time_left()
+        if left is not None and delay >= left:
+            # The step times out before the retry could start
+            metrics.increment(f"rate_limit.{self.name}.retries_abandoned")
+            raise error
+        metrics.increment(f"rate_limit.{self.name}.retries")
+        print(f"      ⏳ {self.name} call failed ({type(error).__name__}), retrying in {delay:.1f}s")
+        return delay
+
+    def call(self, fn: Callable[..., Any], *args, tokens: float = 0, output_tokens: float = 0, **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs) under the limits, retrying transient failures.
+
+        tokens is the call's estimated total against the tokens/minute budget;
+        output_tokens its maximum output, which scales its latency target.
+        """
+        for attempt in range(self.max_retries + 1):
+            delay = self._admission_delay(tokens, attempt)
+            if delay:
+                time.sleep(delay)
+            self.concurrency.acquire()
+            start = time.monotonic()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                time.sleep(self._on_error(e, attempt))
+                continue
+            latency = time.monotonic() - start
+            self.concurrency.release(latency=latency, output_tokens=output_tokens)
+            metrics.observe(f"rate_limit.{self.name}.latency", latency)
+            return result
+
+    async def acall(self, fn: Callable[..., Any], *args, tokens: float = 0, output_tokens: float = 0, **kwargs) -> Any:
+        """Async counterpart of call() for coroutine functions"""
+        for attempt in range(self.max_retries + 1):
+            delay = self._admission_delay(tokens, attempt)
+            if delay:
+                await asyncio.sleep(delay)
+            await self.concurrency.acquire_async()
+            start = time.monotonic()
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                await asyncio.sleep(self._on_error(e, attempt))
+                continue
+            latency = time.monotonic() - start
+            self.concurrency.release(latency=latency, output_tokens=output_tokens)
+            metrics.observe(f"rate_limit.{self.name}.latency", latency)
+            return result
+
+
+class RateLimits:
+    """The per-provider limiters used by the chains"""
+
+    def __init__(self, openai: RateLimiter, tavily: RateLimiter):
+        self.openai = openai
+        self.tavily = tavily
+
+
+_shared: Dict[tuple, Tuple[tuple, RateLimits]] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_rate_limits(
+    openai_key: str,
+    tavily_key: str,
+    openai_rpm: float = 500,
+    openai_tpm: Optional[float] = 200000,
+    tavily_rpm: float = 100,
+    tavily_monthly_quota: Optional[int] = None,
+    tavily_quota_path: Optional[str] = None,
+    max_concurrency: int = 16
+) -> RateLimits:
+    """
+    Process-wide limiters per API key pair.
+
+    Every HealthcareConfig built with the same keys gets the same limiters, so
+    separate workflows in one process cannot exceed the provider limits
+    together. The limits belong to the keys, so asking for the same keys with
+    different settings raises ValueError instead of silently keeping the first.
+    """
+    key = (openai_key, tavily_key)
+    settings = (openai_rpm, openai_tpm, tavily_rpm, tavily_monthly_quota, tavily_quota_path, max_concurrency)
+    with _shared_lock:
+        if key in _shared:
+            existing, limits = _shared[key]
+            if existing != settings:
+                raise ValueError(
+                    "Rate limits for these API keys are already set up in this process with different "
+                    f"settings (openai_rpm, openai_tpm, tavily_rpm, tavily_monthly_quota, "
+                    f"tavily_quota_path, max_concurrency): {existing} != {settings}"
+                )
+            return limits
+        limits = RateLimits(
+            openai=RateLimiter(
+                "openai",
+                requests_per_minute=openai_rpm,
+                tokens_per_minute=openai_tpm,
+                max_concurrency=max_concurrency,
+                # Fixed overhead plus generation time, judged per output token
+                latency_target=3.0,
+                latency_per_token=0.02
+            ),
+            tavily=RateLimiter(
+                "tavily",
+                requests_per_minute=tavily_rpm,
+                max_concurrency=max_concurrency,
+                latency_target=5.0,
+                monthly_quota=tavily_monthly_quota,
+                quota_path=tavily_quota_path
+            )
+        )
+        _shared[key] = (settings, limits)
+        return limits
@@ -0,0 +1,140 @@
+"""
+Local reranking of search results before prompt assembly
+"""
+
+import hashlib
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .cache import CacheBackend, InMemoryCacheBackend, make_key
+from .canonicalize import canonical_tokens, shingles
+from .metrics import metrics
+
+
+class HashingEmbeddings:
+    """
+    Local embeddings by feature hashing: canonical tokens and character
+    trigrams (see canonicalize.py) hashed into a fixed number of signed
+    buckets. No model or network call, so it costs microseconds per text.
+    Implements the embed_documents/embed_query interface of LangChain
+    embeddings, so either can be given to EmbeddingCache.
+    """
+
+    def __init__(self, dimensions: int = 512):
+        self.dimensions = dimensions
+        self.model = f"hashing-{dimensions}"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        tokens = canonical_tokens(text)
+        for feature in shingles(tokens):
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+            # Whole tokens weigh more than their trigrams
+            weight = 1.0 if feature in tokens else 0.5
+            vector[digest % self.dimensions] += weight if digest >> 63 else -weight
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class EmbeddingCache:
+    """
+    Unit-normalized embeddings of texts, cached per model and text digest in a
+    cache backend. Misses are embedded in one batch call.
+    """
+
+    namespace = "embedding"
+
+    def __init__(self, embeddings, backend: Optional[CacheBackend] = None):
+        self.embeddings = embeddings
+        self.backend = backend or InMemoryCacheBackend(max_entries=10000)
+        self.model = str(getattr(embeddings, "model", type(embeddings).__name__))
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Matrix with one normalized row per text"""
+        keys = [make_key(self.namespace, self.model, text) for text in texts]
+        vectors: List[Optional[List[float]]] = []
+        missing = []
+        for i, key in enumerate(keys):
+            entry = self.backend.get(key)
+            vectors.append(entry["value"] if entry else None)
+            if entry is None:
+                missing.append(i)
+
+        metrics.increment("embedding.cache.hit", len(texts) - len(missing))
+        metrics.increment("embedding.cache.miss", len(missing))
+        if missing:
+            computed = self.embeddings.embed_documents([texts[i] for i in missing])
+            now = time.time()
+            for i, vector in zip(missing, computed):
+                vectors[i] = list(vector)
+                self.backend.set(keys[i], {"value": vectors[i], "created_at": now})
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def mmr(query_scores: np.ndarray, doc_vectors: np.ndarray, k: int, diversity: float) -> List[int]:
+    """
+    Maximal marginal relevance: greedily pick the document maximizing
+    (1 - diversity) * relevance - diversity * max similarity to those picked.
+    """
+    pairwise = doc_vectors @ doc_vectors.T
+    selected = [int(np.argmax(query_scores))]
+    redundancy = pairwise[selected[0]].copy()
+    candidates = np.ones(len(query_scores), dtype=bool)
+    candidates[selected[0]] = False
+    while len(selected) < k and candidates.any():
+        marginal = (1 - diversity) * query_scores - diversity * redundancy
+        marginal[~candidates] = -np.inf
+        best = int(np.argmax(marginal))
+        selected.append(best)
+        candidates[best] = False
+        redundancy = np.maximum(redundancy, pairwise[best])
+    return selected
+
+
+class SearchReranker:
+    """
+    Keeps the top_k search results most similar to the user's query.
+
+    Query and snippets are embedded through an EmbeddingCache and scored by
+    cosine similarity in one matrix product. With diversity > 0 the results
+    are picked by MMR instead, so near-identical pages do not fill the prompt.
+    """
+
+    def __init__(self, embedding_cache: EmbeddingCache, top_k: int = 3, diversity: float = 0.0):
+        self.embedding_cache = embedding_cache
+        self.top_k = top_k
+        self.diversity = diversity
+
+    @staticmethod
+    def passage(item: Dict[str, Any]) -> str:
+        return f"{item.get('title', '')}\n{item.get('content', '')}".strip()
+
+    def rerank(self, query: str, results: Any) -> Any:
+        """Top results for query, best first; anything but a list of results is returned as is"""
+        if not isinstance(results, list):
+            return results
+        items = [item for item in results if isinstance(item, dict) and item.get("content")]
+        if len(items) <= 1 or not query:
+            return results
+
+        start = time.perf_counter()
+        vectors = self.embedding_cache.embed([query] + [self.passage(item) for item in items])
+        scores = vectors[1:] @ vectors[0]
+        k = min(self.top_k, len(items))
+        if self.diversity > 0:
+            order = mmr(scores, vectors[1:], k, self.diversity)
+        else:
+            order = np.argsort(-scores)[:k].tolist()
+        metrics.observe("rerank.seconds", time.perf_counter() - start)
+        metrics.increment("rerank.dropped", len(items) - k)
+        return [items[i] for i in order]
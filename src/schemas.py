@@ -2,10 +2,25 @@
 Data schemas for healthcare workflow
 """
 
-from typing import List
+from typing import List, Literal, Optional, get_args
 from pydantic import BaseModel, Field
 
 
+IntentLabel = Literal[
+    "government_scheme_support",
+    "mental_wellness_support",
+    "ayush_support",
+    "symptom_checker",
+    "facility_locator_support",
+]
+
+SafetyCategory = Literal["jailbreak", "pii", "harmful", "safe"]
+
+INTENT_LABELS = get_args(IntentLabel)
+
+SAFETY_CATEGORIES = get_args(SafetyCategory)
+
+
 class ClassificationSchema(BaseModel):
     """Schema for intent classification"""
     classification: str = Field(
@@ -13,6 +28,34 @@ class ClassificationSchema(BaseModel):
                     "ayush_support, symptom_checker, facility_locator_support"
     )
     reasoning: str = Field(description="Why this classification was chosen")
+    confidence: float = Field(description="Confidence in the classification, 0-1", default=1.0)
+
+
+class GuardrailSchema(BaseModel):
+    """Schema for the strict guardrail output (every field required, enum category)"""
+    is_safe: bool = Field(description="False for jailbreak attempts, PII or harmful content")
+    reason: str = Field(description="Brief explanation of the safety decision")
+    category: SafetyCategory = Field(description="Safety category")
+
+
+class IntentSchema(BaseModel):
+    """Schema for the strict intent classification output (every field required, enum label)"""
+    classification: IntentLabel = Field(description="Intent of the query")
+    reasoning: str = Field(description="Why this classification was chosen")
+    confidence: float = Field(description="Confidence in the classification, 0-1")
+
+
+class SafetyIntentSchema(BaseModel):
+    """Schema for the fused guardrail + intent classification call"""
+    is_safe: bool = Field(description="False for jailbreak attempts, PII or harmful content")
+    category: str = Field(description="One of: jailbreak, pii, harmful, safe")
+    reason: str = Field(description="Brief explanation of the safety decision")
+    classification: str = Field(
+        description="One of: government_scheme_support, mental_wellness_support, "
+                    "ayush_support, symptom_checker, facility_locator_support"
+    )
+    reasoning: str = Field(description="Why this classification was chosen")
+    confidence: float = Field(description="Confidence in the classification, 0-1", default=1.0)
 
 
 class SymptomCheckerSchema(BaseModel):
@@ -25,6 +68,20 @@ class SymptomCheckerSchema(BaseModel):
     triggers: str = Field(description="Symptom triggers if any", default="")
     additional_details: str = Field(description="Any other relevant info", default="")
     is_emergency: bool = Field(description="Whether this is an emergency")
+    confidence: float = Field(description="Confidence in the assessment, 0-1", default=1.0)
+
+
+class SymptomRecommendationSchema(BaseModel):
+    """Schema for the consolidated non-emergency symptom recommendations"""
+    ayurveda_recommendations: str = Field(
+        description="Ayurvedic remedies, diet and lifestyle advice, with precautions"
+    )
+    yoga_recommendations: str = Field(
+        description="Yoga poses (asanas) and breathing exercises (pranayama), with safety notes"
+    )
+    general_guidance: str = Field(
+        description="General wellness advice and clear signs for when to see a doctor"
+    )
 
 
 class GovernmentSchemeSchema(BaseModel):
@@ -33,3 +90,13 @@ class GovernmentSchemeSchema(BaseModel):
     target_beneficiaries: str
     description: str
     official_link: str
+    # Catalogue fields (see schemes.py); empty states means all of India
+    # and no age or income bound means none applies
+    eligibility: str = ""
+    aliases: List[str] = Field(default_factory=list)
+    keywords: List[str] = Field(default_factory=list)
+    states: List[str] = Field(default_factory=list)
+    categories: List[str] = Field(default_factory=list)
+    min_age: Optional[int] = None
+    max_age: Optional[int] = None
+    max_annual_income: Optional[int] = None
@@ -0,0 +1,382 @@
+"""
+Local government-scheme catalogue with eligibility filters and a keyword index
+"""
+
+import math
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .canonicalize import canonical_tokens
+from .metrics import metrics
+from .schemas import GovernmentSchemeSchema
+
+
+DEFAULT_CATALOGUE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "schemes.jsonl")
+
+# State names, common spellings and large cities mapped to state keys
+STATES = {
+    "andhra pradesh": "andhra_pradesh", "arunachal pradesh": "arunachal_pradesh", "assam": "assam",
+    "bihar": "bihar", "chhattisgarh": "chhattisgarh", "goa": "goa", "gujarat": "gujarat",
+    "haryana": "haryana", "himachal pradesh": "himachal_pradesh", "jharkhand": "jharkhand",
+    "karnataka": "karnataka", "kerala": "kerala", "madhya pradesh": "madhya_pradesh",
+    "maharashtra": "maharashtra", "manipur": "manipur", "meghalaya": "meghalaya", "mizoram": "mizoram",
+    "nagaland": "nagaland", "odisha": "odisha", "orissa": "odisha", "punjab": "punjab",
+    "rajasthan": "rajasthan", "sikkim": "sikkim", "tamil nadu": "tamil_nadu", "tamilnadu": "tamil_nadu",
+    "telangana": "telangana", "tripura": "tripura", "uttar pradesh": "uttar_pradesh",
+    "uttarakhand": "uttarakhand", "west bengal": "west_bengal", "delhi": "delhi",
+    "jammu and kashmir": "jammu_kashmir", "jammu kashmir": "jammu_kashmir", "ladakh": "ladakh",
+    "puducherry": "puducherry", "pondicherry": "puducherry", "chandigarh": "chandigarh",
+    "bangalore": "karnataka", "bengaluru": "karnataka", "mysore": "karnataka", "mysuru": "karnataka",
+    "chennai": "tamil_nadu", "madurai": "tamil_nadu", "coimbatore": "tamil_nadu",
+    "mumbai": "maharashtra", "pune": "maharashtra", "nagpur": "maharashtra",
+    "hyderabad": "telangana", "vijayawada": "andhra_pradesh", "visakhapatnam": "andhra_pradesh",
+    "kochi": "kerala", "thiruvananthapuram": "kerala", "jaipur": "rajasthan", "jodhpur": "rajasthan",
+    "kolkata": "west_bengal", "lucknow": "uttar_pradesh", "patna": "bihar", "bhopal": "madhya_pradesh",
+    "ahmedabad": "gujarat", "bhubaneswar": "odisha", "new delhi": "delhi",
+}
+
+# Phrases in a question that put the asker in a beneficiary category
+CATEGORY_PHRASES = {
+    "bpl": ("bpl", "below poverty line", "poor", "ration card", "antyodaya", "white card", "garib"),
+    "senior_citizen": ("senior citizen", "elderly", "old age", "pensioner", "grandfather", "grandmother"),
+    "pregnant_women": ("pregnant", "pregnancy", "expecting a baby", "delivery", "garbhvati", "antenatal"),
+    "women": ("woman", "women", "mother", "widow", "girl", "wife", "lactating"),
+    "children": ("child", "children", "kid", "baby", "infant", "newborn", "school"),
+    "farmer": ("farmer", "kisan", "agriculture", "agricultural"),
+    "informal_worker": ("daily wage", "labourer", "laborer", "construction worker", "street vendor",
+                        "domestic worker", "rickshaw", "unorganised", "unorganized"),
+    "formal_worker": ("employee", "salaried", "factory worker", "private job", "company job"),
+    "government_employee": ("government employee", "govt employee", "central government employee", "pensioner"),
+}
+
+# Ages a category implies when none is stated (a pregnant woman is not 70)
+CATEGORY_AGES = {"pregnant_women": (15, 50), "children": (0, 17), "senior_citizen": (60, 200)}
+
+# Relatives a question can be about ("my mother is 65"), and the categories
+# the relation alone implies
+SUBJECTS = {
+    "mother": (), "mom": (), "mummy": (), "maa": (), "father": (), "dad": (), "papa": (),
+    "parents": (), "husband": (), "wife": (), "son": (), "daughter": (), "brother": (), "sister": (),
+    "grandmother": ("senior_citizen",), "grandfather": ("senior_citizen",), "grandma": ("senior_citizen",),
+    "grandpa": ("senior_citizen",), "dadi": ("senior_citizen",), "nani": ("senior_citizen",),
+    "dada": ("senior_citizen",), "nana": ("senior_citizen",),
+    "child": ("children",), "kid": ("children",), "baby": ("children",),
+}
+_SUBJECT = re.compile(rf"\b(?:my|mere|meri|mera)\s+({'|'.join(SUBJECTS)})\b")
+
+# Questions about which schemes apply, rather than about one scheme
+DISCOVERY = re.compile(
+    r"\b(eligib\w*|which schemes?|what schemes?|any schemes?|schemes? (?:for|available)|qualify|"
+    r"entitled|can i (?:get|apply|avail)|am i covered|is there|are there)\b"
+)
+
+# Schemes neither local nor aimed at the asker's categories are dropped when
+# their keyword score is below this share of the best one
+MIN_RELATIVE_SCORE = 0.5
+
+# Words that name no particular scheme
+GENERIC = set(canonical_tokens(
+    "government govt central state national india indian health healthcare medical insurance cover coverage "
+    "benefit benefits free treatment hospital scheme schemes yojana yojna programme program abhiyan mission "
+    "karyakram card apply application register registration enrol enroll eligible eligibility documents "
+    "family families people person citizen resident poor old new latest current available best cheap "
+    "father mother parents son daughter husband wife year years old age income salary month lakh rupees rs "
+    "per annual monthly live living stay from get got help support money cost"
+))
+
+# Words that end many scheme names and are left out of questions ("PM
+# Matru Vandana"); neither needed for a name match nor scored as keywords
+SCHEME_WORDS = {"scheme", "yojana"}
+
+# Numbers that are durations, not an age ("5 months pregnant", "aged 6 weeks")
+_NOT_YEARS = r"(?!\s*-?\s*(?:months?|mos?\b|weeks?|wks?\b|days?)|\s*(?:pregnant|along)\b)"
+_AGE = re.compile(
+    rf"\b(\d{{1,3}})\s*-?\s*(?:years?|yrs?)\s*-?\s*old\b|\baged?\s*(?:is\s*|of\s*)?(\d{{1,3}})\b{_NOT_YEARS}|"
+    rf"\bi am (\d{{1,3}})\b(?!\s*(?:lakh|lac|k\b|thousand|rs|rupees|%)){_NOT_YEARS}"
+)
+_INFANT_AGE = re.compile(r"\b\d{1,2}\s*-?\s*(?:months?|weeks?|days?)\s*-?\s*old\b")
+_SUBJECT_AGE = re.compile(
+    rf"^\W*(?:is|who is|aged?)\s*(\d{{1,3}})\b{_NOT_YEARS}|\b(?:he|she) is (\d{{1,3}})\b{_NOT_YEARS}"
+)
+_AMOUNT = r"(?:rs\.?|₹|inr)?\s*([\d,]+(?:\.\d+)?)\s*(lakhs?|lacs?|k|thousand|crores?)?"
+_INCOME = re.compile(
+    rf"\b(?:income|earn\w*|salary|make)\b\D{{0,20}}?{_AMOUNT}(\s*(?:per|a|/|every)\s*month|\s*monthly)?|"
+    rf"{_AMOUNT}\s*(?:per|a|/)?\s*(month|year|annum)?\s*(?:family\s+)?income"
+)
+_UNITS = {"lakh": 1e5, "lakhs": 1e5, "lac": 1e5, "lacs": 1e5, "k": 1e3, "thousand": 1e3, "crore": 1e7, "crores": 1e7}
+_NAMED = re.compile(
+    r"\b(?:eligible for|apply for|about|what is|what's|register for|enrol+ in|benefits of|covered under)\s+"
+    r"(?:the\s+)?([a-z][a-z\s-]{2,40}?)(?=\s+(?:in|for|if|and|as)\b|[?.!,]|$)"
+)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s₹.,/%-]", " ", text.lower()).split())
+
+
+def _amount(number: str, unit: Optional[str]) -> float:
+    return float(number.replace(",", "")) * _UNITS.get(unit or "", 1.0)
+
+
+def parse_profile(text: str) -> Dict[str, Any]:
+    """
+    Eligibility details stated in a question: state, age, annual income (INR)
+    and beneficiary categories. Only what is found is returned. A question
+    about a relative ("my mother is 65") describes them, not the asker: the
+    relation is kept as subject, the age is theirs and the relation word
+    itself puts no one in a category.
+    """
+    normalized = _normalize(text)
+    words = f" {re.sub(r'[^a-z0-9]+', ' ', normalized)} "
+    profile: Dict[str, Any] = {}
+
+    subject = _SUBJECT.search(normalized)
+    if subject:
+        profile["subject"] = subject.group(1)
+        words = words.replace(f" {subject.group(0)} ", " ")
+
+    for name in sorted(STATES, key=len, reverse=True):
+        if f" {name} " in words:
+            profile["state"] = STATES[name]
+            break
+
+    match = _SUBJECT_AGE.search(normalized[subject.end():]) if subject else None
+    if match is None:
+        match = _AGE.search(normalized)
+        # "I am 30" is the asker's age, not the relative's
+        if match and subject and match.group(3):
+            match = None
+    if match:
+        age = int(next(group for group in match.groups() if group))
+        if 0 < age < 120:
+            profile["age"] = age
+
+    match = _INCOME.search(normalized)
+    if match:
+        groups = match.groups()
+        if groups[0]:
+            annual = _amount(groups[0], groups[1]) * (12 if groups[2] else 1)
+        else:
+            annual = _amount(groups[3], groups[4]) * (12 if groups[5] == "month" else 1)
+        if annual > 0:
+            profile["annual_income"] = int(annual)
+
+    categories = [
+        category for category, phrases in CATEGORY_PHRASES.items()
+        if any(f" {phrase} " in words for phrase in phrases)
+    ]
+    for category in SUBJECTS.get(profile.get("subject"), ()):
+        if category not in categories:
+            categories.append(category)
+    age = profile.get("age")
+    if _INFANT_AGE.search(normalized) and "children" not in categories:
+        categories.append("children")
+    if age is not None and age >= 60 and "senior_citizen" not in categories:
+        categories.append("senior_citizen")
+    if age is not None and age < 18 and "children" not in categories:
+        categories.append("children")
+    if categories:
+        profile["categories"] = categories
+    return profile
+
+
+class SchemeCatalogue:
+    """
+    Government schemes held as compact per-field arrays for eligibility
+    filtering (NumPy masks per state and category, age and income bounds)
+    and an inverted keyword index with IDF weights. Scheme names and aliases
+    are matched on canonical tokens, so "pm jay" and "PMJAY" find the same
+    scheme.
+
+    lookup() answers a question from the catalogue when it names a known
+    scheme, or asks which schemes apply and gives details to filter on. It
+    returns None for questions about schemes the catalogue does not know,
+    which are left to web search.
+    """
+
+    def __init__(self, schemes: List[GovernmentSchemeSchema]):
+        self.schemes = schemes
+        n = len(schemes)
+        self.min_age = np.array([s.min_age if s.min_age is not None else 0 for s in schemes], dtype=np.int16)
+        self.max_age = np.array([s.max_age if s.max_age is not None else 200 for s in schemes], dtype=np.int16)
+        self.max_income = np.array(
+            [s.max_annual_income if s.max_annual_income is not None else np.inf for s in schemes], dtype=np.float64
+        )
+        self.national = np.array([not s.states for s in schemes], dtype=bool)
+        self.state_masks: Dict[str, np.ndarray] = {}
+        self.category_masks: Dict[str, np.ndarray] = {}
+        for i, scheme in enumerate(schemes):
+            for state in scheme.states:
+                self.state_masks.setdefault(state, np.zeros(n, dtype=bool))[i] = True
+            for category in scheme.categories:
+                self.category_masks.setdefault(category, np.zeros(n, dtype=bool))[i] = True
+        self.open_to_all = self.category_masks.get("all", np.zeros(n, dtype=bool))
+
+        # Names and aliases as canonical token sets; keywords weighted by IDF
+        self.names = [
+            [set(tokens) - SCHEME_WORDS or set(tokens)
+             for tokens in map(canonical_tokens, [s.scheme_name] + s.aliases) if tokens]
+            for s in schemes
+        ]
+        postings: Dict[str, List[int]] = {}
+        for i, scheme in enumerate(schemes):
+            text = " ".join([scheme.scheme_name, *scheme.aliases, *scheme.keywords, scheme.target_beneficiaries,
+                             scheme.description])
+            for token in set(canonical_tokens(text)) - SCHEME_WORDS:
+                postings.setdefault(token, []).append(i)
+        self.postings = {token: np.array(ids, dtype=np.int32) for token, ids in postings.items()}
+        self.idf = {token: math.log(1 + n / len(ids)) for token, ids in postings.items()}
+        vocabulary = set(self.postings)
+        for phrases in CATEGORY_PHRASES.values():
+            vocabulary.update(canonical_tokens(" ".join(phrases)))
+        vocabulary.update(canonical_tokens(" ".join(STATES)))
+        self.vocabulary = vocabulary | GENERIC
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "SchemeCatalogue":
+        """Catalogue from a JSONL file of GovernmentSchemeSchema records (the bundled one by default)"""
+        schemes = []
+        with open(path or DEFAULT_CATALOGUE, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    schemes.append(GovernmentSchemeSchema.model_validate_json(line))
+        return cls(schemes)
+
+    def __len__(self) -> int:
+        return len(self.schemes)
+
+    def eligible(self, profile: Dict[str, Any]) -> np.ndarray:
+        """
+        Mask of the schemes whose criteria the profile meets. Unknown details
+        do not exclude, except that state schemes need a stated state and,
+        without a stated age, the categories bound it (CATEGORY_AGES).
+        """
+        mask = np.ones(len(self.schemes), dtype=bool)
+        state = profile.get("state")
+        mask &= self.national | self.state_masks.get(state, np.zeros_like(mask))
+        age = profile.get("age")
+        if age is not None:
+            mask &= (self.min_age <= age) & (age <= self.max_age)
+        else:
+            bounds = [CATEGORY_AGES[c] for c in profile.get("categories", ()) if c in CATEGORY_AGES]
+            if bounds:
+                low, high = max(b[0] for b in bounds), min(b[1] for b in bounds)
+                # Categories of different people ("pregnant, and for the baby") widen instead
+                if low > high:
+                    low, high = min(b[0] for b in bounds), max(b[1] for b in bounds)
+                mask &= (self.min_age <= high) & (low <= self.max_age)
+        income = profile.get("annual_income")
+        if income is not None:
+            mask &= income <= self.max_income
+        categories = profile.get("categories")
+        if categories:
+            in_category = self.open_to_all.copy()
+            for category in categories:
+                if category in self.category_masks:
+                    in_category |= self.category_masks[category]
+            mask &= in_category
+        return mask
+
+    def targeted(self, profile: Dict[str, Any]) -> np.ndarray:
+        """Mask of the schemes aimed at one of the profile's categories (not just open to all)"""
+        mask = np.zeros(len(self.schemes), dtype=bool)
+        for category in profile.get("categories", ()):
+            if category in self.category_masks:
+                mask |= self.category_masks[category]
+        return mask
+
+    def rank(self, profile: Dict[str, Any], tokens: List[str]) -> List[int]:
+        """
+        Eligible schemes, best first: state schemes for a resident, then those
+        aimed at the asker's categories, then by keyword score. Other schemes
+        are kept only when they are clear keyword matches.
+        """
+        mask = self.eligible(profile)
+        scores = self.keyword_scores(tokens)
+        local = ~self.national if profile.get("state") else np.zeros_like(mask)
+        targeted = self.targeted(profile)
+        order = np.lexsort((-scores, ~targeted, ~local))
+        ids = [int(i) for i in order if mask[i]]
+        best = max((scores[i] for i in ids), default=0.0)
+        return [
+            i for i in ids
+            if local[i] or targeted[i] or (best > 0 and scores[i] >= MIN_RELATIVE_SCORE * best)
+        ]
+
+    def keyword_scores(self, tokens: List[str]) -> np.ndarray:
+        scores = np.zeros(len(self.schemes))
+        for token in set(tokens):
+            ids = self.postings.get(token)
+            if ids is not None:
+                scores[ids] += self.idf[token]
+        return scores
+
+    def named(self, tokens: List[str]) -> List[int]:
+        """Schemes whose name or an alias appears in the question"""
+        present = set(tokens)
+        return [i for i, names in enumerate(self.names) if any(name <= present for name in names)]
+
+    def mentions_unknown_scheme(self, text: str) -> bool:
+        """The question asks about something by name that the catalogue has no words for"""
+        for match in _NAMED.finditer(_normalize(text)):
+            tokens = [token for token in canonical_tokens(match.group(1)) if not token.isdigit()]
+            if any(token not in self.vocabulary for token in tokens):
+                return True
+        return False
+
+    def lookup(self, text: str, limit: int = 5) -> Optional[Dict[str, Any]]:
+        """
+        Schemes answering the question, with the eligibility profile read from
+        it, or None when the question should go to web search. Named schemes
+        are returned whatever the profile (the answer can then explain why one
+        does not apply); otherwise eligible schemes are ranked by keyword score.
+        """
+        tokens = canonical_tokens(text)
+        profile = parse_profile(text)
+        named = self.named(tokens)
+        if named:
+            # With stated details, related schemes that do apply come along
+            # (e.g. the 70+ cover next to PM-JAY for a 75-year-old)
+            scores = self.keyword_scores(tokens)
+            relevant = scores > 0
+            if profile.get("categories"):
+                relevant &= self.targeted(profile)
+            related = [i for i in self.rank(profile, tokens) if i not in named and relevant[i]] if profile else []
+            ids = (named + related)[:limit]
+        elif self.mentions_unknown_scheme(text) or not (profile or DISCOVERY.search(_normalize(text))):
+            metrics.increment("schemes.catalogue.miss")
+            return None
+        else:
+            ids = self.rank(profile, tokens)[:limit]
+            if not ids:
+                metrics.increment("schemes.catalogue.miss")
+                return None
+        metrics.increment("schemes.catalogue.hit")
+        eligible = self.eligible(profile)
+        return {
+            "profile": profile,
+            "named": bool(named),
+            "schemes": [self.schemes[i] for i in ids],
+            "eligible": [bool(eligible[i]) for i in ids],
+        }
+
+    @staticmethod
+    def as_results(match: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """A lookup() result in the search-result format the generation prompts take"""
+        results = []
+        if match["profile"]:
+            details = ", ".join(f"{key}={value}" for key, value in match["profile"].items())
+            results.append({"note": f"Details read from the question: {details}. Schemes come from a local "
+                                    "catalogue; amounts and rules change, so point to the official link."})
+        for scheme, eligible in zip(match["schemes"], match["eligible"]):
+            results.append({
+                "title": scheme.scheme_name,
+                "url": scheme.official_link,
+                "content": f"{scheme.description} Who: {scheme.target_beneficiaries}. "
+                           f"Eligibility: {scheme.eligibility}",
+                "matches_stated_details": eligible,
+            })
+        return results
@@ -0,0 +1,138 @@
+"""
+Conversation session state for multi-turn chats
+"""
+
+import uuid
+from typing import Dict, Any, List, Optional
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)"""
+    if not text:
+        return 0
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Trim text from the front so it fits within a token budget"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    max_chars = max(max_tokens * 4 - 4, 0)
+    return "..." + text[-max_chars:] if max_chars else ""
+
+
+def brief_answer(result: Dict[str, Any], max_chars: int = 200) -> str:
+    """Short one-line description of a workflow result for the history"""
+    if result.get("status") == "blocked":
+        return f"(blocked: {result.get('category')})"
+    output = result.get("output")
+    if isinstance(output, dict):
+        text = output.get("message", "")
+        if output.get("symptoms"):
+            text += f" Symptoms: {', '.join(output['symptoms'])}"
+    else:
+        text = str(output or "")
+    text = " ".join(text.split())
+    if len(text) > max_chars:
+        text = text[:max_chars].rstrip() + "..."
+    return text
+
+
+class ConversationSession:
+    """
+    Per-conversation state, kept separate from the current turn.
+
+    Only a few recent turns are kept verbatim. Older turns are folded into a
+    rolling summary so that the rendered context never exceeds the token budget.
+    """
+
+    def __init__(
+        self,
+        session_id: Optional[str] = None,
+        summarizer=None,
+        token_budget: int = 400,
+        max_recent_turns: int = 3
+    ):
+        self.session_id = session_id or uuid.uuid4().hex
+        self.summarizer = summarizer
+        self.token_budget = token_budget
+        self.max_recent_turns = max_recent_turns
+        self.summary = ""
+        self.turns: List[Dict[str, Any]] = []
+        # RetrievalContext of the current topic (see followup.py); kept in
+        # memory only, a reloaded session searches afresh
+        self.retrieval = None
+
+    def add_turn(self, query: str, result: Dict[str, Any]):
+        """Record a completed turn and compact the history if needed"""
+        self.turns.append({
+            "query": query,
+            "intent": result.get("intent"),
+            "answer": brief_answer(result)
+        })
+        self._compact()
+
+    def to_state(self) -> Dict[str, Any]:
+        """Serializable snapshot of the session (used by the session stores)"""
+        return {
+            "session_id": self.session_id,
+            "summary": self.summary,
+            "turns": list(self.turns)
+        }
+
+    def load_state(self, state: Dict[str, Any]):
+        """Restore a snapshot produced by to_state()"""
+        self.summary = state.get("summary", "")
+        self.turns = list(state.get("turns", []))
+
+    def clear(self):
+        """Forget the whole conversation"""
+        self.summary = ""
+        self.turns = []
+        self.retrieval = None
+
+    def context(self) -> str:
+        """Render the bounded history for chains that need it ("" when empty)"""
+        if not self.summary and not self.turns:
+            return ""
+
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of earlier conversation: {self.summary}")
+        if self.turns:
+            parts.append("Recent turns:\n" + self._render_turns(self.turns))
+        return truncate_to_tokens("\n".join(parts), self.token_budget)
+
+    def _render_turns(self, turns: List[Dict[str, Any]]) -> str:
+        lines = []
+        for turn in turns:
+            line = f"- User: {turn['query']}"
+            if turn.get("intent"):
+                line += f" [{turn['intent']}]"
+            if turn.get("answer"):
+                line += f"\n  Assistant: {turn['answer']}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def _compact(self):
+        """Fold the oldest turns into the summary until the budget is met"""
+        while self.turns and (
+            len(self.turns) > self.max_recent_turns
+            or estimate_tokens(self.summary + self._render_turns(self.turns)) > self.token_budget
+        ):
+            oldest = self.turns.pop(0)
+            self.summary = self._fold(self._render_turns([oldest]))
+
+    def _fold(self, turn_text: str) -> str:
+        """Merge one turn into the rolling summary"""
+        # Half the budget goes to the summary, the rest to recent turns
+        summary_budget = max(self.token_budget // 2, 1)
+        if self.summarizer is not None:
+            try:
+                summary = self.summarizer.summarize(self.summary, turn_text, summary_budget)
+                return truncate_to_tokens(summary.strip(), summary_budget)
+            except Exception as e:
+                print(f"      ⚠️  Summarization failed ({e}), truncating instead")
+
+        merged = f"{self.summary} {turn_text}".strip() if self.summary else turn_text
+        return truncate_to_tokens(" ".join(merged.split()), summary_budget)
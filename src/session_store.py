@@ -0,0 +1,325 @@
+"""
+Session stores: bounded in-memory LRU tier backed by SQLite
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import Dict, Any, List, Optional, Callable
+
+from .session import ConversationSession
+
+
+# Per-section character cap for stored results; the full text is never needed
+# to render the history and it dominates the size of a result dict
+MAX_SECTION_CHARS = 1000
+
+# Payloads below this size are stored as plain JSON
+COMPRESS_THRESHOLD = 256
+
+
+def compact_result(result: Dict[str, Any], max_chars: int = MAX_SECTION_CHARS) -> Dict[str, Any]:
+    """Drop empty fields and cap long generated texts in a workflow result"""
+    compact = {}
+    for key, value in result.items():
+        if value is None or value == "" or value == {} or value == []:
+            continue
+        if isinstance(value, str) and len(value) > max_chars:
+            value = value[:max_chars] + "..."
+        elif isinstance(value, dict):
+            value = compact_result(value, max_chars)
+        compact[key] = value
+    return compact
+
+
+def encode_result(result: Dict[str, Any]) -> bytes:
+    """Serialize a result compactly (JSON without whitespace, zlib above a threshold)"""
+    raw = json.dumps(compact_result(result), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if len(raw) < COMPRESS_THRESHOLD:
+        return b"j" + raw
+    return b"z" + zlib.compress(raw, 6)
+
+
+def decode_result(blob: bytes) -> Dict[str, Any]:
+    """Inverse of encode_result()"""
+    blob = bytes(blob)
+    if blob[:1] == b"z":
+        return json.loads(zlib.decompress(blob[1:]).decode("utf-8"))
+    return json.loads(blob[1:].decode("utf-8"))
+
+
+class SessionStore(ABC):
+    """
+    Interface for session stores.
+
+    A store hands out ConversationSession objects by ID and keeps a log of
+    compact turns per session for history views.
+    """
+
+    @abstractmethod
+    def get(self, session_id: str) -> ConversationSession:
+        """Return the session for an ID, creating it if needed"""
+
+    @abstractmethod
+    def record_turn(self, session: ConversationSession, query: str, result: Dict[str, Any]):
+        """Persist a completed turn (the session must already contain it)"""
+
+    @abstractmethod
+    def recent_turns(self, session_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Most recent turns, oldest first, as {"query", "result", "created_at"} dicts"""
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """Forget a session and its turns"""
+
+    def close(self):
+        """Release resources"""
+        pass
+
+
+class SQLiteSessionStore(SessionStore):
+    """Durable session store in a single SQLite file"""
+
+    def __init__(self, path: str, session_factory: Callable[[str], ConversationSession]):
+        self.path = path
+        self.session_factory = session_factory
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS turns ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, "
+                "query TEXT NOT NULL, result BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS turns_by_session ON turns (session_id, id)"
+            )
+
+    def load_state(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_state(self, session: ConversationSession):
+        state = json.dumps(session.to_state(), separators=(",", ":"), ensure_ascii=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, state, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET state = excluded.state, "
+                "updated_at = excluded.updated_at",
+                (session.session_id, state, time.time())
+            )
+
+    def append_turn(self, session_id: str, query: str, result: Dict[str, Any]) -> float:
+        created_at = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO turns (session_id, query, result, created_at) VALUES (?, ?, ?, ?)",
+                (session_id, query, encode_result(result), created_at)
+            )
+        return created_at
+
+    def get(self, session_id: str) -> ConversationSession:
+        session = self.session_factory(session_id)
+        state = self.load_state(session_id)
+        if state:
+            session.load_state(state)
+        return session
+
+    def record_turn(self, session: ConversationSession, query: str, result: Dict[str, Any]):
+        self.append_turn(session.session_id, query, result)
+        self.save_state(session)
+
+    def recent_turns(self, session_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT query, result, created_at FROM turns WHERE session_id = ? "
+                "ORDER BY id DESC LIMIT ?",
+                (session_id, limit)
+            ).fetchall()
+        return [
+            {"query": query, "result": decode_result(blob), "created_at": created_at}
+            for query, blob, created_at in reversed(rows)
+        ]
+
+    def count_turns(self, session_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM turns WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row[0]
+
+    def delete(self, session_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+
+    def purge_idle(self, max_age_seconds: float) -> int:
+        """Delete sessions not updated within max_age_seconds; returns how many"""
+        cutoff = time.time() - max_age_seconds
+        with self._lock, self._conn:
+            ids = [row[0] for row in self._conn.execute(
+                "SELECT session_id FROM sessions WHERE updated_at < ?", (cutoff,)
+            )]
+            self._conn.executemany("DELETE FROM turns WHERE session_id = ?", [(i,) for i in ids])
+            self._conn.executemany("DELETE FROM sessions WHERE session_id = ?", [(i,) for i in ids])
+        return len(ids)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class _SessionEntry:
+    __slots__ = ("session", "turns", "last_access")
+
+    def __init__(self, session: ConversationSession, max_turns: int):
+        self.session = session
+        self.turns = deque(maxlen=max_turns)
+        self.last_access = time.monotonic()
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    LRU session tier with a fixed memory ceiling.
+
+    At most max_sessions sessions and max_turns_per_session compact turns per
+    session are held in memory. Sessions idle for longer than idle_timeout are
+    evicted. With a backing SQLiteSessionStore every write also goes to disk,
+    so evicted sessions are transparently reloaded on their next request.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[str], ConversationSession],
+        max_sessions: int = 1000,
+        max_turns_per_session: int = 20,
+        idle_timeout: float = 1800.0,
+        backing: Optional[SQLiteSessionStore] = None
+    ):
+        self.session_factory = session_factory
+        self.max_sessions = max_sessions
+        self.max_turns_per_session = max_turns_per_session
+        self.idle_timeout = idle_timeout
+        self.backing = backing
+        self._entries: "OrderedDict[str, _SessionEntry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._last_sweep = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, session_id: str) -> ConversationSession:
+        return self._entry(session_id).session
+
+    def record_turn(self, session: ConversationSession, query: str, result: Dict[str, Any]):
+        created_at = time.time()
+        if self.backing is not None:
+            created_at = self.backing.append_turn(session.session_id, query, result)
+            self.backing.save_state(session)
+
+        # Keep the decoded compact form so memory use does not depend on answer length
+        turn = {"query": query, "result": compact_result(result), "created_at": created_at}
+        with self._lock:
+            entry = self._entries.get(session.session_id)
+            if entry is None:
+                entry = self._insert(session.session_id, session)
+            entry.turns.append(turn)
+            entry.last_access = time.monotonic()
+
+    def recent_turns(self, session_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                entry.last_access = time.monotonic()
+                self._entries.move_to_end(session_id)
+                turns = list(entry.turns)
+                complete = self.backing is None or len(turns) < entry.turns.maxlen
+                if len(turns) >= limit or complete:
+                    return turns[-limit:] if limit else []
+        if self.backing is not None:
+            return self.backing.recent_turns(session_id, limit)
+        return []
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._entries.pop(session_id, None)
+        if self.backing is not None:
+            self.backing.delete(session_id)
+
+    def evict_idle(self) -> int:
+        """Drop sessions idle for longer than idle_timeout; returns how many"""
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            idle = [sid for sid, entry in self._entries.items() if entry.last_access < cutoff]
+            for sid in idle:
+                del self._entries[sid]
+            self._last_sweep = time.monotonic()
+        return len(idle)
+
+    def close(self):
+        with self._lock:
+            self._entries.clear()
+        if self.backing is not None:
+            self.backing.close()
+
+    def _entry(self, session_id: str) -> _SessionEntry:
+        with self._lock:
+            if time.monotonic() - self._last_sweep > min(self.idle_timeout, 60.0):
+                self.evict_idle()
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                entry.last_access = time.monotonic()
+                self._entries.move_to_end(session_id)
+                return entry
+
+        # Load outside the lock so a slow disk read does not block other sessions
+        if self.backing is not None:
+            session = self.backing.get(session_id)
+            turns = self.backing.recent_turns(session_id, self.max_turns_per_session)
+        else:
+            session = self.session_factory(session_id)
+            turns = []
+
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                entry = self._insert(session_id, session)
+                entry.turns.extend(turns)
+            return entry
+
+    def _insert(self, session_id: str, session: ConversationSession) -> _SessionEntry:
+        entry = _SessionEntry(session, self.max_turns_per_session)
+        self._entries[session_id] = entry
+        while len(self._entries) > self.max_sessions:
+            # Backed stores are written through, so the LRU session is already on disk
+            self._entries.popitem(last=False)
+        return entry
+
+
+def create_session_store(
+    session_factory: Callable[[str], ConversationSession],
+    db_path: Optional[str] = None,
+    max_sessions: int = 1000,
+    idle_timeout: float = 1800.0
+) -> SessionStore:
+    """Build the default tiered store (memory only when no db_path is given)"""
+    backing = SQLiteSessionStore(db_path, session_factory) if db_path else None
+    return InMemorySessionStore(
+        session_factory,
+        max_sessions=max_sessions,
+        idle_timeout=idle_timeout,
+        backing=backing
+    )
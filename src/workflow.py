@@ -2,17 +2,39 @@
 Main healthcare workflow
 """
 
-from typing import Dict, Any
+import asyncio
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Dict, Any, Optional, Tuple
 from .config import HealthcareConfig
+from .session import ConversationSession
+from .session_store import create_session_store
+from .canonicalize import QueryCanonicalizer
+from .cache import ResponseCache, TTLCache, InMemoryCacheBackend, SQLiteCacheBackend
+from .rerank import EmbeddingCache, SearchReranker
+from .cassette import Cassette
+from .knowledge_index import ShardedKnowledgeIndex
+from .schemes import SchemeCatalogue
+from .guardrail_model import GuardrailDecisionLog, LocalGuardrail
+from .metrics import metrics
+from .profiling import SamplingProfiler
+from .deadline import RequestDeadline, current_deadline, use_deadline
+from .events import ResultEvents, emit, emit_step, section_context, use_events
+from .followup import RetrievalContext, current_retrieval, stop_reuse, use_retrieval
 from .chains import (
     GuardrailChain,
     IntentClassifierChain,
+    SafetyIntentChain,
     SymptomCheckerChain,
+    ConversationSummaryChain,
     GovernmentSchemeChain,
     MentalWellnessChain,
     YogaChain,
     AyushChain,
-    HospitalLocatorChain
+    HospitalLocatorChain,
+    SymptomRecommendationChain
 )
 
 
@@ -22,22 +44,411 @@ class HealthcareWorkflow:
     def __init__(self, config: HealthcareConfig):
         self.config = config
         
-        # Initialize all chains
-        self.guardrail = GuardrailChain(config.llm)
-        self.classifier = IntentClassifierChain(config.llm)
-        self.symptom_chain = SymptomCheckerChain(config.llm)
-        self.gov_scheme_chain = GovernmentSchemeChain(config.llm, config.search_tool)
-        self.mental_wellness_chain = MentalWellnessChain(config.llm, config.search_tool)
-        self.yoga_chain = YogaChain(config.llm, config.search_tool)
-        self.ayush_chain = AyushChain(config.llm, config.search_tool)
-        self.hospital_chain = HospitalLocatorChain(config.llm, config.search_tool)
+        # Initialize all chains. They share the process-wide provider rate
+        # limiters and each runs on the model tier configured for it
+        limits = config.rate_limits
+        self.guardrail = GuardrailChain(
+            config.llm_for("guardrail"), limits, strict=config.strict_outputs, **self._cascade("guardrail")
+        )
+        self.classifier = IntentClassifierChain(
+            config.llm_for("classifier"), limits, strict=config.strict_outputs, **self._cascade("classifier")
+        )
+        self.safety_intent_chain = SafetyIntentChain(config.llm_for("routing"), limits, **self._cascade("routing"))
+        self.symptom_chain = SymptomCheckerChain(config.llm_for("symptom"), limits, **self._cascade("symptom"))
+        self.gov_scheme_chain = GovernmentSchemeChain(config.llm_for("gov_scheme"), config.search_tool, limits)
+        self.mental_wellness_chain = MentalWellnessChain(config.llm_for("mental_wellness"), config.search_tool, limits)
+        self.yoga_chain = YogaChain(config.llm_for("yoga"), config.search_tool, limits)
+        self.ayush_chain = AyushChain(config.llm_for("ayush"), config.search_tool, limits)
+        self.hospital_chain = HospitalLocatorChain(config.llm_for("hospital"), config.search_tool, limits)
+        self.symptom_recommendation_chain = SymptomRecommendationChain(
+            config.llm_for("symptom_recommendation"), config.search_tool, limits
+        )
+        self.summary_chain = ConversationSummaryChain(config.llm_for("summary"), limits)
+        
+        # Caches: routing decisions, search results and whole responses for
+        # user-independent intents. A cache_db_path makes them persistent and
+        # shareable, e.g. pre-warmed before a deployment takes traffic.
+        cache_backend = (
+            SQLiteCacheBackend(config.cache_db_path) if config.cache_db_path
+            else InMemoryCacheBackend(config.response_cache_size)
+        )
+        # Paraphrases map to one canonical key in front of every cache lookup
+        self.canonicalizer = None
+        if config.canonicalize_queries:
+            self.canonicalizer = QueryCanonicalizer(
+                threshold=config.canonical_similarity,
+                path=config.canonical_index_path
+            )
+        self.response_cache = None
+        if config.cache_responses:
+            self.response_cache = ResponseCache(
+                cache_backend, ttls=config.response_cache_ttls, canonicalizer=self.canonicalizer
+            )
+        # Safety and routing verdicts are keyed by the exact (normalized)
+        # wording: a near-duplicate can differ in what makes it unsafe
+        self.routing_cache = None
+        if config.cache_routing:
+            self.routing_cache = TTLCache(cache_backend, "routing", config.routing_cache_ttl)
+        if config.cache_search:
+            search_cache = TTLCache(
+                cache_backend, "search", config.search_cache_ttl, canonicalizer=self.canonicalizer
+            )
+            for chain in self._search_chains():
+                chain.search_cache = search_cache
+        reranker = None
+        if config.rerank_top_k:
+            # Embeddings go to the shared cache file, but never into the
+            # bounded in-memory response cache where they would evict answers
+            embedding_cache = EmbeddingCache(
+                config.reranker_embeddings(),
+                cache_backend if config.cache_db_path else None
+            )
+            reranker = SearchReranker(embedding_cache, config.rerank_top_k, config.rerank_diversity)
+        for chain in self._search_chains():
+            chain.search_variants = config.search_variants
+            chain.reranker = reranker
+        
+        # Domain-sharded local knowledge index; shards are mapped on first use
+        self.knowledge_index = None
+        if config.knowledge_index_path:
+            self.knowledge_index = ShardedKnowledgeIndex(
+                config.knowledge_index_path,
+                EmbeddingCache(config.knowledge_index_embeddings()),
+                max_resident_bytes=config.knowledge_max_resident_bytes,
+                min_available_bytes=config.knowledge_min_available_bytes,
+                rerank_candidates=config.knowledge_rerank_candidates,
+                compact_after=config.knowledge_compact_after,
+                reload_interval=config.knowledge_reload_interval
+            )
+            for chain in self._search_chains():
+                chain.knowledge_index = self.knowledge_index
+                chain.knowledge_top_k = config.knowledge_top_k
+        
+        # Known schemes and eligibility questions are answered from the local
+        # catalogue; other scheme questions still search the web
+        if config.scheme_catalogue:
+            self.gov_scheme_chain.catalogue = SchemeCatalogue.load(config.scheme_catalogue_path)
+        
+        # Record provider calls, or replay them offline as a benchmark
+        self.cassette = None
+        if config.cassette_path:
+            self.cassette = Cassette(config.cassette_path, config.cassette_mode, config.replay_latency)
+            for chain in self._chains():
+                chain.cassette = self.cassette
+        
+        # Local guardrail distilled from logged LLM guardrail decisions
+        # (see guardrail_model.py); it defers ambiguous inputs to the LLM
+        self.guardrail_log = GuardrailDecisionLog(config.guardrail_log_path) if config.guardrail_log_path else None
+        self.local_guardrail = None
+        if config.guardrail_model_path and os.path.exists(config.guardrail_model_path):
+            self.local_guardrail = LocalGuardrail.load(config.guardrail_model_path, config.guardrail_threshold)
+        self._audit_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="guardrail-audit")
+        
+        # Sampling profiler for a share of the requests (see profiling.py)
+        self.profiler = None
+        if config.profile_rate > 0:
+            self.profiler = SamplingProfiler(config.profile_dir, config.profile_interval)
+        
+        # Sessions addressed by ID (bounded memory, optional SQLite persistence)
+        self.sessions = create_session_store(
+            self.new_session,
+            db_path=config.session_db_path,
+            max_sessions=config.max_sessions,
+            idle_timeout=config.session_idle_timeout
+        )
+    
+    def _chains(self):
+        return [
+            self.guardrail,
+            self.classifier,
+            self.safety_intent_chain,
+            self.symptom_chain,
+            self.summary_chain,
+        ] + self._search_chains()
+    
+    def _search_chains(self):
+        return [
+            self.gov_scheme_chain,
+            self.mental_wellness_chain,
+            self.yoga_chain,
+            self.ayush_chain,
+            self.hospital_chain,
+            self.symptom_recommendation_chain,
+        ]
+    
+    def invalidate_cache(self, intent: Optional[str] = None) -> int:
+        """Drop cached responses for an intent (or all of them); returns how many"""
+        if self.response_cache is None:
+            return 0
+        return self.response_cache.invalidate(intent)
+    
+    def _cascade(self, chain: str) -> Dict[str, Any]:
+        """Cascade settings for a chain's constructor"""
+        return {
+            "escalation_llm": self.config.escalation_llm_for(chain),
+            "min_confidence": self.config.cascade_min_confidence
+        }
+    
+    def new_session(self, session_id: Optional[str] = None) -> ConversationSession:
+        """Create a conversation session whose history is summarized by this workflow"""
+        return ConversationSession(
+            session_id=session_id,
+            summarizer=self.summary_chain,
+            token_budget=self.config.history_token_budget
+        )
+    
+    def run(
+        self,
+        user_input: str,
+        session: Optional[ConversationSession] = None,
+        session_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+        on_event: Optional[Callable[[str, Any], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Execute the workflow.
+        
+        Guardrail, classification and search queries only ever see the current
+        turn. The session's bounded history is passed to the generation chains.
+        Passing session_id instead of a session object loads the session from,
+        and records the turn in, the workflow's session store.
+        
+        The request must finish within timeout seconds (config.request_timeout
+        by default), split across the steps. Parts that timed out or failed
+        and were skipped or answered without search are listed in
+        result["degraded"] as {part: reason}; the key is absent otherwise.
+        
+        on_event(section, value) is called with each result section as soon
+        as it is ready (e.g. the emergency message before the hospital search
+        finishes), and last with ("complete", result). Answers are then
+        streamed: "step" and "token" progress events (see events.py) report
+        each agent's timing and generated text. It is called from worker
+        threads.
+        
+        With config.profile_rate, that share of the requests is profiled
+        (see profiling.py) and added to the profiles of its intent.
+        """
+        profile = None
+        if self.profiler is not None and random.random() < self.config.profile_rate:
+            profile = self.profiler.start()
+        result = None
+        try:
+            if session is None and session_id is not None:
+                session = self.sessions.get(session_id)
+            
+            deadline = RequestDeadline(
+                timeout if timeout is not None else self.config.request_timeout,
+                self.config.step_timeouts,
+                worker_wrapper=self.profiler.worker_wrapper(profile) if profile is not None else None
+            )
+            events = ResultEvents(on_event) if on_event is not None else None
+            with use_deadline(deadline), use_events(events):
+                history = session.context() if session else ""
+                result = self._run(user_input, history, session)
+                if deadline.degraded:
+                    result["degraded"] = dict(deadline.degraded)
+                # Deliver before the session bookkeeping, which may summarize
+                if events is not None:
+                    events.finish(result)
+                if session is not None:
+                    session.add_turn(user_input, result)
+                    if session_id is not None:
+                        self.sessions.record_turn(session, user_input, result)
+            return result
+        finally:
+            if profile is not None:
+                # Blocked requests have a status instead of an intent
+                self.profiler.finish(profile, (result.get("intent") or result.get("status")) if result else "failed")
+    
+    def route(self, user_input: str, timeout: Optional[float] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Safety check and intent classification only, without running any
+        agent or touching the caches: (guardrail result, classification).
+        Used to evaluate routing configurations.
+        """
+        deadline = RequestDeadline(
+            timeout if timeout is not None else self.config.request_timeout,
+            self.config.step_timeouts
+        )
+        with use_deadline(deadline):
+            return self._route_uncached(user_input)
+    
+    async def astream(
+        self,
+        user_input: str,
+        session: Optional[ConversationSession] = None,
+        session_id: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Async iterator over (section, value) events of run(), ending with
+        ("complete", result). The workflow runs in a worker thread; its
+        exceptions are raised from the iterator.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        def on_event(section: str, value: Any):
+            loop.call_soon_threadsafe(queue.put_nowait, (section, value))
+        
+        task = asyncio.ensure_future(
+            asyncio.to_thread(self.run, user_input, session, session_id, timeout, on_event)
+        )
+        # Queued after every event, which the worker thread scheduled first
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        while True:
+            event = await queue.get()
+            if event is None:
+                break
+            yield event
+        await task
+    
+    def warm(self, user_input: str, timeout: Optional[float] = None) -> str:
+        """
+        Fill the caches for one query without recording a conversation turn.
+        
+        Routing is always computed (and cached when routing caching is on);
+        search and generation only run for intents the response cache keeps.
+        Returns what happened: "blocked", "not_cacheable", "cached", "degraded"
+        or "warmed".
+        """
+        deadline = RequestDeadline(
+            timeout if timeout is not None else self.config.request_timeout,
+            self.config.step_timeouts
+        )
+        with use_deadline(deadline):
+            safety_check, classification = self._route(user_input)
+            if not safety_check.get("is_safe", True):
+                return "blocked"
+            intent = classification.get("classification")
+            if self.response_cache is None or not self.response_cache.is_cacheable(intent, user_input):
+                return "not_cacheable"
+            cached, state = self.response_cache.lookup(user_input, intent)
+            if state == "fresh":
+                return "cached"
+            result = self._dispatch(user_input, classification, "")
+            if deadline.degraded:
+                # Degraded answers are never cached
+                return "degraded"
+            return "warmed" if self.response_cache.store(user_input, intent, result) else "not_cacheable"
+    
+    def _run_optional(self, result: Dict[str, Any], section: str, fn, *args):
+        """Run an optional agent; on failure its section is omitted and flagged as degraded"""
+        try:
+            self._run_section(result, section, fn, *args)
+        except Exception as e:
+            current_deadline().mark_degraded(section, f"{type(e).__name__}: {e}")
+    
+    @staticmethod
+    def _timed_step(section: str, fn, *args):
+        """Run the agent producing section, reporting its status and duration as step events"""
+        emit_step(section, "started")
+        start = time.perf_counter()
+        try:
+            with section_context(section):
+                value = fn(*args)
+        except Exception:
+            emit_step(section, "failed", time.perf_counter() - start)
+            raise
+        emit_step(section, "done", time.perf_counter() - start)
+        return value
+    
+    def _run_section(self, result: Dict[str, Any], section: str, fn, *args):
+        """Run the agent producing section and store its result"""
+        self._set_section(result, section, self._timed_step(section, fn, *args))
+    
+    @staticmethod
+    def _set_section(result: Dict[str, Any], section: str, value: Any):
+        """Store a finished result section and deliver it to the request's event callback"""
+        result[section] = value
+        emit(section, value)
     
-    def run(self, user_input: str) -> Dict[str, Any]:
-        """Execute the workflow"""
+    def _route(self, user_input: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Safety check and intent classification: (guardrail result, classification)"""
+        if self.routing_cache is not None:
+            cached = self.routing_cache.get(user_input)
+            if cached is not None:
+                print("🛡️  [STEP 1-2/3] Safety check + intent classification served from cache")
+                return cached["safety_check"], cached["classification"]
+        
+        safety_check, classification = self._route_uncached(user_input)
+        
+        # A guardrail that failed held the input back; don't remember that
+        if self.routing_cache is not None and "guardrail" not in current_deadline().degraded:
+            self.routing_cache.put(user_input, {
+                "safety_check": safety_check,
+                "classification": classification
+            })
+        return safety_check, classification
+    
+    def _local_safety_check(self, user_input: str) -> Optional[Dict[str, Any]]:
+        """Decision of the local guardrail, or None when there is none or it defers"""
+        if self.local_guardrail is None:
+            return None
+        start = time.perf_counter()
+        decision = self.local_guardrail.decide(user_input)
+        metrics.observe("guardrail.local.latency", time.perf_counter() - start)
+        if decision is None:
+            metrics.increment("guardrail.local.deferred")
+            return None
+        metrics.increment("guardrail.local.safe" if decision["is_safe"] else "guardrail.local.blocked")
+        # A sample of local decisions is checked by the LLM too, so the drift
+        # report sees more than the inputs the model deferred
+        if self.guardrail_log is not None and random.random() < self.config.guardrail_audit_rate:
+            self._audit_executor.submit(self._audit_guardrail, user_input)
+        return decision
+    
+    def _audit_guardrail(self, user_input: str):
+        try:
+            self.guardrail_log.record(user_input, self.guardrail.check(user_input), source="audit")
+        except Exception as e:
+            print(f"   ⚠️  Guardrail audit failed: {e}")
+    
+    def _log_safety_check(self, user_input: str, safety_check: Dict[str, Any]):
+        """Keep an LLM guardrail decision as training data (failed checks are not decisions)"""
+        if self.guardrail_log is not None and "guardrail" not in current_deadline().degraded:
+            self.guardrail_log.record(user_input, safety_check)
+    
+    def _route_uncached(self, user_input: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        local_check = self._local_safety_check(user_input)
+        if local_check is not None and not local_check["is_safe"]:
+            return local_check, {}
+        
+        if self.config.fused_routing:
+            print("🛡️  [STEP 1-2/3] Running Fused Safety Check + Intent Classification...")
+            try:
+                fused = self.safety_intent_chain.run(user_input)
+                safety_check = {key: fused[key] for key in ("is_safe", "reason", "category")}
+                classification = {key: fused[key] for key in ("classification", "reasoning")}
+                self._log_safety_check(user_input, safety_check)
+                if safety_check["is_safe"]:
+                    print("   ✓ Content is safe\n")
+                return safety_check, classification
+            except Exception as e:
+                print(f"   ⚠️  Fused call failed ({type(e).__name__}), falling back to separate calls")
         
         # Step 1: Safety check
-        print("🛡️  [STEP 1/3] Running Safety Guardrail Check...")
-        safety_check = self.guardrail.check(user_input)
+        if local_check is not None:
+            print("🛡️  [STEP 1/3] Safety check answered by the local guardrail")
+            safety_check = local_check
+        else:
+            print("🛡️  [STEP 1/3] Running Safety Guardrail Check...")
+            safety_check = self.guardrail.check(user_input)
+            self._log_safety_check(user_input, safety_check)
+        if not safety_check.get("is_safe", True):
+            return safety_check, {}
+        print("   ✓ Content is safe\n")
+        
+        # Step 2: Classify intent
+        print("🎯 [STEP 2/3] Classifying Intent...")
+        classification = self.classifier.run(user_input)
+        return safety_check, classification
+    
+    def _run(self, user_input: str, history: str, session: Optional[ConversationSession] = None) -> Dict[str, Any]:
+        """Execute one turn of the workflow"""
+        
+        # Steps 1-2: Safety check and intent classification
+        safety_check, classification = self._timed_step("routing", self._route, user_input)
         if not safety_check.get("is_safe", True):
             print(f"   ⚠️  Content blocked: {safety_check.get('reason')}")
             return {
@@ -45,16 +456,71 @@ class HealthcareWorkflow:
                 "reason": safety_check.get("reason"),
                 "category": safety_check.get("category")
             }
-        print("   ✓ Content is safe\n")
-        
-        # Step 2: Classify intent
-        print("🎯 [STEP 2/3] Classifying Intent...")
-        classification = self.classifier.run(user_input)
         intent = classification.get("classification")
         print(f"   → Intent: {intent}")
         print(f"   → Reasoning: {classification.get('reasoning')}\n")
+        emit("intent", intent)
+        emit("reasoning", classification.get("reasoning"))
         
-        # Step 3: Route to appropriate chain
+        # Serve repeated user-independent questions from the response cache;
+        # answers shaped by conversation history are not user-independent
+        if self.response_cache is not None and not history:
+            cached, state = self.response_cache.lookup(user_input, intent)
+            if cached is not None:
+                print(f"⚡ Served from response cache ({state})\n")
+                if state == "stale":
+                    self.response_cache.refresh_in_background(
+                        user_input, intent, lambda: self._refresh(user_input, classification)
+                    )
+                cached["cache"] = state
+                return cached
+        
+        if session is not None and self.config.followup_reuse:
+            with use_retrieval(*self._retrieval_context(session, user_input, intent)):
+                result = self._dispatch(user_input, classification, history)
+        else:
+            result = self._dispatch(user_input, classification, history)
+        
+        if self.response_cache is not None and not history and not current_deadline().degraded:
+            self.response_cache.store(user_input, intent, result)
+        return result
+    
+    def _retrieval_context(
+        self,
+        session: ConversationSession,
+        user_input: str,
+        intent: Optional[str]
+    ) -> Tuple[RetrievalContext, bool]:
+        """
+        The session's retrieval context for this turn and whether to reuse
+        it: a follow-up on the previous turn's topic reuses its search
+        results, anything else starts a new context.
+        """
+        previous = session.retrieval
+        if previous is not None and previous.continues(
+            intent, user_input, self.config.followup_continuity, self.config.followup_ttl
+        ):
+            previous.followups += 1
+            metrics.increment("followup.continued")
+            print("🔁 Follow-up on the previous topic, reusing its retrieved context\n")
+            return previous, True
+        if previous is not None:
+            metrics.increment("followup.new_topic")
+        session.retrieval = RetrievalContext(intent, user_input)
+        return session.retrieval, False
+    
+    def _refresh(self, user_input: str, classification: Dict[str, Any]) -> Dict[str, Any]:
+        """Recompute a cached response (runs in a background thread with its own deadline)"""
+        deadline = RequestDeadline(self.config.request_timeout, self.config.step_timeouts)
+        with use_deadline(deadline):
+            result = self._dispatch(user_input, classification, "")
+        if deadline.degraded:
+            result["degraded"] = dict(deadline.degraded)
+        return result
+    
+    def _dispatch(self, user_input: str, classification: Dict[str, Any], history: str) -> Dict[str, Any]:
+        """Step 3: run the chains for the classified intent"""
+        intent = classification.get("classification")
         print(f"🔗 [STEP 3/3] Executing Chain for '{intent}'...")
         result = {
             "intent": intent,
@@ -64,41 +530,51 @@ class HealthcareWorkflow:
         
         if intent == "government_scheme_support":
             print("   → Running Government Scheme Search Chain")
-            result["output"] = self.gov_scheme_chain.run(user_input)
+            self._run_section(result, "output", self.gov_scheme_chain.run, user_input, history)
             
         elif intent == "mental_wellness_support":
             print("   → Running Mental Wellness Chain")
-            result["output"] = self.mental_wellness_chain.run(user_input)
+            self._run_section(result, "output", self.mental_wellness_chain.run, user_input, history)
             
             print("   → Running Yoga Suggestion Chain")
-            result["yoga_recommendations"] = self.yoga_chain.run(user_input)
+            self._run_optional(result, "yoga_recommendations", self.yoga_chain.run, user_input, history)
             
         elif intent == "ayush_support":
             print("   → Running AYUSH Support Chain")
-            result["output"] = self.ayush_chain.run(user_input)
+            self._run_section(result, "output", self.ayush_chain.run, user_input, history)
             
         elif intent == "symptom_checker":
-            result.update(self._handle_symptoms(user_input))
+            result.update(self._handle_symptoms(user_input, history))
             
         elif intent == "facility_locator_support":
             print("   → Running Hospital Locator Chain")
-            result["output"] = self.hospital_chain.run(user_input)
+            self._run_section(result, "output", self.hospital_chain.run, user_input, history)
             
         else:
             print(f"   ⚠️  Unknown intent: {intent}")
-            result["output"] = "I couldn't understand your request. Please try rephrasing."
+            self._set_section(result, "output", "I couldn't understand your request. Please try rephrasing.")
         
         print("   ✓ Chain execution complete\n")
         return result
     
-    def _handle_symptoms(self, user_input: str) -> Dict[str, Any]:
+    def _handle_symptoms(self, user_input: str, history: str = "") -> Dict[str, Any]:
         """Handle symptom checking with multi-agent follow-up"""
+        # Triage is never reused: every turn is assessed, and only the
+        # previous turn's search results may be
         print("   → Running Symptom Extraction Chain")
-        symptom_data = self.symptom_chain.run(user_input)
+        symptom_data = self._timed_step("symptom_assessment", self.symptom_chain.run, user_input, history)
+        retrieval = current_retrieval()
+        followup = retrieval is not None and retrieval[1]
+        if followup and (symptom_data.is_emergency or not retrieval[0].covers(symptom_data.symptoms)):
+            print("   → New symptoms or an emergency since the previous turn, searching afresh")
+            stop_reuse()
+            followup = False
+        if retrieval is not None:
+            # Follow-ups naming the extracted symptoms stay on topic
+            retrieval[0].extend_topic(symptom_data.symptoms)
         
-        result = {
-            "symptom_assessment": symptom_data.model_dump()
-        }
+        result = {}
+        self._set_section(result, "symptom_assessment", symptom_data.model_dump())
         
         print(f"   → Extracted {len(symptom_data.symptoms)} symptoms")
         print(f"   → Emergency flag: {symptom_data.is_emergency}")
@@ -111,42 +587,62 @@ class HealthcareWorkflow:
             if "location" not in user_input.lower() and "near" not in user_input.lower():
                 hospital_query += ". User location not specified - provide general emergency guidance."
             
-            result["output"] = {
+            # The emergency message goes out before the hospital search starts
+            self._set_section(result, "output", {
                 "emergency": True,
                 "message": "⚠️ URGENT: Seek immediate medical attention. "
                           "Call emergency services (112 in India) or go to nearest hospital.",
                 "symptoms": symptom_data.symptoms,
                 "severity": symptom_data.severity
-            }
-            result["hospital_locator"] = self.hospital_chain.run(hospital_query)
-            result["emergency_number"] = "112 (India Emergency Services)"
+            })
+            self._set_section(result, "emergency_number", "112 (India Emergency Services)")
+            self._run_optional(result, "hospital_locator", self.hospital_chain.run, hospital_query)
         else:
             # Non-emergency: Multi-agent recommendations
-            result["output"] = {
+            self._set_section(result, "output", {
                 "emergency": False,
                 "message": "Based on your symptoms, here are some recommendations:"
-            }
+            })
             
             symptom_text = f"Patient has {', '.join(symptom_data.symptoms)} with severity {symptom_data.severity}/10"
             if symptom_data.duration:
                 symptom_text += f" for {symptom_data.duration}"
+            if followup:
+                # Same symptoms and sources; the answers address the new question
+                symptom_text += f". Follow-up question: {user_input}"
+            
+            if self.config.consolidated_symptoms:
+                # One search + one structured generation for all three sections
+                print("   → Running Consolidated Recommendation Agent")
+                try:
+                    recommendations = self._timed_step(
+                        "recommendations", self.symptom_recommendation_chain.run, symptom_text, history
+                    )
+                    for section, value in recommendations.items():
+                        self._set_section(result, section, value)
+                except Exception as e:
+                    current_deadline().mark_degraded("recommendations", f"{type(e).__name__}: {e}")
+                return result
             
             # Ayurveda recommendations
             print("   → Running Ayurvedic Recommendation Agent")
-            result["ayurveda_recommendations"] = self.ayush_chain.run(
-                f"Provide ayurvedic remedies for: {symptom_text}"
+            self._run_optional(
+                result, "ayurveda_recommendations", self.ayush_chain.run,
+                f"Provide ayurvedic remedies for: {symptom_text}", history
             )
             
             # Yoga recommendations
             print("   → Running Yoga Recommendation Agent")
-            result["yoga_recommendations"] = self.yoga_chain.run(
-                f"Suggest yoga poses and breathing exercises for: {symptom_text}"
+            self._run_optional(
+                result, "yoga_recommendations", self.yoga_chain.run,
+                f"Suggest yoga poses and breathing exercises for: {symptom_text}", history
             )
             
             # General wellness guidance
             print("   → Running Wellness Guidance Agent")
-            result["general_guidance"] = self.mental_wellness_chain.run(
-                f"Provide wellness advice and when to see a doctor for: {symptom_text}"
+            self._run_optional(
+                result, "general_guidance", self.mental_wellness_chain.run,
+                f"Provide wellness advice and when to see a doctor for: {symptom_text}", history
             )
         
         return result
@@ -0,0 +1,59 @@
+import pytest
+
+from src.canonicalize import QueryCanonicalizer, anchor_tokens, canonical_text, canonical_tokens
+
+
+def keys(*queries, group="all"):
+    canonicalizer = QueryCanonicalizer()
+    return [canonicalizer.canonical_key(query, group) for query in queries]
+
+
+@pytest.mark.parametrize("first, second", [
+    ("what is PMJAY", "tell me about pm jay scheme"),
+    ("What is PMJAY?", "what is pmjay"),
+    ("ayurvedic remedies for cold", "aayurved remedy for cold"),
+])
+def test_paraphrases_share_a_key(first, second):
+    a, b = keys(first, second)
+    assert a == b
+
+
+@pytest.mark.parametrize("first, second", [
+    ("can diabetics eat jaggery ayurveda", "can diabetics not eat jaggery ayurveda"),
+    ("ayurvedic medicine safe during pregnancy", "ayurvedic medicine unsafe during pregnancy"),
+    ("is pmjay available for people above 70", "is pmjay not available for people above 70"),
+    ("can I take ashwagandha with thyroid medicine", "can't I take ashwagandha with thyroid medicine"),
+    ("periods mein yoga karo", "periods mein yoga mat karo"),
+    ("diabetes type 1 diet", "diabetes type 2 diet"),
+    ("hepatitis a vaccine schedule", "hepatitis b vaccine schedule"),
+    ("vitamin d deficiency symptoms", "vitamin b12 deficiency symptoms"),
+])
+def test_opposite_or_distinct_queries_keep_separate_keys(first, second):
+    a, b = keys(first, second)
+    assert a != b
+
+
+def test_groups_are_separate():
+    canonicalizer = QueryCanonicalizer()
+    first = canonicalizer.canonical_key("what is pmjay", "government_scheme_support")
+    canonicalizer.canonical_key("what is pmjay scheme", "ayush_support")
+    assert canonicalizer.stats()["near_duplicate_hits"] == 0
+    assert first == "pmjay"
+
+
+def test_polarity_words_are_anchors():
+    assert canonical_tokens("I can't cope") == ["not", "cope"]
+    assert canonical_tokens("dawai nahin leni") == ["medicine", "nahi", "leni"]
+    assert anchor_tokens(canonical_tokens("medicine unsafe without food")) == ("unsafe", "without")
+
+
+def test_scheme_words_are_filler_only_for_keys():
+    assert "scheme" in canonical_tokens("pmjay scheme")
+    assert canonical_text("pmjay scheme") == "pmjay"
+    assert canonical_text("scheme") == "scheme"
+
+
+def test_canonical_forms_persist(tmp_path):
+    path = str(tmp_path / "canonical.jsonl")
+    first = QueryCanonicalizer(path=path).canonical_key("ayurvedic remedies for cold")
+    assert QueryCanonicalizer(path=path).canonical_key("aayurved remedy for cold") == first
@@ -0,0 +1,58 @@
+import pytest
+
+from src.knowledge_index import ShardedKnowledgeIndex, build_index
+from src.rerank import EmbeddingCache, HashingEmbeddings
+
+
+DOCUMENTS = [
+    {"id": "tulsi", "title": "Tulsi", "content": "Tulsi leaves are used in ayurveda for cough and cold."},
+    {"id": "triphala", "title": "Triphala", "content": "Triphala is an ayurvedic remedy for constipation."},
+    {"id": "yoga", "title": "Yoga for back pain", "content": "Bhujangasana and cat-cow poses ease back pain."},
+]
+
+
+def open_index(root):
+    return ShardedKnowledgeIndex(str(root), EmbeddingCache(HashingEmbeddings()), compact_after=None,
+                                 reload_interval=None)
+
+
+def ids(results):
+    return [result["url"].rsplit("/", 1)[-1] for result in results]
+
+
+@pytest.mark.parametrize("quantization", [None, "int8"])
+def test_upsert_compact_reopen(tmp_path, quantization):
+    build_index(str(tmp_path), {"ayush": DOCUMENTS}, HashingEmbeddings(), quantization=quantization)
+    index = open_index(tmp_path)
+    assert ids(index.search("ayush", "tulsi for cough", k=1)) == ["tulsi"]
+
+    index.upsert("ayush", [{"id": "ginger", "title": "Ginger", "content": "Ginger tea soothes nausea."}])
+    index.upsert("ayush", [{"id": "tulsi", "title": "Tulsi", "content": "Tulsi tea for sore throat."}])
+    index.delete("ayush", ["triphala"])
+    assert ids(index.search("ayush", "ginger tea nausea", k=1)) == ["ginger"]
+    assert "triphala" not in ids(index.search("ayush", "triphala constipation", k=5))
+
+    # A second reader replays the delta before any compaction
+    assert ids(open_index(tmp_path).search("ayush", "ginger tea nausea", k=1)) == ["ginger"]
+
+    entry = index.compact("ayush").result()
+    index.close()
+    assert entry["generation"] == 2
+    assert entry["documents"] == 3
+
+    reopened = open_index(tmp_path)
+    assert reopened.manifest["shards"]["ayush"]["generation"] == 2
+    assert len(reopened.shard("ayush").delta) == 0
+    assert ids(reopened.search("ayush", "ginger tea nausea", k=1)) == ["ginger"]
+    assert "triphala" not in ids(reopened.search("ayush", "triphala constipation", k=5))
+    tulsi = [r for r in reopened.search("ayush", "tulsi sore throat", k=3) if r["title"] == "Tulsi"]
+    assert [r["content"] for r in tulsi] == ["Tulsi tea for sore throat."]
+
+
+def test_writes_to_a_new_shard(tmp_path):
+    build_index(str(tmp_path), {"ayush": DOCUMENTS}, HashingEmbeddings())
+    index = open_index(tmp_path)
+    index.upsert("wellness", [{"id": "sleep", "content": "Keep a fixed bedtime for better sleep."}])
+    index.compact("wellness").result()
+    index.close()
+    assert ids(open_index(tmp_path).search("wellness", "better sleep", k=1)) == ["sleep"]
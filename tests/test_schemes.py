@@ -0,0 +1,76 @@
+import pytest
+
+from src.schemes import SchemeCatalogue, parse_profile
+
+
+@pytest.fixture(scope="module")
+def catalogue():
+    return SchemeCatalogue.load()
+
+
+def names(match):
+    return [scheme.scheme_name for scheme in match["schemes"]]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("I am 72 from Patna", {"state": "bihar", "age": 72, "categories": ["senior_citizen"]}),
+    ("I am 5 months pregnant in Bihar", {"state": "bihar", "categories": ["pregnant_women"]}),
+    ("my family income is 2 lakh", {"annual_income": 200000}),
+    ("I earn 15000 per month", {"annual_income": 180000}),
+    ("my mother is 65, any health scheme?", {"subject": "mother", "age": 65, "categories": ["senior_citizen"]}),
+    ("I am 30 and my father is 75", {"subject": "father", "age": 75, "categories": ["senior_citizen"]}),
+    ("is my father eligible for pmjay? he is 75", {"subject": "father", "age": 75, "categories": ["senior_citizen"]}),
+    ("my son is 5 months old", {"subject": "son", "categories": ["children"]}),
+    ("what is PMJAY", {}),
+])
+def test_parse_profile(text, expected):
+    assert parse_profile(text) == expected
+
+
+def test_relative_is_not_the_asker():
+    profile = parse_profile("my wife is pregnant, we live in pune")
+    assert profile["categories"] == ["pregnant_women"]
+    assert "women" in parse_profile("I am a mother of two")["categories"]
+
+
+def test_pregnancy_excludes_senior_schemes(catalogue):
+    match = catalogue.lookup("I am 5 months pregnant in Bihar")
+    assert match is not None
+    assert not any("70+" in name for name in names(match))
+    assert "Janani Suraksha Yojana (JSY)" in names(match)
+    assert all(match["eligible"])
+
+
+def test_relative_age_filters_schemes(catalogue):
+    match = catalogue.lookup("my mother is 65, any health scheme?")
+    assert match["profile"]["age"] == 65
+    assert not any("Matru Vandana" in name or "70+" in name for name in names(match))
+    assert all(not scheme.states for scheme in match["schemes"])
+
+
+def test_state_schemes_need_a_state(catalogue):
+    without = catalogue.eligible({})
+    with_state = catalogue.eligible({"state": "maharashtra"})
+    for i, scheme in enumerate(catalogue.schemes):
+        assert without[i] == (not scheme.states)
+        assert with_state[i] == (not scheme.states or "maharashtra" in scheme.states)
+
+
+def test_category_bounds_age_when_none_is_stated(catalogue):
+    mask = catalogue.eligible({"categories": ["pregnant_women"]})
+    for i, scheme in enumerate(catalogue.schemes):
+        if scheme.min_age is not None and scheme.min_age >= 60:
+            assert not mask[i]
+    # Categories of different people widen the bounds instead of clashing
+    assert mask.any() and catalogue.eligible({"categories": ["pregnant_women", "children"]}).any()
+
+
+def test_named_scheme_is_returned_whatever_the_profile(catalogue):
+    match = catalogue.lookup("is my father eligible for pmjay? he is 75")
+    assert match["named"]
+    assert names(match)[0].startswith("Ayushman Bharat Pradhan Mantri")
+    assert any("70+" in name for name in names(match)[1:])
+
+
+def test_unknown_scheme_goes_to_web_search(catalogue):
+    assert catalogue.lookup("what is the xyzabc health yojana") is None